@@ -1,24 +1,146 @@
 import logging
 import re
+import threading
+import time
+from django.conf import settings
+from django.db.models import Count, Max
 from .models import ChatbotKnowledge
-from core.ai_client import ai_client 
+from asgiref.sync import sync_to_async
+from core.ai_client import ai_client, async_ai_client
+from core.retrieval import BM25Index
 
 logger = logging.getLogger(__name__)
 
+# markdown characters clean_markdown() removes anywhere in the text, so they can be
+# dropped from streamed chunks before the full answer is known
+_INLINE_MARKDOWN = str.maketrans('', '', '*_`')
+
+# last chunk of a stream whose provider failed after the answer had started; the
+# chat page (static/js/chat.js) recognises it, and views do not save the partial answer
+STREAM_ERROR_MARKER = '\n\n[Error: the answer was interrupted. Please ask again.]'
+
+
+def _knowledge_version():
+    """
+    Version of the knowledge base as stored: (latest updated_at, row count). Any save
+    moves the first, any delete changes the second, whichever worker made the change.
+    """
+    stats = ChatbotKnowledge.objects.aggregate(latest=Max('updated_at'), count=Count('id'))
+    return stats['latest'], stats['count']
+
+
+async def _aknowledge_version():
+    stats = await ChatbotKnowledge.objects.aaggregate(latest=Max('updated_at'), count=Count('id'))
+    return stats['latest'], stats['count']
+
+
+def _format_knowledge_entry(category, question, answer, keywords):
+    return f"Category: {category}\nQuestion: {question}\nAnswer: {answer}\nKeywords: {keywords}\n\n"
+
 class ChatbotService:
     def __init__(self):
+        # static (head, tail) of the system prompt, see get_system_prompt_parts
+        self._system_prompt = None
+        # BM25 index over active knowledge entries and their prompt text, by entry id
+        self._knowledge_index = BM25Index()
+        self._knowledge_entries = {}
+        self._knowledge_version = None
+        self._knowledge_checked_at = None  # monotonic time of the last version check
+        self._knowledge_lock = threading.Lock()
         logger.info("Chatbot Service initialized using AIClient")
 
     def get_lamla_knowledge_base(self):
         """Get all active knowledge base entries about Lamla AI"""
-        knowledge_entries = ChatbotKnowledge.objects.filter(is_active=True)
-        knowledge_text = ""
-        for entry in knowledge_entries:
-            knowledge_text += f"Category: {entry.category}\n"
-            knowledge_text += f"Question: {entry.question}\n"
-            knowledge_text += f"Answer: {entry.answer}\n"
-            knowledge_text += f"Keywords: {entry.keywords}\n\n"
-        return knowledge_text
+        return "".join(self._load_knowledge_entries().values())
+
+    def _load_knowledge_entries(self):
+        knowledge_entries = ChatbotKnowledge.objects.filter(is_active=True).values_list(
+            'id', 'category', 'question', 'answer', 'keywords'
+        )
+        return {entry_id: _format_knowledge_entry(*fields) for entry_id, *fields in knowledge_entries}
+
+    def _knowledge_check_due(self):
+        interval = getattr(settings, 'CHATBOT_KNOWLEDGE_CHECK_INTERVAL', 30)
+        checked_at = self._knowledge_checked_at
+        return checked_at is None or time.monotonic() - checked_at >= interval
+
+    def _refresh_knowledge_index(self, version=None):
+        """
+        (Re)load the knowledge index from the database when the stored knowledge base
+        has a different version. The version is checked at most every
+        CHATBOT_KNOWLEDGE_CHECK_INTERVAL seconds, so edits made through another worker
+        are picked up within that time.
+        """
+        if version is None:
+            if not self._knowledge_check_due():
+                return
+            version = _knowledge_version()
+        with self._knowledge_lock:
+            if self._knowledge_version != version:
+                # build the new index aside and swap it in, so concurrent searches
+                # never see an empty or half-built one
+                entries = self._load_knowledge_entries()
+                index = BM25Index()
+                for entry_id, text in entries.items():
+                    index.add(entry_id, text)
+                self._knowledge_index, self._knowledge_entries = index, entries
+                self._knowledge_version = version
+                logger.debug(f"Chatbot knowledge index loaded with {len(entries)} entries")
+            self._knowledge_checked_at = time.monotonic()
+
+    def _search_knowledge(self, user_message: str) -> str:
+        top_k = getattr(settings, 'CHATBOT_KNOWLEDGE_TOP_K', 5)
+        hits = self._knowledge_index.search(user_message, k=top_k)
+        entries = self._knowledge_entries
+        return "".join(entries[entry_id] for entry_id, _ in hits if entry_id in entries)
+
+    def get_relevant_knowledge(self, user_message: str) -> str:
+        """
+        The knowledge base entries most relevant to user_message (BM25 over question,
+        answer and keywords), at most CHATBOT_KNOWLEDGE_TOP_K of them, so the prompt
+        stays the same size however many entries the knowledge base holds.
+        """
+        self._refresh_knowledge_index()
+        return self._search_knowledge(user_message)
+
+    async def aget_relevant_knowledge(self, user_message: str) -> str:
+        """Async variant of get_relevant_knowledge; only a reload leaves the event loop."""
+        if self._knowledge_check_due():
+            version = await _aknowledge_version()
+            if version == self._knowledge_version:
+                self._knowledge_checked_at = time.monotonic()
+            else:
+                await sync_to_async(self._refresh_knowledge_index)(version)
+        return self._search_knowledge(user_message)
+
+    def knowledge_entry_changed(self, entry, created=False, deleted=False):
+        """
+        Apply one saved or deleted ChatbotKnowledge entry to the index in place. Other
+        workers notice the change through the stored version on their next check.
+        """
+        with self._knowledge_lock:
+            if deleted or not entry.is_active:
+                self._knowledge_index.remove(entry.pk)
+                self._knowledge_entries.pop(entry.pk, None)
+            else:
+                text = _format_knowledge_entry(entry.category, entry.question, entry.answer, entry.keywords)
+                self._knowledge_index.add(entry.pk, text)
+                self._knowledge_entries[entry.pk] = text
+
+            if self._knowledge_version is None:
+                return
+            # The index is current only if this change is the only one since it was
+            # loaded; otherwise leave the versions apart so the next turn reloads it.
+            old_latest, old_count = self._knowledge_version
+            latest, count = _knowledge_version()
+            if deleted:
+                current = count == old_count - 1 and (latest is None or old_latest is None or latest <= old_latest)
+            else:
+                current = count == old_count + (1 if created else 0) and latest == entry.updated_at
+            if current:
+                self._knowledge_version = (latest, count)
+            else:
+                self._knowledge_checked_at = None
 
     def get_edtech_best_practices(self):
         """Return best practices in educational technology for context"""
@@ -84,32 +206,21 @@ Best Practices in Educational Technology:
         text = re.sub(r'\n{3,}', '\n\n', text)
         return text.strip()
 
-    def generate_response(self, user_message: str, conversation_history=None, context_document=None) -> str:
+    def get_system_prompt_parts(self):
         """
-        Generate a chatbot response using AIClient, optionally grounding it with context_document.
+        The fixed part of the system prompt as (head, tail). A turn's document context
+        and relevant knowledge go between them. Built once and reused.
         """
-        try:
-            lamla_knowledge = self.get_lamla_knowledge_base()
-            edtech_best_practices = self.get_edtech_best_practices()
-
-            # --- CONTEXT DOCUMENT INTEGRATION START (NEW) ---
-            document_context = ""
-            if context_document:
-                document_context = f"""
-INSTRUCTION: The user has uploaded study material. Use the following text as the primary context for answering their current question.
-DOCUMENT TEXT:
----
-{context_document}
----
-"""
-            # --- CONTEXT DOCUMENT INTEGRATION END ---
+        if self._system_prompt is None:
+            self._system_prompt = self._build_system_prompt_parts()
+        return self._system_prompt
 
-            # Base system prompt
-            system_prompt = f"""You are Lamla AI Tutor, a friendly and helpful AI assistant for an educational platform. Your name is Lamla AI Tutor, and you can answer questions about the platform and general topics.
-{document_context}
-Context about Lamla AI:
-{lamla_knowledge}
+    def _build_system_prompt_parts(self):
+        edtech_best_practices = self.get_edtech_best_practices()
 
+        head = """You are Lamla AI Tutor, a friendly and helpful AI assistant for an educational platform. Your name is Lamla AI Tutor, and you can answer questions about the platform and general topics.
+"""
+        tail = f"""
 Educational Technology Best Practices:
 {edtech_best_practices}
 
@@ -144,36 +255,153 @@ IMPORTANT RESPONSE GUIDELINES:
 13. Follow EdTech Best Practices, but be sincere about your limitations and the features you have
 
 You can also answer general questions and help with various topics. Always maintain a helpful and friendly demeanor."""
+        return head, tail
+
+    def build_prompt(self, user_message: str, lamla_knowledge: str, conversation_history=None, context_document=None, conversation_summary=None) -> str:
+        """Assemble the full tutor prompt for one chat turn."""
+        head, tail = self.get_system_prompt_parts()
+
+        # --- CONTEXT DOCUMENT INTEGRATION START (NEW) ---
+        document_context = ""
+        if context_document:
+            document_context = f"""
+INSTRUCTION: The user has uploaded study material. Use the following text as the primary context for answering their current question.
+DOCUMENT TEXT:
+---
+{context_document}
+---
+"""
+        # --- CONTEXT DOCUMENT INTEGRATION END ---
+
+        # Base system prompt
+        system_prompt = f"{head}{document_context}\nContext about Lamla AI:\n{lamla_knowledge}\n{tail}"
+
+        # Add conversation history
+        history_text = ""
+        if conversation_history:
+            # already trimmed to the history token budget by chatbot.memory
+            for msg in conversation_history:
+                role = "User" if msg["message_type"] == "user" else "AI"
+                history_text += f"{role}: {msg['content']}\n"
+
+        # Older messages are only present as a rolling summary (see chatbot.memory)
+        summary_text = ""
+        if conversation_summary:
+            summary_text = f"\nSummary of the earlier conversation:\n{conversation_summary}\n"
+
+        full_prompt = f"{system_prompt}\n{summary_text}Conversation so far:\n{history_text}\nUser: {user_message}\nAI:"
+        return full_prompt
+
+    def finalize_response(self, raw_response, user_message: str) -> str:
+        """Extract the assistant text from a provider response and clean it for display."""
+        # Handle dict vs str (simplification from the original snippet, assuming a standardized client)
+        if isinstance(raw_response, dict):
+            content = (raw_response.get("choices", [{}])[0]
+                       .get("message", {})
+                       .get("content", "")) or str(raw_response)
+        else:
+            content = str(raw_response)
+
+        if not content.strip():
+            return self.clean_markdown(self._get_fallback_response(user_message))
 
-            # Add conversation history
-            history_text = ""
-            if conversation_history:
-                for msg in conversation_history[-6:]:
-                    role = "User" if msg["message_type"] == "user" else "AI"
-                    history_text += f"{role}: {msg['content']}\n"
+        return self.clean_markdown(content.strip())
 
-            full_prompt = f"{system_prompt}\nConversation so far:\n{history_text}\nUser: {user_message}\nAI:"
+    def generate_response(self, user_message: str, conversation_history=None, context_document=None, conversation_summary=None) -> str:
+        """
+        Generate a chatbot response using AIClient, optionally grounding it with context_document.
+        """
+        try:
+            full_prompt = self.build_prompt(
+                user_message,
+                self.get_relevant_knowledge(user_message),
+                conversation_history=conversation_history,
+                context_document=context_document,
+                conversation_summary=conversation_summary,
+            )
 
             # Call AIClient (handles providers + fallbacks)
-            raw_response = ai_client.generate_content(full_prompt, max_tokens=400, raise_on_error=False)
+            raw_response = ai_client.generate_content(full_prompt, max_tokens=400, raise_on_error=False, call_site="chatbot")
+            return self.finalize_response(raw_response, user_message)
 
-            # Handle dict vs str (simplification from the original snippet, assuming a standardized client)
-            if isinstance(raw_response, dict):
-                content = (raw_response.get("choices", [{}])[0]
-                           .get("message", {})
-                           .get("content", "")) or str(raw_response)
-            else:
-                content = str(raw_response)
+        except Exception as e:
+            logger.error(f"Error generating chatbot response: {e}")
+            return self.clean_markdown(self._get_fallback_response(user_message))
 
-            if not content.strip():
-                return self.clean_markdown(self._get_fallback_response(user_message))
+    async def agenerate_response(self, user_message: str, conversation_history=None, context_document=None, conversation_summary=None) -> str:
+        """Async variant of generate_response for ASGI views."""
+        try:
+            full_prompt = self.build_prompt(
+                user_message,
+                await self.aget_relevant_knowledge(user_message),
+                conversation_history=conversation_history,
+                context_document=context_document,
+                conversation_summary=conversation_summary,
+            )
 
-            return self.clean_markdown(content.strip())
+            raw_response = await async_ai_client.generate_content(full_prompt, max_tokens=400, raise_on_error=False, call_site="chatbot")
+            return self.finalize_response(raw_response, user_message)
 
         except Exception as e:
             logger.error(f"Error generating chatbot response: {e}")
             return self.clean_markdown(self._get_fallback_response(user_message))
 
+    def stream_response(self, user_message: str, conversation_history=None, context_document=None, conversation_summary=None):
+        """
+        Streaming variant of generate_response: yields the answer as the provider
+        produces it. Inline markdown is stripped from each chunk; line-level cleanup
+        needs the whole answer, so callers should store clean_markdown() of the joined
+        chunks. Yields the fallback response when no provider can stream, and ends with
+        STREAM_ERROR_MARKER when the provider fails after the answer has started.
+        """
+        streamed = False
+        try:
+            full_prompt = self.build_prompt(
+                user_message,
+                self.get_relevant_knowledge(user_message),
+                conversation_history=conversation_history,
+                context_document=context_document,
+                conversation_summary=conversation_summary,
+            )
+            for text in ai_client.stream_content(full_prompt, max_tokens=400):
+                text = text.translate(_INLINE_MARKDOWN)
+                if text:
+                    streamed = True
+                    yield text
+        except Exception as e:
+            logger.error(f"Error streaming chatbot response: {e}")
+            if streamed:
+                yield STREAM_ERROR_MARKER
+                return
+
+        if not streamed:
+            yield self.clean_markdown(self._get_fallback_response(user_message))
+
+    async def astream_response(self, user_message: str, conversation_history=None, context_document=None, conversation_summary=None):
+        """Async variant of stream_response for ASGI views."""
+        streamed = False
+        try:
+            full_prompt = self.build_prompt(
+                user_message,
+                await self.aget_relevant_knowledge(user_message),
+                conversation_history=conversation_history,
+                context_document=context_document,
+                conversation_summary=conversation_summary,
+            )
+            async for text in async_ai_client.stream_content(full_prompt, max_tokens=400):
+                text = text.translate(_INLINE_MARKDOWN)
+                if text:
+                    streamed = True
+                    yield text
+        except Exception as e:
+            logger.error(f"Error streaming chatbot response: {e}")
+            if streamed:
+                yield STREAM_ERROR_MARKER
+                return
+
+        if not streamed:
+            yield self.clean_markdown(self._get_fallback_response(user_message))
+
     def _get_fallback_response(self, user_message: str) -> str:
         """Provide fallback responses when AI is not available"""
         # ... (Fallback response logic remains the same)
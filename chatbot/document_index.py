@@ -0,0 +1,77 @@
+# chatbot/document_index.py
+import threading
+from collections import OrderedDict
+from django.conf import settings
+from core.chunking import split_text_into_chunks
+from core.retrieval import BM25Index
+
+# A document uploaded to the chatbot is split into passages and indexed once; each
+# question then sends only its most relevant passages to the AI instead of the whole
+# text. Indexes are kept per worker in a small LRU keyed by the document's SHA-256,
+# so follow-up questions about the same file skip extraction and indexing.
+
+_indexes = OrderedDict()
+_indexes_lock = threading.Lock()
+
+
+class DocumentIndex:
+    """The text of one uploaded document, its passages and a BM25 index over them."""
+
+    def __init__(self, text):
+        self.text = text
+        self.passages = split_text_into_chunks(
+            text,
+            getattr(settings, 'CHATBOT_DOCUMENT_CHUNK_CHARS', 1500),
+            overlap=getattr(settings, 'CHATBOT_DOCUMENT_CHUNK_OVERLAP', 150),
+        )
+        self.index = BM25Index()
+        for number, passage in enumerate(self.passages):
+            self.index.add(number, passage)
+
+    def relevant_passages(self, question, top_k=None, max_chars=None, fallback_to_opening=False):
+        """
+        The passages that best match question, in document order, joined into one
+        context string of at most max_chars, or None when no passage matches. With
+        fallback_to_opening, questions sharing no words with the document (e.g.
+        "summarize this" when it is uploaded) get the opening passages instead.
+        """
+        top_k = top_k or getattr(settings, 'CHATBOT_DOCUMENT_TOP_K', 4)
+        max_chars = max_chars or getattr(settings, 'CHATBOT_DOCUMENT_CONTEXT_CHARS', 6000)
+        ranked = [number for number, _ in self.index.search(question, k=top_k)]
+        if not ranked:
+            if not fallback_to_opening:
+                return None
+            ranked = list(range(min(top_k, len(self.passages))))
+
+        chosen = []
+        size = 0
+        for number in ranked:
+            passage = self.passages[number]
+            if chosen and size + len(passage) > max_chars:
+                break
+            chosen.append(number)
+            size += len(passage)
+        return "\n...\n".join(self.passages[number][:max_chars] for number in sorted(chosen))
+
+
+def get_document_index(content_hash):
+    """The index of a document uploaded earlier in this worker, or None."""
+    if not content_hash:
+        return None
+    with _indexes_lock:
+        document = _indexes.get(content_hash)
+        if document is not None:
+            _indexes.move_to_end(content_hash)
+        return document
+
+
+def index_document(content_hash, text):
+    """Chunk and index text; the index is kept under content_hash when one is given."""
+    document = DocumentIndex(text)
+    if content_hash:
+        with _indexes_lock:
+            _indexes[content_hash] = document
+            _indexes.move_to_end(content_hash)
+            while len(_indexes) > getattr(settings, 'CHATBOT_DOCUMENT_INDEX_MAX', 32):
+                _indexes.popitem(last=False)
+    return document
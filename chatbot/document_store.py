@@ -0,0 +1,113 @@
+# chatbot/document_store.py
+import logging
+from datetime import timedelta
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.utils import timezone
+from .document_index import get_document_index, index_document
+from .models import ChatDocument
+
+logger = logging.getLogger(__name__)
+
+# Documents uploaded to the chatbot are stored per chat (user, or session for
+# anonymous users) so follow-up turns refer to them by id: a small lookup instead of
+# another upload and parse. Each chat keeps at most CHATBOT_DOCUMENT_MAX_PER_CHAT
+# documents, and documents unused for CHATBOT_DOCUMENT_TTL seconds are deleted.
+
+
+def _owner(user, session_key):
+    if user is not None and user.is_authenticated:
+        return {'user': user}
+    return {'user__isnull': True, 'session_id': session_key or ''}
+
+
+def _cutoff():
+    return timezone.now() - timedelta(seconds=getattr(settings, 'CHATBOT_DOCUMENT_TTL', 24 * 3600))
+
+
+def save_document(user, session_key, file_name, content_hash, text):
+    """Store an uploaded document's text for this chat; re-uploads refresh the stored copy."""
+    owner = _owner(user, session_key)
+    text = text[:getattr(settings, 'CHATBOT_DOCUMENT_MAX_CHARS', 50000)]
+    document = None
+    if content_hash:
+        document = ChatDocument.objects.filter(content_hash=content_hash, **owner).first()
+    if document is not None:
+        document.file_name = file_name
+        document.last_used = timezone.now()
+        document.save(update_fields=['file_name', 'last_used', 'updated_at'])
+    else:
+        document = ChatDocument.objects.create(
+            user=owner.get('user'),
+            session_id=owner.get('session_id', ''),
+            file_name=file_name,
+            content_hash=content_hash or '',
+            text=text,
+        )
+    _evict(owner)
+    return document
+
+
+def _evict(owner):
+    """Delete expired documents, and this chat's oldest beyond the per-chat limit."""
+    expired, _ = ChatDocument.objects.filter(last_used__lt=_cutoff()).delete()
+    keep = getattr(settings, 'CHATBOT_DOCUMENT_MAX_PER_CHAT', 5)
+    surplus = list(ChatDocument.objects.filter(**owner).order_by('-last_used').values_list('pk', flat=True)[keep:])
+    if surplus:
+        ChatDocument.objects.filter(pk__in=surplus).delete()
+    if expired or surplus:
+        logger.debug(f"Evicted {expired} expired and {len(surplus)} surplus chat documents")
+
+
+def _lookup(user, session_key, document_id):
+    if not document_id:
+        return None
+    owner = _owner(user, session_key)
+    if 'session_id' in owner and not session_key:
+        return None
+    return ChatDocument.objects.filter(pk=document_id, last_used__gte=_cutoff(), **owner).defer('text')
+
+
+def get_document(user, session_key, document_id):
+    """This chat's unexpired document with document_id (text deferred), or None."""
+    try:
+        queryset = _lookup(user, session_key, document_id)
+        document = queryset.first() if queryset is not None else None
+    except ValidationError:  # malformed id
+        return None
+    if document is not None:
+        ChatDocument.objects.filter(pk=document.pk).update(last_used=timezone.now())
+    return document
+
+
+async def aget_document(user, session_key, document_id):
+    """Async variant of get_document."""
+    try:
+        queryset = _lookup(user, session_key, document_id)
+        document = await queryset.afirst() if queryset is not None else None
+    except ValidationError:
+        return None
+    if document is not None:
+        await ChatDocument.objects.filter(pk=document.pk).aupdate(last_used=timezone.now())
+    return document
+
+
+def document_context(document, user_message):
+    """
+    Passages of document relevant to user_message, or None when none matches. The
+    stored text is only read when this worker has no index of the document yet.
+    """
+    index = get_document_index(document.content_hash)
+    if index is None:
+        text = ChatDocument.objects.filter(pk=document.pk).values_list('text', flat=True).first() or ''
+        index = index_document(document.content_hash, text)
+    return index.relevant_passages(user_message)
+
+
+async def adocument_context(document, user_message):
+    """Async variant of document_context."""
+    index = get_document_index(document.content_hash)
+    if index is None:
+        text = await ChatDocument.objects.filter(pk=document.pk).values_list('text', flat=True).afirst() or ''
+        index = index_document(document.content_hash, text)
+    return index.relevant_passages(user_message)
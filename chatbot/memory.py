@@ -0,0 +1,192 @@
+# chatbot/memory.py
+import logging
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from core import background
+from core.ai_client import ai_client
+from .models import ChatMessage, ConversationSummary
+
+logger = logging.getLogger(__name__)
+
+# Conversation memory for chat prompts: a rolling summary of the older messages plus
+# the latest ones verbatim, trimmed to a fixed token budget so every turn sends a
+# prompt of predictable size. The summary is brought up to date in the background
+# after a turn is saved, never while the user waits for an answer.
+
+CHARS_PER_TOKEN = 4  # rough average for English text, good enough for budgeting
+_LOCK_PREFIX = 'chatbot:summary-lock:'
+_MAX_FOLD = 20  # messages folded per update; a backlog is worked off over several turns
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+def _owner(user, session_id):
+    if user is not None:
+        return {'user': user}
+    return {'user__isnull': True, 'session_id': session_id or ''}
+
+
+class ConversationMemory:
+    """
+    What a chat turn knows about the conversation so far.
+
+    Attributes:
+        summary (str): Rolling summary of the older messages ('' when there is none).
+        history (list[dict]): Latest messages in chronological order, ending with the
+            message being answered, as build_prompt expects them.
+        pending (int): Messages not yet folded into the summary, this turn included.
+    """
+
+    def __init__(self, summary, rows, user_content):
+        self.summary = summary
+        self.pending = len(rows) + 2  # the user and AI messages about to be saved
+        self.history = _fit_history(rows, user_content, _budget_chars(summary))
+
+    def __repr__(self):
+        return f"<ConversationMemory summary={len(self.summary)} history={len(self.history)} pending={self.pending}>"
+
+
+def _budget_chars(summary):
+    budget = _setting('CHATBOT_HISTORY_TOKEN_BUDGET', 1000) * CHARS_PER_TOKEN
+    return max(0, budget - len(summary))
+
+
+def _fit_history(rows, user_content, budget):
+    """
+    Latest messages (rows are newest first) that fit the character budget, newest
+    kept first. A message that only partly fits is cut, if enough room is left to be
+    useful; anything older is left to the summary.
+    """
+    kept = []
+    budget -= len(user_content)
+    for message_type, content in rows:
+        if len(content) > budget:
+            if budget >= 200:
+                kept.append((message_type, content[:budget - 4].rstrip() + " ..."))
+            break
+        kept.append((message_type, content))
+        budget -= len(content)
+    history = [{"message_type": message_type, "content": content} for message_type, content in reversed(kept)]
+    history.append({"message_type": "user", "content": user_content})
+    return history
+
+
+def _recent_messages(user, session_id, summarized_until):
+    messages = ChatMessage.objects.filter(**_owner(user, session_id))
+    if summarized_until is not None:
+        messages = messages.filter(created_at__gt=summarized_until)
+    limit = _setting('CHATBOT_RECENT_MESSAGES', 4) + _setting('CHATBOT_SUMMARY_BATCH', 4)
+    return messages.order_by('-created_at').values_list('message_type', 'content')[:limit]
+
+
+def _summary_row(user, session_id):
+    return ConversationSummary.objects.filter(**_owner(user, session_id)).values_list('summary', 'summarized_until')
+
+
+def load_memory(user, session_id, user_content):
+    """The summary and budget-trimmed recent history for a new message."""
+    summary, summarized_until = _summary_row(user, session_id).first() or ('', None)
+    rows = list(_recent_messages(user, session_id, summarized_until))
+    return ConversationMemory(summary, rows, user_content)
+
+
+async def aload_memory(user, session_id, user_content):
+    """Async variant of load_memory."""
+    summary, summarized_until = await _summary_row(user, session_id).afirst() or ('', None)
+    rows = [row async for row in _recent_messages(user, session_id, summarized_until)]
+    return ConversationMemory(summary, rows, user_content)
+
+
+def schedule_summary_update(user, session_id, memory):
+    """
+    Queue a summary update once enough messages have piled up beyond the verbatim
+    window, so the summary is refreshed every CHATBOT_SUMMARY_BATCH messages.
+    """
+    if memory.pending <= _setting('CHATBOT_RECENT_MESSAGES', 4) + _setting('CHATBOT_SUMMARY_BATCH', 4):
+        return
+    background.submit(update_summary, user.pk if user is not None else None, session_id)
+
+
+def _summary_prompt(summary, messages, max_chars):
+    transcript = "\n".join(
+        f"{'User' if message_type == 'user' else 'AI'}: {content}" for message_type, content in messages
+    )
+    return f"""You maintain the memory of a tutoring chat between a student and Lamla AI Tutor.
+Update the summary below with the new messages. Keep the topics studied, the student's
+questions, difficulties and preferences, and any facts the tutor will need later.
+Write plain text, at most {max_chars} characters. Reply with the summary only.
+
+CURRENT SUMMARY:
+{summary or '(none)'}
+
+NEW MESSAGES:
+{transcript}
+"""
+
+
+def _response_text(raw):
+    if isinstance(raw, dict):
+        return (raw.get("choices", [{}])[0].get("message", {}).get("content", "") or "").strip()
+    return str(raw or "").strip()
+
+
+def update_summary(user_id, session_id):
+    """
+    Background task: fold the messages older than the verbatim window into the
+    conversation's summary. One update per conversation runs at a time.
+    """
+    owner = {'user_id': user_id} if user_id is not None else {'user__isnull': True, 'session_id': session_id or ''}
+    lock = f"{_LOCK_PREFIX}{user_id or session_id}"
+    if not cache.add(lock, 1, 300):
+        return
+    try:
+        record = ConversationSummary.objects.filter(**owner).first()
+        messages = ChatMessage.objects.filter(**owner)
+        if record is not None and record.summarized_until is not None:
+            messages = messages.filter(created_at__gt=record.summarized_until)
+        # oldest first; the latest CHATBOT_RECENT_MESSAGES stay verbatim in prompts
+        recent = _setting('CHATBOT_RECENT_MESSAGES', 4)
+        pending = list(messages.order_by('created_at').values_list('message_type', 'content', 'created_at')[:_MAX_FOLD + recent])
+        to_fold = pending[:max(0, len(pending) - recent)]
+        if not to_fold:
+            return
+
+        max_chars = _setting('CHATBOT_SUMMARY_TOKEN_BUDGET', 250) * CHARS_PER_TOKEN
+        message_chars = _setting('CHATBOT_SUMMARY_MESSAGE_CHARS', 1500)
+        prompt = _summary_prompt(
+            record.summary if record else '',
+            [(message_type, content[:message_chars]) for message_type, content, _ in to_fold],
+            max_chars,
+        )
+        raw = ai_client.generate_content(
+            prompt,
+            max_tokens=_setting('CHATBOT_SUMMARY_TOKEN_BUDGET', 250) + 50,
+            raise_on_error=False,
+            use_cache=False,
+        )
+        summary = _response_text(raw)
+        if not summary:
+            logger.warning("Conversation summary update returned nothing; will retry on a later turn")
+            return
+
+        # the cache lock is per process, so another worker may have folded these
+        # messages meanwhile; the row lock and the unique constraints keep one summary
+        with transaction.atomic():
+            current = ConversationSummary.objects.select_for_update().filter(**owner).first()
+            if current is not None and current.summarized_until is not None and current.summarized_until >= to_fold[-1][2]:
+                return
+            ConversationSummary.objects.update_or_create(
+                **owner,
+                defaults={'summary': summary[:max_chars], 'summarized_until': to_fold[-1][2]},
+                create_defaults={
+                    'summary': summary[:max_chars],
+                    'summarized_until': to_fold[-1][2],
+                    'session_id': '' if user_id is not None else session_id or '',
+                },
+            )
+        logger.debug(f"Conversation summary updated with {len(to_fold)} messages")
+    finally:
+        cache.delete(lock)
@@ -0,0 +1,36 @@
+# Generated by Django 5.2.1 on 2026-10-17 02:28
+
+import django.db.models.deletion
+import uuid
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chatbot', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ChatDocument',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('session_id', models.CharField(blank=True, db_index=True, help_text='Session identifier for anonymous users', max_length=100)),
+                ('file_name', models.CharField(max_length=255)),
+                ('content_hash', models.CharField(db_index=True, help_text='SHA-256 of the uploaded file', max_length=64)),
+                ('text', models.TextField()),
+                ('last_used', models.DateTimeField(auto_now_add=True, db_index=True)),
+                ('user', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='chat_documents', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Chat Document',
+                'verbose_name_plural': 'Chat Documents',
+                'ordering': ['-last_used'],
+            },
+        ),
+    ]
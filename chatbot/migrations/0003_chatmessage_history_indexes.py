@@ -0,0 +1,28 @@
+# Generated by Django 5.2.1 on 2026-10-17 02:30
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chatbot', '0002_chatdocument'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='chatmessage',
+            name='session_id',
+            field=models.CharField(blank=True, help_text='Session identifier for anonymous users', max_length=100),
+        ),
+        migrations.AddIndex(
+            model_name='chatmessage',
+            index=models.Index(fields=['user', '-created_at'], name='chat_msg_user_recent_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='chatmessage',
+            index=models.Index(fields=['session_id', '-created_at'], name='chat_msg_session_recent_idx'),
+        ),
+    ]
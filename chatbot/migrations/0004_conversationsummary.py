@@ -0,0 +1,33 @@
+# Generated by Django 5.2.1 on 2026-10-17 02:31
+
+import django.db.models.deletion
+import uuid
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chatbot', '0003_chatmessage_history_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ConversationSummary',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('session_id', models.CharField(blank=True, db_index=True, help_text='Session identifier for anonymous users', max_length=100)),
+                ('summary', models.TextField(blank=True)),
+                ('summarized_until', models.DateTimeField(blank=True, help_text='created_at of the last message folded into the summary', null=True)),
+                ('user', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='conversation_summaries', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Conversation Summary',
+                'verbose_name_plural': 'Conversation Summaries',
+            },
+        ),
+    ]
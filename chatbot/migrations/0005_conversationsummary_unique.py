@@ -0,0 +1,38 @@
+# Generated by Django 5.2.1 on 2026-10-17 02:55
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+def drop_duplicate_summaries(apps, schema_editor):
+    """Keep only the most advanced summary of each chat before the constraints go in."""
+    ConversationSummary = apps.get_model('chatbot', 'ConversationSummary')
+    seen = set()
+    for summary in ConversationSummary.objects.order_by(
+        models.F('summarized_until').desc(nulls_last=True), '-updated_at'
+    ):
+        owner = ('user', summary.user_id) if summary.user_id else ('session', summary.session_id)
+        if owner in seen:
+            summary.delete()
+        else:
+            seen.add(owner)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chatbot', '0004_conversationsummary'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RunPython(drop_duplicate_summaries, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='conversationsummary',
+            constraint=models.UniqueConstraint(condition=models.Q(('user__isnull', False)), fields=('user',), name='unique_summary_per_user'),
+        ),
+        migrations.AddConstraint(
+            model_name='conversationsummary',
+            constraint=models.UniqueConstraint(condition=models.Q(('user__isnull', True)), fields=('session_id',), name='unique_summary_per_session'),
+        ),
+    ]
@@ -27,14 +27,62 @@ class ChatMessage(BaseModel):
     Model to store chatbot messages.
     """
     user = models.ForeignKey(User, on_delete=models.CASCADE, null=True, blank=True)
-    session_id = models.CharField(max_length=100, help_text="Session identifier for anonymous users")
+    session_id = models.CharField(max_length=100, blank=True, help_text="Session identifier for anonymous users")
     message_type = models.CharField(max_length=10, choices=MESSAGE_TYPES)
     content = models.TextField()
     
     class Meta:
         ordering = ['created_at']
+        # every chat turn loads the latest messages of one user or session
+        indexes = [
+            models.Index(fields=['user', '-created_at'], name='chat_msg_user_recent_idx'),
+            models.Index(fields=['session_id', '-created_at'], name='chat_msg_session_recent_idx'),
+        ]
         verbose_name = "Chat Message"
         verbose_name_plural = "Chat Messages"
     
     def __str__(self):
-        return f"{self.message_type} - {self.content[:50]}..."
\ No newline at end of file
+        return f"{self.message_type} - {self.content[:50]}..."
+
+class ChatDocument(BaseModel):
+    """
+    Text of a document uploaded to the chatbot, kept so later turns of the same chat
+    can refer to it by id instead of uploading it again. Expires after a period unused.
+    """
+    user = models.ForeignKey(User, on_delete=models.CASCADE, null=True, blank=True, related_name='chat_documents')
+    session_id = models.CharField(max_length=100, blank=True, db_index=True, help_text="Session identifier for anonymous users")
+    file_name = models.CharField(max_length=255)
+    content_hash = models.CharField(max_length=64, db_index=True, help_text="SHA-256 of the uploaded file")
+    text = models.TextField()
+    last_used = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    class Meta:
+        ordering = ['-last_used']
+        verbose_name = "Chat Document"
+        verbose_name_plural = "Chat Documents"
+
+    def __str__(self):
+        return self.file_name
+
+
+class ConversationSummary(BaseModel):
+    """
+    Rolling summary of a chat's older messages. Prompts carry this summary plus only
+    the latest messages, so their size stays bounded however long the chat runs.
+    """
+    user = models.ForeignKey(User, on_delete=models.CASCADE, null=True, blank=True, related_name='conversation_summaries')
+    session_id = models.CharField(max_length=100, blank=True, db_index=True, help_text="Session identifier for anonymous users")
+    summary = models.TextField(blank=True)
+    summarized_until = models.DateTimeField(null=True, blank=True, help_text="created_at of the last message folded into the summary")
+
+    class Meta:
+        verbose_name = "Conversation Summary"
+        verbose_name_plural = "Conversation Summaries"
+        constraints = [
+            # one summary per chat: per user, or per session for anonymous users
+            models.UniqueConstraint(fields=['user'], condition=models.Q(user__isnull=False), name='unique_summary_per_user'),
+            models.UniqueConstraint(fields=['session_id'], condition=models.Q(user__isnull=True), name='unique_summary_per_session'),
+        ]
+
+    def __str__(self):
+        return f"Summary for {self.user or self.session_id}"
@@ -0,0 +1,16 @@
+# chatbot/signals.py
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from .chatbot_service import chatbot_service
+from .models import ChatbotKnowledge
+
+
+@receiver(post_save, sender=ChatbotKnowledge)
+def knowledge_saved(sender, instance, created=False, **kwargs):
+    """Keep the chatbot's knowledge index in step with the knowledge base."""
+    chatbot_service.knowledge_entry_changed(instance, created=created)
+
+
+@receiver(post_delete, sender=ChatbotKnowledge)
+def knowledge_deleted(sender, instance, **kwargs):
+    chatbot_service.knowledge_entry_changed(instance, deleted=True)
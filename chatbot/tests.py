@@ -1,3 +1,332 @@
-from django.test import TestCase
+import json
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import IntegrityError, connection, transaction
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from core.retrieval import BM25Index
+
+from .chatbot_service import STREAM_ERROR_MARKER, ChatbotService, ai_client, async_ai_client, chatbot_service
+from . import document_index, memory
+from .document_index import DocumentIndex
+from .models import ChatbotKnowledge, ChatMessage, ConversationSummary
+
+TOPICS = ['photosynthesis chlorophyll light', 'mitochondria respiration', 'volcano magma eruption']
+NOTES = '\n\n'.join(
+    f"Paragraph {i}: this section covers {TOPICS[i % 3]} in depth. " + "More detail follows here. " * 40
+    for i in range(12)
+)
+
+
+@override_settings(CHATBOT_DOCUMENT_CHUNK_CHARS=1200, CHATBOT_DOCUMENT_CHUNK_OVERLAP=0)
+class DocumentIndexTests(SimpleTestCase):
+
+    def setUp(self):
+        self.document = DocumentIndex(NOTES)
+
+    def test_splits_into_passages(self):
+        self.assertGreater(len(self.document.passages), 3)
+        self.assertEqual(len(self.document.index), len(self.document.passages))
+
+    def test_returns_matching_passages_in_document_order(self):
+        context = self.document.relevant_passages('volcano magma', top_k=2)
+        self.assertIn('volcano magma', context)
+        self.assertNotIn('photosynthesis', context)
+        self.assertLess(context.index('Paragraph 2:'), context.index('Paragraph 5:'))
+
+    def test_context_is_capped(self):
+        self.assertLessEqual(len(self.document.relevant_passages('volcano', top_k=10, max_chars=1500)), 1500)
+
+    def test_unrelated_question_gets_nothing(self):
+        self.assertIsNone(self.document.relevant_passages('What is the capital of France?'))
+
+    def test_unrelated_question_gets_opening_passages_when_asked(self):
+        context = self.document.relevant_passages('summarize this', top_k=1, fallback_to_opening=True)
+        self.assertTrue(context.startswith('Paragraph 0:'))
+
+
+class DocumentFollowUpTests(TestCase):
+    """Documents uploaded to the chat are only attached to turns that refer to them."""
+
+    def setUp(self):
+        self.prompts = []
+        patcher = mock.patch.object(ai_client, 'generate_content', side_effect=self._answer)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _answer(self, prompt, **kwargs):
+        self.prompts.append(prompt)
+        return 'ok'
+
+    def _upload(self):
+        response = self.client.post('/ai/chatbot/file/', {
+            'file_upload': SimpleUploadedFile('notes.txt', NOTES.encode()),
+            'message': 'Explain the volcano eruption',
+        })
+        self.assertEqual(response.status_code, 200)
+        return response.json()['document_id']
+
+    def _ask(self, message, **data):
+        response = self.client.post('/ai/api/', json.dumps(dict(data, message=message)), content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        return self.prompts[-1]
+
+    def test_follow_up_naming_the_document_gets_relevant_passages(self):
+        document_id = self._upload()
+        prompt = self._ask('How does mitochondria respiration work?', document_id=document_id)
+        self.assertIn('DOCUMENT TEXT', prompt)
+        self.assertIn('mitochondria respiration', prompt)
+
+    def test_turn_without_document_id_gets_no_document(self):
+        self._upload()
+        self.assertNotIn('DOCUMENT TEXT', self._ask('What is the capital of France?'))
+
+    def test_upload_question_without_matches_gets_opening_passages(self):
+        response = self.client.post('/ai/chatbot/file/', {
+            'file_upload': SimpleUploadedFile('notes.txt', NOTES.encode()),
+            'message': 'Summarize this',
+        })
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('Paragraph 0:', self.prompts[-1])
+
+    def test_unrelated_follow_up_gets_no_document(self):
+        document_id = self._upload()
+        self.assertNotIn('DOCUMENT TEXT', self._ask('What is the capital of France?', document_id=document_id))
+
+    def test_follow_up_in_another_worker_indexes_the_stored_text(self):
+        document_id = self._upload()
+        document_index._indexes.clear()  # as in a worker that did not see the upload
+        prompt = self._ask('Tell me about photosynthesis', document_id=document_id)
+        self.assertIn('photosynthesis chlorophyll', prompt)
+        self.assertEqual(len(document_index._indexes), 1)
+
+
+@override_settings(CHATBOT_RECENT_MESSAGES=2)
+class ConversationSummaryTests(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user('learner', 'learner@example.com', 'pw')
+        for number in range(6):
+            ChatMessage.objects.create(user=self.user, message_type='user' if number % 2 == 0 else 'ai', content=f'message {number}')
+        patcher = mock.patch.object(memory.ai_client, 'generate_content', return_value='They asked about cells.')
+        self.generate = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_older_messages_are_folded_into_one_summary(self):
+        memory.update_summary(self.user.pk, None)
+        memory.update_summary(self.user.pk, None)  # nothing new to fold
+
+        summary = ConversationSummary.objects.get(user=self.user)
+        self.assertEqual(summary.summary, 'They asked about cells.')
+        oldest_kept = ChatMessage.objects.filter(user=self.user).order_by('created_at')[4]
+        self.assertLess(summary.summarized_until, oldest_kept.created_at)
+        self.assertEqual(self.generate.call_count, 1)
+
+    def test_summary_written_meanwhile_by_another_worker_is_kept(self):
+        def other_worker_first(*args, **kwargs):
+            ConversationSummary.objects.create(
+                user=self.user, summary='From another worker', summarized_until=ChatMessage.objects.latest('created_at').created_at
+            )
+            return 'They asked about cells.'
+
+        self.generate.side_effect = other_worker_first
+        memory.update_summary(self.user.pk, None)
+        self.assertEqual(list(ConversationSummary.objects.values_list('summary', flat=True)), ['From another worker'])
+
+    def test_one_summary_per_chat(self):
+        ConversationSummary.objects.create(user=self.user)
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            ConversationSummary.objects.create(user=self.user)
+        ConversationSummary.objects.create(session_id='abc')
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            ConversationSummary.objects.create(session_id='abc')
+
+
+class KnowledgeRetrievalTests(TestCase):
+
+    def setUp(self):
+        for number in range(20):
+            ChatbotKnowledge.objects.create(
+                category='faq', question=f'Filler question {number}', answer=f'Filler answer {number}', keywords=f'topic{number}'
+            )
+        self.flashcards = ChatbotKnowledge.objects.create(
+            category='features', question='How do I create flashcards?', answer='Open Flashcards and paste your notes.',
+            keywords='flashcards, cards'
+        )
+        self.service = ChatbotService()
+
+    def test_only_relevant_entries_are_returned(self):
+        knowledge = self.service.get_relevant_knowledge('how do I make flashcards?')
+        self.assertTrue(knowledge.startswith('Category: features'))
+        self.assertNotIn('Filler answer 7', knowledge)
+
+    def test_searches_during_a_reload_see_the_previous_index(self):
+        self.service.get_relevant_knowledge('flashcards')
+        ChatbotKnowledge.objects.filter(pk=self.flashcards.pk).update(answer='Use the Flashcards page.')
+        self.service._knowledge_checked_at = None
+        seen_during_reload = []
+        original_add = BM25Index.add
+
+        def add(index, doc_id, text):
+            seen_during_reload.append(self.service._search_knowledge('flashcards'))
+            original_add(index, doc_id, text)
+
+        with mock.patch.object(BM25Index, 'add', add):
+            self.service._refresh_knowledge_index(version=('changed', 0))
+        self.assertTrue(seen_during_reload)
+        self.assertTrue(all('Open Flashcards' in knowledge for knowledge in seen_during_reload))
+        self.assertIn('Use the Flashcards page.', self.service._search_knowledge('flashcards'))
+
+
+class StreamingTests(TestCase):
+    """Streamed answers are saved once complete; answers cut off by a provider error are not."""
+
+    def _stream(self, *chunks, fail=False):
+        def stream_content(prompt, **kwargs):
+            yield from chunks
+            if fail:
+                raise ConnectionError('provider went away')
+        return mock.patch.object(ai_client, 'stream_content', side_effect=stream_content)
+
+    def _astream(self, *chunks, fail=False):
+        async def stream_content(prompt, **kwargs):
+            for chunk in chunks:
+                yield chunk
+            if fail:
+                raise ConnectionError('provider went away')
+        return mock.patch.object(async_ai_client, 'stream_content', side_effect=stream_content)
+
+    def _post(self, url='/ai/chatbot/stream/'):
+        response = self.client.post(url, json.dumps({'message': 'Explain osmosis'}), content_type='application/json')
+        return b''.join(response.streaming_content).decode()
+
+    def _saved(self):
+        return dict(ChatMessage.objects.values_list('message_type', 'content'))
+
+    def test_complete_answer_is_streamed_and_saved(self):
+        with self._stream('Osmosis is ', '*water* moving.'):
+            self.assertEqual(self._post(), 'Osmosis is water moving.')
+        self.assertEqual(self._saved(), {'user': 'Explain osmosis', 'ai': 'Osmosis is water moving.'})
+
+    def test_answer_cut_off_ends_with_the_error_marker_and_is_not_saved(self):
+        with self._stream('Osmosis is ', 'water', fail=True):
+            self.assertEqual(self._post(), 'Osmosis is water' + STREAM_ERROR_MARKER)
+        self.assertEqual(self._saved(), {'user': 'Explain osmosis'})
+
+    def test_failure_before_the_answer_starts_sends_the_fallback(self):
+        with self._stream(fail=True):
+            text = self._post()
+        self.assertNotIn(STREAM_ERROR_MARKER, text)
+        self.assertEqual(self._saved()['ai'], text)
+
+    async def test_async_answer_cut_off_is_not_saved(self):
+        with self._astream('Osmosis is ', fail=True):
+            response = await self.async_client.post(
+                '/ai/chatbot/stream/async/', json.dumps({'message': 'Explain osmosis'}), content_type='application/json'
+            )
+            text = b''.join([chunk async for chunk in response.streaming_content]).decode()
+        self.assertEqual(text, 'Osmosis is ' + STREAM_ERROR_MARKER)
+        self.assertEqual([m async for m in ChatMessage.objects.values_list('message_type', flat=True)], ['user'])
+
+
+class SystemPromptTests(SimpleTestCase):
+
+    def test_fixed_part_is_built_once(self):
+        service = ChatbotService()
+        with mock.patch.object(ChatbotService, '_build_system_prompt_parts', autospec=True, return_value=('HEAD', 'TAIL')) as build:
+            service.build_prompt('Hi', 'KNOWLEDGE')
+            service.build_prompt('Hello', 'KNOWLEDGE')
+        build.assert_called_once()
+
+    def test_turn_context_goes_between_the_fixed_parts(self):
+        service = ChatbotService()
+        service._system_prompt = ('HEAD', 'TAIL')
+        prompt = service.build_prompt(
+            'What is osmosis?', 'KNOWLEDGE', conversation_history=[{'message_type': 'user', 'content': 'Hello'}],
+            context_document='DOCUMENT', conversation_summary='SUMMARY',
+        )
+        order = [prompt.index(part) for part in ('HEAD', 'DOCUMENT', 'KNOWLEDGE', 'TAIL', 'SUMMARY', 'User: Hello', 'User: What is osmosis?')]
+        self.assertEqual(order, sorted(order))
+        self.assertTrue(prompt.endswith('AI:'))
+
+
+@override_settings(CHATBOT_KNOWLEDGE_CHECK_INTERVAL=3600)
+class KnowledgeInvalidationTests(TestCase):
+    """Knowledge edits reach the prompt without reloading the whole table on every turn."""
+
+    def setUp(self):
+        self.entry = ChatbotKnowledge.objects.create(
+            category='features', question='How do I create flashcards?', answer='Open Flashcards.', keywords='flashcards'
+        )
+        chatbot_service._knowledge_version = None
+        chatbot_service._knowledge_checked_at = None
+        self.assertIn('Open Flashcards.', chatbot_service.get_relevant_knowledge('flashcards'))
+
+    def test_edit_in_this_worker_is_applied_in_place(self):
+        self.entry.answer = 'Use the Flashcards page.'
+        self.entry.save()
+        with mock.patch.object(chatbot_service, '_load_knowledge_entries') as reload:
+            knowledge = chatbot_service.get_relevant_knowledge('flashcards')
+        self.assertIn('Use the Flashcards page.', knowledge)
+        reload.assert_not_called()
+
+    def test_deactivated_and_deleted_entries_leave_the_prompt(self):
+        self.entry.is_active = False
+        self.entry.save()
+        self.assertEqual(chatbot_service.get_relevant_knowledge('flashcards'), '')
+        self.entry.is_active = True
+        self.entry.save()
+        self.entry.delete()
+        self.assertEqual(chatbot_service.get_relevant_knowledge('flashcards'), '')
+
+    @override_settings(CHATBOT_KNOWLEDGE_CHECK_INTERVAL=0)
+    def test_edit_from_another_worker_is_picked_up_at_the_next_check(self):
+        # update() sends no signal, like an edit made through another worker
+        ChatbotKnowledge.objects.filter(pk=self.entry.pk).update(answer='Use the Flashcards page.', updated_at=timezone.now())
+        self.assertIn('Use the Flashcards page.', chatbot_service.get_relevant_knowledge('flashcards'))
+
+    def test_edit_from_another_worker_waits_for_the_check_interval(self):
+        ChatbotKnowledge.objects.filter(pk=self.entry.pk).update(answer='Use the Flashcards page.', updated_at=timezone.now())
+        self.assertIn('Open Flashcards.', chatbot_service.get_relevant_knowledge('flashcards'))
+
+
+@override_settings(CHATBOT_RECENT_MESSAGES=4, CHATBOT_SUMMARY_BATCH=4, CHATBOT_HISTORY_TOKEN_BUDGET=100)
+class ChatHistoryTests(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user('learner', 'learner@example.com', 'pw')
+        for number in range(6):
+            ChatMessage.objects.create(user=self.user, message_type='user' if number % 2 == 0 else 'ai', content=f'message {number}')
+        ChatMessage.objects.create(session_id='someone-else', message_type='user', content='not mine')
+
+    def test_history_is_loaded_with_one_query_per_source(self):
+        with self.assertNumQueries(2):
+            memory.load_memory(self.user, None, 'new question')
+
+    def test_history_is_chronological_and_ends_with_the_new_message(self):
+        history = memory.load_memory(self.user, None, 'new question').history
+        self.assertEqual([m['content'] for m in history], [f'message {n}' for n in range(6)] + ['new question'])
+
+    def test_history_keeps_the_newest_messages_within_the_budget(self):
+        ChatMessage.objects.create(user=self.user, message_type='ai', content='x' * 380)
+        history = memory.load_memory(self.user, None, 'new question').history
+        self.assertEqual([m['content'][:1] for m in history], ['x', 'n'])
+
+    def test_lookups_use_the_recent_history_indexes(self):
+        with connection.cursor() as cursor:
+            constraints = connection.introspection.get_constraints(cursor, ChatMessage._meta.db_table)
+        self.assertEqual(constraints['chat_msg_user_recent_idx']['columns'], ['user_id', 'created_at'])
+        self.assertEqual(constraints['chat_msg_session_recent_idx']['columns'], ['session_id', 'created_at'])
+
+    def test_a_turn_saves_both_messages_in_one_insert(self):
+        self.client.force_login(self.user)
+        with mock.patch.object(ai_client, 'generate_content', return_value='Answer'), \
+                CaptureQueriesContext(connection) as queries:
+            self.client.post('/ai/api/', json.dumps({'message': 'Question'}), content_type='application/json')
+        inserts = [q['sql'] for q in queries if q['sql'].startswith(f'INSERT INTO "{ChatMessage._meta.db_table}"')]
+        self.assertEqual(len(inserts), 1)
+        self.assertEqual(ChatMessage.objects.filter(user=self.user).count(), 8)
@@ -5,7 +5,9 @@ from . import views
 urlpatterns = [
     path('chatbot/', views.chatbot, name='chatbot'),
     path('chatbot/stream/', views.chatbot_stream, name='chatbot_stream'),
+    path('chatbot/stream/async/', views.chatbot_stream_async, name='chatbot_stream_async'),
     path('chatbot/file/', views.chatbot_file_api, name='chatbot_file_api'),
     path('test/', views.test_chatbot, name='test_chatbot'),
     path('api/', views.chatbot_api, name='chatbot_api'),
+    path('api/async/', views.chatbot_api_async, name='chatbot_api_async'),
 ]
\ No newline at end of file
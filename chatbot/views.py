@@ -1,20 +1,52 @@
 from django.shortcuts import render
 from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.http import require_http_methods
+from django.core.handlers.asgi import ASGIRequest
 from django.http import JsonResponse, StreamingHttpResponse
+from django.urls import reverse
 import json
 import logging
 import uuid
 
-from .chatbot_service import chatbot_service
+from .chatbot_service import STREAM_ERROR_MARKER, chatbot_service
+from .memory import aload_memory, load_memory, schedule_summary_update
 from .models import ChatMessage
 from .file_extractor import extract_text_from_file, FileExtractionError 
+from .document_index import get_document_index, index_document
+from .document_store import adocument_context, aget_document, document_context, get_document, save_document
+from materials.upload_handlers import hashing_uploads, upload_rejected
 
 logger = logging.getLogger(__name__)
 
+def _document_context(request, data, user_message):
+    """
+    Passages relevant to user_message from the chat document the request refers to by
+    document_id, or None. Only turns that name a document get one attached.
+    """
+    document = get_document(request.user, request.session.session_key, data.get('document_id'))
+    return document_context(document, user_message) if document else None
+
+
+async def _adocument_context(request, user, data, user_message):
+    """Async variant of _document_context."""
+    document = await aget_document(user, request.session.session_key, data.get('document_id'))
+    return await adocument_context(document, user_message) if document else None
+
+
+def _turn_messages(user, session_id, user_content, ai_content):
+    """The user and AI messages of one turn, saved together with a single bulk_create."""
+    return [
+        ChatMessage(user=user, session_id=session_id or '', message_type="user", content=user_content),
+        ChatMessage(user=user, session_id=session_id or '', message_type="ai", content=ai_content),
+    ]
+
+
 def chatbot(request):
     """ Renders chat page """
-    return render(request, 'ai/chat.html')
+    # under ASGI the page streams through the async view, which forwards each token
+    # as it arrives instead of buffering a sync generator
+    stream_view = 'ai:chatbot_stream_async' if isinstance(request, ASGIRequest) else 'ai:chatbot_stream'
+    return render(request, 'ai/chat.html', {'stream_url': reverse(stream_view)})
 
 def test_chatbot(request):
     """ Renders the test chatbot page """
@@ -29,8 +61,8 @@ def chatbot_api(request):
         # Standard chatbot_api expects JSON body
         data = json.loads(request.body)
         user_message = data.get('message', '')
-        # Context document is only available from the file upload endpoint
-        context_document = None 
+        # Follow-up questions about a document uploaded earlier in this session
+        context_document = _document_context(request, data, user_message)
 
         # Determine session (for anonymous users)
         if request.user.is_authenticated:
@@ -42,41 +74,20 @@ def chatbot_api(request):
             if not request.session.session_key:
                 request.session['session_id'] = session_id
 
-        # Save user message
-        user_msg = ChatMessage.objects.create(
-            user=user,
-            session_id=session_id,
-            message_type="user",
-            content=user_message
-        )
-
-        # Get last N messages for context
-        if user:
-            # Fetch last 7 to include the one just saved
-            history = ChatMessage.objects.filter(user=user).order_by('-created_at')[:7] 
-        else:
-            history = ChatMessage.objects.filter(session_id=session_id).order_by('-created_at')[:7]
-
-        # Reformat history for service
-        conversation_history = [
-            {"message_type": msg.message_type, "content": msg.content}
-            for msg in reversed(history)  # reverse to chronological order
-        ]
+        # Conversation summary and latest messages for context, plus the new one
+        memory = load_memory(user, session_id, user_message)
 
         # Get AI response
         response_message = chatbot_service.generate_response(
             user_message, 
-            conversation_history=conversation_history,
-            context_document=context_document
+            conversation_history=memory.history,
+            context_document=context_document,
+            conversation_summary=memory.summary
         )
 
-        # Save AI message
-        ChatMessage.objects.create(
-            user=user,
-            session_id=session_id,
-            message_type="ai",
-            content=response_message
-        )
+        # Save user and AI messages
+        ChatMessage.objects.bulk_create(_turn_messages(user, session_id, user_message, response_message))
+        schedule_summary_update(user, session_id, memory)
 
         return JsonResponse({"response": response_message})
 
@@ -89,11 +100,59 @@ def chatbot_api(request):
 
 @csrf_exempt
 @require_http_methods(["POST"])
+async def chatbot_api_async(request):
+    """
+    Async variant of chatbot_api for ASGI deployments. The provider call is awaited,
+    so a single worker can hold many chat turns in flight at once.
+    """
+    try:
+        data = json.loads(request.body)
+        user_message = data.get('message', '')
+
+        # Determine session (for anonymous users)
+        user = await request.auser()
+        context_document = await _adocument_context(request, user, data, user_message)
+        if user.is_authenticated:
+            session_id = None
+        else:
+            user = None
+            session_id = request.session.session_key or str(uuid.uuid4())
+            if not request.session.session_key:
+                await request.session.aset('session_id', session_id)
+
+        # Conversation summary and latest messages for context, plus the new one
+        memory = await aload_memory(user, session_id, user_message)
+
+        response_message = await chatbot_service.agenerate_response(
+            user_message,
+            conversation_history=memory.history,
+            context_document=context_document,
+            conversation_summary=memory.summary
+        )
+
+        # Save user and AI messages
+        await ChatMessage.objects.abulk_create(_turn_messages(user, session_id, user_message, response_message))
+        schedule_summary_update(user, session_id, memory)
+
+        return JsonResponse({"response": response_message})
+
+    except json.JSONDecodeError:
+        return JsonResponse({"error": "Invalid JSON"}, status=400)
+    except Exception as e:
+        logger.error(f"Chatbot async API error: {e}", exc_info=True)
+        return JsonResponse({"error": "Internal server error"}, status=500)
+
+
+@csrf_exempt
+@hashing_uploads(protect=False)
+@require_http_methods(["POST"])
 def chatbot_file_api(request):
     """
     Handles file upload, text extraction, and sends extracted text 
     plus user message to the AI for processing.
     """
+    if upload_rejected(request, 'file_upload'):
+        return JsonResponse({'error': 'File too large (max 10MB)'}, status=400)
     if 'file_upload' not in request.FILES:
         return JsonResponse({'error': 'No file uploaded. Please select a file.'}, status=400)
     
@@ -102,8 +161,20 @@ def chatbot_file_api(request):
     user_message = request.POST.get('message', 'Analyze the uploaded document.')
 
     try:
-        # 1. EXTRACT TEXT FROM FILE
-        context_document = extract_text_from_file(file)
+        # 1. EXTRACT AND INDEX THE FILE (reused when this file was indexed before)
+        content_hash = getattr(file, 'content_hash', None)
+        index = get_document_index(content_hash)
+        if index is None:
+            index = index_document(content_hash, extract_text_from_file(file))
+
+        # Keep the document for follow-up turns of this chat, referenced by id
+        if not request.session.session_key:
+            request.session.save()
+        chat_document = save_document(request.user, request.session.session_key, file.name, content_hash, index.text)
+
+        # only the passages relevant to the question go into the prompt; a question
+        # about the file as a whole ("summarize this") gets its opening passages
+        context_document = index.relevant_passages(user_message, fallback_to_opening=True)
         
         # 2. STANDARD CHATBOT LOGIC (Session, History, Save User Message)
         if request.user.is_authenticated:
@@ -115,42 +186,25 @@ def chatbot_file_api(request):
             if not request.session.session_key:
                 request.session['session_id'] = session_id
 
-        # Save user message, indicating that file context was included
-        ChatMessage.objects.create(
-            user=user,
-            session_id=session_id,
-            message_type="user",
-            # Log the original message and file name for history clarity
-            content=f"{user_message} (Context from file: {file.name})" 
-        )
+        # Log the original message and file name for history clarity
+        user_content = f"{user_message} (Context from file: {file.name})"
 
-        # Get last N messages for context
-        if user:
-            history = ChatMessage.objects.filter(user=user).order_by('-created_at')[:7] 
-        else:
-            history = ChatMessage.objects.filter(session_id=session_id).order_by('-created_at')[:7]
-
-        conversation_history = [
-            {"message_type": msg.message_type, "content": msg.content}
-            for msg in reversed(history)
-        ]
+        # Conversation summary and latest messages for context, plus the new one
+        memory = load_memory(user, session_id, user_content)
 
         # 3. GENERATE AI RESPONSE WITH CONTEXT
         response_message = chatbot_service.generate_response(
             user_message, 
-            conversation_history=conversation_history,
-            context_document=context_document # Pass the extracted text
+            conversation_history=memory.history,
+            context_document=context_document, # Pass the extracted text
+            conversation_summary=memory.summary
         )
 
-        # 4. SAVE AI MESSAGE AND RESPOND
-        ChatMessage.objects.create(
-            user=user,
-            session_id=session_id,
-            message_type="ai",
-            content=response_message
-        )
+        # 4. SAVE USER AND AI MESSAGES AND RESPOND
+        ChatMessage.objects.bulk_create(_turn_messages(user, session_id, user_content, response_message))
+        schedule_summary_update(user, session_id, memory)
 
-        return JsonResponse({"response": response_message, "filename": file.name})
+        return JsonResponse({"response": response_message, "filename": file.name, "document_id": str(chat_document.pk)})
 
     except FileExtractionError as fee:
         # Handle specific file-related errors cleanly
@@ -163,10 +217,14 @@ def chatbot_file_api(request):
 @csrf_exempt
 @require_http_methods(["POST"])
 def chatbot_stream(request):
-    """ Handles chatbot interactions via a streaming endpoint """
+    """
+    Handles chatbot interactions via a streaming endpoint. Tokens are forwarded as the
+    AI provider produces them; the assembled answer is saved when the stream ends.
+    """
     try:
         data = json.loads(request.body)
         user_message = data.get('message', '')
+        context_document = _document_context(request, data, user_message)
 
         # Determine session
         if request.user.is_authenticated:
@@ -178,47 +236,101 @@ def chatbot_stream(request):
             if not request.session.session_key:
                 request.session['session_id'] = session_id
 
-        # Save user message
-        ChatMessage.objects.create(
-            user=user,
-            session_id=session_id,
-            message_type="user",
-            content=user_message
-        )
+        # Conversation summary and latest messages, plus the new one
+        memory = load_memory(user, session_id, user_message)
 
-        # Get last N messages
-        if user:
-            history = ChatMessage.objects.filter(user=user).order_by('-created_at')[:6]
-        else:
-            history = ChatMessage.objects.filter(session_id=session_id).order_by('-created_at')[:6]
+        # Forward the answer as the provider streams it
+        def stream_response():
+            chunks = []
+            try:
+                for chunk in chatbot_service.stream_response(
+                    user_message,
+                    conversation_history=memory.history,
+                    context_document=context_document,
+                    conversation_summary=memory.summary
+                ):
+                    if chunk == STREAM_ERROR_MARKER:
+                        # the answer was cut off: show the error, keep it out of the history
+                        chunks.clear()
+                    else:
+                        chunks.append(chunk)
+                    yield chunk
+            finally:
+                # Save the turn once complete, or whatever was sent if the client went away
+                full_response = chatbot_service.clean_markdown(''.join(chunks))
+                messages = _turn_messages(user, session_id, user_message, full_response)
+                ChatMessage.objects.bulk_create(messages if full_response else messages[:1])
+                schedule_summary_update(user, session_id, memory)
+
+        response = StreamingHttpResponse(stream_response(), content_type="text/plain; charset=utf-8")
+        # keep proxies (nginx) from buffering the stream
+        response['Cache-Control'] = 'no-cache'
+        response['X-Accel-Buffering'] = 'no'
+        return response
 
-        conversation_history = [
-            {"message_type": msg.message_type, "content": msg.content}
-            for msg in reversed(history)
-        ]
+    except json.JSONDecodeError:
+        return JsonResponse({"error": "Invalid JSON"}, status=400)
+    except Exception as e:
+        logger.error(f"Chatbot Stream API error: {e}", exc_info=True)
+        return JsonResponse({"error": "Internal server error"}, status=500)
 
-        # Generate AI response (NOTE: Streaming response does not support document context yet in this view)
-        full_response = chatbot_service.generate_response(
-            user_message, conversation_history=conversation_history
-        )
 
-        # Save AI message
-        ChatMessage.objects.create(
-            user=user,
-            session_id=session_id,
-            message_type="ai",
-            content=full_response
-        )
+@csrf_exempt
+@require_http_methods(["POST"])
+async def chatbot_stream_async(request):
+    """
+    Async variant of chatbot_stream for ASGI deployments: the provider stream is read
+    without blocking, and each token is sent as soon as it arrives.
+    """
+    try:
+        data = json.loads(request.body)
+        user_message = data.get('message', '')
 
-        # Stream chunks of response
-        def stream_response():
-            for i in range(0, len(full_response), 10):  # send in chunks of 10 chars
-                yield full_response[i:i+10]
-        
-        return StreamingHttpResponse(stream_response(), content_type="text/plain")
+        # Determine session
+        user = await request.auser()
+        context_document = await _adocument_context(request, user, data, user_message)
+        if user.is_authenticated:
+            session_id = None
+        else:
+            user = None
+            session_id = request.session.session_key or str(uuid.uuid4())
+            if not request.session.session_key:
+                await request.session.aset('session_id', session_id)
+
+        # Conversation summary and latest messages, plus the new one
+        memory = await aload_memory(user, session_id, user_message)
+
+        # Forward the answer as the provider streams it
+        async def stream_response():
+            chunks = []
+            try:
+                async for chunk in chatbot_service.astream_response(
+                    user_message,
+                    conversation_history=memory.history,
+                    context_document=context_document,
+                    conversation_summary=memory.summary
+                ):
+                    if chunk == STREAM_ERROR_MARKER:
+                        # the answer was cut off: show the error, keep it out of the history
+                        chunks.clear()
+                    else:
+                        chunks.append(chunk)
+                    yield chunk
+            finally:
+                # Save the turn once complete, or whatever was sent if the client went away
+                full_response = chatbot_service.clean_markdown(''.join(chunks))
+                messages = _turn_messages(user, session_id, user_message, full_response)
+                await ChatMessage.objects.abulk_create(messages if full_response else messages[:1])
+                schedule_summary_update(user, session_id, memory)
+
+        response = StreamingHttpResponse(stream_response(), content_type="text/plain; charset=utf-8")
+        # keep proxies (nginx) from buffering the stream
+        response['Cache-Control'] = 'no-cache'
+        response['X-Accel-Buffering'] = 'no'
+        return response
 
     except json.JSONDecodeError:
         return JsonResponse({"error": "Invalid JSON"}, status=400)
     except Exception as e:
-        logger.error(f"Chatbot Stream API error: {e}", exc_info=True)
+        logger.error(f"Chatbot async Stream API error: {e}", exc_info=True)
         return JsonResponse({"error": "Internal server error"}, status=500)
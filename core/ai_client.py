@@ -1,14 +1,79 @@
 # core/ai_client.py
 import os
+import copy
 import json
+import asyncio
+import contextlib
+import hashlib
 import logging
+import threading
+import time
+import weakref
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+import httpx
 import requests
-from typing import List, Optional, Union
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from typing import AsyncIterator, Iterator, List, Optional, Union
 from core.exceptions import APIIntegrationError
 
 logger = logging.getLogger(__name__)
 DEFAULT_TIMEOUT = 30
 DEFAULT_PROVIDER_ORDER = ["azure", "deepseek", "gemini", "huggingface"]
+STREAMING_PROVIDERS = ("azure", "deepseek", "gemini")  # providers with a server-sent-events API
+
+# HTTP connection pooling defaults (overridable from django settings)
+DEFAULT_POOL_CONNECTIONS = 4
+DEFAULT_POOL_MAXSIZE = 16
+DEFAULT_MAX_RETRIES = 2
+DEFAULT_RETRY_BACKOFF = 0.5
+RETRY_STATUS_CODES = (429, 502, 503, 504)
+
+# Circuit breaker defaults (overridable from django settings)
+DEFAULT_BREAKER_WINDOW = 20            # calls kept in the rolling window
+DEFAULT_BREAKER_FAILURES = 3           # consecutive failures that open the circuit
+DEFAULT_BREAKER_ERROR_RATE = 0.5       # rolling error rate that opens the circuit
+DEFAULT_BREAKER_MIN_CALLS = 5          # calls needed before the error rate is trusted
+DEFAULT_BREAKER_COOLDOWN = 30          # seconds an open circuit waits before a probe
+
+# Hedged requests (overridable from django settings)
+DEFAULT_HEDGE_CALL_SITES = ["chatbot"]  # callers allowed to race a backup provider
+DEFAULT_HEDGE_PERCENTILE = 95           # primary latency percentile used as the hedge delay
+DEFAULT_HEDGE_DELAY = 3.0               # seconds, used until latency data exists
+DEFAULT_HEDGE_MIN_DELAY = 0.5           # never hedge sooner than this
+DEFAULT_HEDGE_MAX_WORKERS = 16
+
+# Response cache (overridable from django settings)
+DEFAULT_CACHE_ENABLED = True
+DEFAULT_CACHE_TTL = 3600                 # seconds
+DEFAULT_CACHE_MAX_ENTRIES = 512          # local LRU size per worker
+DEFAULT_CACHE_MAX_ITEM_BYTES = 256 * 1024
+DEFAULT_CACHE_SHARED = False             # also use django's cache framework
+DEFAULT_CACHE_ALIAS = "default"
+
+
+def _get_setting(name: str, default):
+    """Read a setting from django settings if configured, else from the environment."""
+    try:
+        from django.conf import settings as django_settings
+        value = getattr(django_settings, name, None)
+    except Exception:
+        value = None
+    if value is None:
+        value = os.environ.get(name)
+    if value is None:
+        return default
+    if isinstance(default, (list, tuple)) and isinstance(value, str):
+        return [item.strip() for item in value.split(",") if item.strip()]
+    if isinstance(default, bool) and isinstance(value, str):
+        return value.strip().lower() in ("1", "true", "yes")
+    if isinstance(default, (int, float)) and not isinstance(default, bool) and isinstance(value, str):
+        try:
+            return type(default)(value)
+        except ValueError:
+            return default
+    return value
 
 # lightweight helper to extract a JSON substring from noisy text
 def _extract_json_substring(text: str):
@@ -44,7 +109,275 @@ def _extract_json_substring(text: str):
         return None
 
 
-class AIClient:
+class ProviderHealth:
+    """
+    Rolling health record and circuit breaker for one provider.
+
+    closed    -> requests flow; failures are counted over a rolling window.
+    open      -> requests are skipped until the cooldown expires.
+    half_open -> a single probe request is let through; success closes the
+                 circuit, failure re-opens it for another cooldown.
+    """
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, name: str):
+        self.name = name
+        self.window = _get_setting('AI_BREAKER_WINDOW', DEFAULT_BREAKER_WINDOW)
+        self.failure_threshold = _get_setting('AI_BREAKER_FAILURES', DEFAULT_BREAKER_FAILURES)
+        self.error_rate_threshold = _get_setting('AI_BREAKER_ERROR_RATE', DEFAULT_BREAKER_ERROR_RATE)
+        self.min_calls = _get_setting('AI_BREAKER_MIN_CALLS', DEFAULT_BREAKER_MIN_CALLS)
+        self.cooldown = _get_setting('AI_BREAKER_COOLDOWN', DEFAULT_BREAKER_COOLDOWN)
+
+        self.calls = deque(maxlen=self.window)  # (succeeded, latency_seconds)
+        self.state = self.CLOSED
+        self.consecutive_failures = 0
+        self.opened_at = 0.0
+        self.last_failure_at = float("-inf")
+        self.probe_started_at = None
+        self._lock = threading.Lock()
+
+    def allow_request(self) -> bool:
+        """Whether a call may be sent now; moves open circuits to half-open after the cooldown."""
+        with self._lock:
+            now = time.monotonic()
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.OPEN:
+                if now - self.opened_at < self.cooldown:
+                    return False
+                self.state = self.HALF_OPEN
+                logger.info(f"AIClient: circuit for {self.name} half-open, sending probe")
+            # half-open: one probe at a time; a probe that never reported back is abandoned
+            if self.probe_started_at is not None and now - self.probe_started_at < DEFAULT_TIMEOUT * 2:
+                return False
+            self.probe_started_at = now
+            return True
+
+    def record_success(self, latency: float):
+        with self._lock:
+            self.calls.append((True, latency))
+            self.consecutive_failures = 0
+            self.probe_started_at = None
+            if self.state != self.CLOSED:
+                logger.info(f"AIClient: circuit for {self.name} closed")
+            self.state = self.CLOSED
+
+    def record_failure(self, latency: float):
+        with self._lock:
+            self.calls.append((False, latency))
+            self.consecutive_failures += 1
+            self.last_failure_at = time.monotonic()
+            self.probe_started_at = None
+            if (
+                self.state == self.HALF_OPEN
+                or self.consecutive_failures >= self.failure_threshold
+                or (len(self.calls) >= self.min_calls and self._error_rate() >= self.error_rate_threshold)
+            ):
+                if self.state != self.OPEN:
+                    logger.warning(f"AIClient: circuit for {self.name} opened (error rate {self._error_rate():.0%})")
+                self.state = self.OPEN
+                self.opened_at = time.monotonic()
+
+    def _error_rate(self) -> float:
+        if not self.calls:
+            return 0.0
+        return sum(1 for ok, _ in self.calls if not ok) / len(self.calls)
+
+    def release_probe(self):
+        """Forget an in-flight probe that was cancelled before it could report back."""
+        with self._lock:
+            self.probe_started_at = None
+
+    def error_rate(self) -> float:
+        with self._lock:
+            return self._error_rate()
+
+    def latency_percentile(self, pct: float) -> Optional[float]:
+        """Latency percentile of successful calls in the window, or None without data."""
+        with self._lock:
+            latencies = sorted(latency for ok, latency in self.calls if ok)
+        if not latencies:
+            return None
+        idx = min(len(latencies) - 1, int(round(pct / 100.0 * (len(latencies) - 1))))
+        return latencies[idx]
+
+    def score(self) -> float:
+        """Health score in [0, 1]: success rate discounted by median latency."""
+        if self.state == self.OPEN:
+            return 0.0
+        median = self.latency_percentile(50) or 0.0
+        return (1.0 - self.error_rate()) / (1.0 + median / DEFAULT_TIMEOUT)
+
+    def is_degraded(self) -> bool:
+        """
+        A failure within the last cooldown period, unless the circuit is due a probe:
+        probes run in the provider's configured slot so a recovered primary gets its
+        traffic back instead of waiting behind healthy fallbacks forever.
+        """
+        with self._lock:
+            now = time.monotonic()
+            if self.state == self.OPEN and now - self.opened_at >= self.cooldown:
+                return False
+            return self.state != self.CLOSED or now - self.last_failure_at < self.cooldown
+
+
+_health_registry = {}
+_health_lock = threading.Lock()
+
+
+def get_provider_health(provider: str) -> ProviderHealth:
+    """Process-wide health record for a provider, shared by the sync and async clients."""
+    health = _health_registry.get(provider)
+    if health is None:
+        with _health_lock:
+            health = _health_registry.setdefault(provider, ProviderHealth(provider))
+    return health
+
+
+class ResponseCache:
+    """
+    Content-addressed cache of successful AI responses.
+
+    Keys hash (provider list, prompt, max_tokens, temperature). Lookups hit an
+    in-process LRU first and, when AI_CACHE_SHARED is on, Django's cache framework
+    second, so workers can share results. Entries expire after AI_CACHE_TTL seconds;
+    the local tier holds at most AI_CACHE_MAX_ENTRIES items and responses larger than
+    AI_CACHE_MAX_ITEM_BYTES are never cached.
+    """
+
+    def __init__(self):
+        self._entries = OrderedDict()  # key -> (expires_at, value)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.shared_hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def enabled() -> bool:
+        return _get_setting('AI_CACHE_ENABLED', DEFAULT_CACHE_ENABLED)
+
+    @staticmethod
+    def make_key(providers: List[str], prompt: str, max_tokens: int, temperature: Optional[float]) -> str:
+        material = json.dumps(
+            [[p.lower() for p in providers], prompt, max_tokens, temperature],
+            ensure_ascii=False,
+        )
+        return "ai_response:" + hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+    @staticmethod
+    def _shared_cache():
+        if not _get_setting('AI_CACHE_SHARED', DEFAULT_CACHE_SHARED):
+            return None
+        try:
+            from django.core.cache import caches
+            return caches[_get_setting('AI_CACHE_ALIAS', DEFAULT_CACHE_ALIAS)]
+        except Exception as e:
+            logger.debug(f"ResponseCache: shared tier unavailable: {e}")
+            return None
+
+    def _get_local(self, key: str):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+        return copy.deepcopy(value)
+
+    def _set_local(self, key: str, value):
+        max_entries = _get_setting('AI_CACHE_MAX_ENTRIES', DEFAULT_CACHE_MAX_ENTRIES)
+        expires_at = time.monotonic() + _get_setting('AI_CACHE_TTL', DEFAULT_CACHE_TTL)
+        with self._lock:
+            self._entries[key] = (expires_at, copy.deepcopy(value))
+            self._entries.move_to_end(key)
+            while len(self._entries) > max_entries:
+                self._entries.popitem(last=False)
+
+    @staticmethod
+    def _cacheable(value) -> bool:
+        size = len(value) if isinstance(value, str) else len(json.dumps(value, default=str))
+        return size <= _get_setting('AI_CACHE_MAX_ITEM_BYTES', DEFAULT_CACHE_MAX_ITEM_BYTES)
+
+    def _record_miss(self, key: str):
+        with self._lock:
+            self.misses += 1
+        logger.debug(f"ResponseCache: miss {key[-12:]} ({self.stats()})")
+
+    def _record_shared_hit(self, key: str, value):
+        with self._lock:
+            self.shared_hits += 1
+        self._set_local(key, value)
+
+    def get(self, key: str):
+        value = self._get_local(key)
+        if value is not None:
+            return value
+        shared = self._shared_cache()
+        if shared is not None:
+            value = shared.get(key)
+            if value is not None:
+                self._record_shared_hit(key, value)
+                return value
+        self._record_miss(key)
+        return None
+
+    def set(self, key: str, value):
+        if not self._cacheable(value):
+            return
+        self._set_local(key, value)
+        shared = self._shared_cache()
+        if shared is not None:
+            shared.set(key, value, _get_setting('AI_CACHE_TTL', DEFAULT_CACHE_TTL))
+
+    async def aget(self, key: str):
+        value = self._get_local(key)
+        if value is not None:
+            return value
+        shared = self._shared_cache()
+        if shared is not None:
+            value = await shared.aget(key)
+            if value is not None:
+                self._record_shared_hit(key, value)
+                return value
+        self._record_miss(key)
+        return None
+
+    async def aset(self, key: str, value):
+        if not self._cacheable(value):
+            return
+        self._set_local(key, value)
+        shared = self._shared_cache()
+        if shared is not None:
+            await shared.aset(key, value, _get_setting('AI_CACHE_TTL', DEFAULT_CACHE_TTL))
+
+    def stats(self) -> dict:
+        return {
+            "hits": self.hits,
+            "shared_hits": self.shared_hits,
+            "misses": self.misses,
+            "entries": len(self._entries),
+        }
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+response_cache = ResponseCache()
+
+
+class BaseAIClient:
+    """
+    Provider configuration shared by the sync and async clients: priority order,
+    lazily-refreshed API keys, per-provider request payloads and output normalization.
+    """
+
     def __init__(self, provider_priority: Optional[List[str]] = None):
         self.providers_config = provider_priority or None
 
@@ -76,7 +409,7 @@ class AIClient:
             # not fatal
             pass
 
-        logger.info(f"AIClient initialized with provider order: {self.providers}")
+        logger.info(f"{type(self).__name__} initialized with provider order: {self.providers}")
 
     def _refresh_keys(self):
         """Pull keys from django settings if available, else environment."""
@@ -101,67 +434,98 @@ class AIClient:
         self.hf_token = getattr(django_settings, 'HUGGING_FACE_API_TOKEN', None) if has_settings else os.environ.get("HUGGING_FACE_API_TOKEN")
         self.hf_url_template = getattr(django_settings, 'HUGGING_FACE_API_URL_TEMPLATE', None) if has_settings else os.environ.get("HUGGING_FACE_API_URL_TEMPLATE", "https://api-inference.huggingface.co/models/{model}")
 
-    def generate_content(self, prompt: str, max_tokens: int = 1024, providers: Optional[List[str]] = None, raise_on_error: bool = True) -> Union[dict, str]:
-        """
-        Try providers in order. Return either:
-          - dict (if JSON content detected and parsed)
-          - str (raw text) otherwise
+    @staticmethod
+    def _canonical(provider: str) -> str:
+        return "huggingface" if provider == "hf" else provider
 
-        Caller must handle both. We will try to parse JSON from provider output before returning.
+    def _provider_ready(self, provider: str) -> bool:
+        """True when the keys needed to call this provider are present."""
+        provider = self._canonical(provider)
+        if provider == "azure":
+            return bool(self.azure_key and (self.azure_endpoint or self.azure_deployment))
+        if provider == "deepseek":
+            return bool(self.deepseek_key)
+        if provider == "gemini":
+            return bool(self.gemini_key)
+        if provider == "huggingface":
+            return bool(self.hf_token)
+        return False
+
+    def _candidates(self, provider_list: List[str], errors):
         """
-        self._refresh_keys()
-        provider_list = providers or self.providers
-        errors = []
+        Yield providers to try, in health order, that are configured and whose circuit
+        admits a call. Skipped providers are recorded in errors.
+        """
+        for provider in self._ordered_providers(provider_list):
+            if not self._provider_ready(provider):
+                errors.append((provider, "Provider not configured"))
+                continue
+            if not get_provider_health(self._canonical(provider)).allow_request():
+                errors.append((provider, "Circuit open"))
+                continue
+            yield provider
 
-        for provider in provider_list:
+    @staticmethod
+    def _should_hedge(call_site: Optional[str]) -> bool:
+        return bool(call_site) and call_site in _get_setting('AI_HEDGE_CALL_SITES', DEFAULT_HEDGE_CALL_SITES)
+
+    @staticmethod
+    def _hedge_delay(provider: str) -> float:
+        """Seconds to wait on a provider before hedging: its latency percentile, clamped."""
+        health = get_provider_health(BaseAIClient._canonical(provider))
+        delay = health.latency_percentile(_get_setting('AI_HEDGE_PERCENTILE', DEFAULT_HEDGE_PERCENTILE))
+        if delay is None:
+            delay = _get_setting('AI_HEDGE_DELAY', DEFAULT_HEDGE_DELAY)
+        return min(max(delay, _get_setting('AI_HEDGE_MIN_DELAY', DEFAULT_HEDGE_MIN_DELAY)), DEFAULT_TIMEOUT)
+
+    def _ordered_providers(self, provider_list: List[str]) -> List[str]:
+        """
+        Order providers for this call by health. Healthy providers keep their configured
+        order; degraded ones (recent errors, half-open or open circuits) move behind them,
+        best health score first. Circuit state itself is enforced by allow_request().
+        """
+        ranked = []
+        for index, provider in enumerate(provider_list):
             provider = provider.lower()
-            try:
-                logger.debug(f"AIClient: attempting provider {provider}")
-                if provider == "azure" and self.azure_key and (self.azure_endpoint or self.azure_deployment):
-                    raw = self._call_azure_openai(prompt, max_tokens)
-                elif provider == "deepseek" and self.deepseek_key:
-                    raw = self._call_deepseek(prompt, max_tokens)
-                elif provider == "gemini" and self.gemini_key:
-                    raw = self._call_gemini(prompt, max_tokens)
-                elif provider in ("huggingface", "hf") and self.hf_token:
-                    raw = self._call_huggingface(prompt, max_tokens)
-                else:
-                    errors.append((provider, "Provider not configured"))
-                    continue
+            health = get_provider_health(self._canonical(provider))
+            if health.is_degraded():
+                ranked.append((1, -health.score(), index, provider))
+            else:
+                ranked.append((0, 0.0, index, provider))
+        return [provider for _, _, _, provider in sorted(ranked)]
 
-                if raw is None:
-                    raise APIIntegrationError(f"{provider} returned empty response")
+    def _normalize_output(self, provider: str, raw) -> Union[dict, str]:
+        """Turn a provider body into parsed JSON when possible, else stripped text."""
+        if raw is None:
+            raise APIIntegrationError(f"{provider} returned empty response")
 
-                # raw may be dict already (some client libraries), normalize to string if so for JSON extraction attempt
-                if isinstance(raw, dict):
-                    logger.debug(f"{provider}: provider returned dict directly.")
-                    return raw
-
-                text = str(raw).strip()
-                if not text:
-                    raise APIIntegrationError(f"{provider} returned empty text")
-
-                # Try full JSON parse
-                try:
-                    parsed = json.loads(text)
-                    logger.debug(f"{provider}: response parsed as full JSON")
-                    return parsed
-                except Exception:
-                    # try to extract a JSON substring if provider returned explanation + JSON
-                    parsed = _extract_json_substring(text)
-                    if parsed is not None:
-                        logger.debug(f"{provider}: extracted JSON substring from response")
-                        return parsed
-
-                    # otherwise return raw text so caller can handle
-                    logger.debug(f"{provider}: returning raw text (not JSON)")
-                    return text
+        # raw may be dict already (some client libraries), normalize to string if so for JSON extraction attempt
+        if isinstance(raw, dict):
+            logger.debug(f"{provider}: provider returned dict directly.")
+            return raw
 
-            except Exception as e:
-                logger.warning(f"Provider {provider} failed: {e}", exc_info=False)
-                errors.append((provider, str(e)))
-                continue
+        text = str(raw).strip()
+        if not text:
+            raise APIIntegrationError(f"{provider} returned empty text")
+
+        # Try full JSON parse
+        try:
+            parsed = json.loads(text)
+            logger.debug(f"{provider}: response parsed as full JSON")
+            return parsed
+        except Exception:
+            # try to extract a JSON substring if provider returned explanation + JSON
+            parsed = _extract_json_substring(text)
+            if parsed is not None:
+                logger.debug(f"{provider}: extracted JSON substring from response")
+                return parsed
+
+            # otherwise return raw text so caller can handle
+            logger.debug(f"{provider}: returning raw text (not JSON)")
+            return text
 
+    @staticmethod
+    def _all_failed(errors, raise_on_error: bool) -> str:
         err_msg = "; ".join([f"{p}: {m}" for p, m in errors])
         logger.error(f"AIClient: all providers failed. Details: {err_msg}")
         if raise_on_error:
@@ -169,9 +533,22 @@ class AIClient:
         return ""
 
     # -----------------------------
-    # Provider Implementations
+    # Provider Requests
     # -----------------------------
-    def _call_deepseek(self, prompt: str, max_tokens: int) -> str:
+    def _build_request(self, provider: str, prompt: str, max_tokens: int, temperature: Optional[float] = None):
+        """Return (url, headers, payload) for a provider call."""
+        builders = {
+            "azure": self._azure_request,
+            "deepseek": self._deepseek_request,
+            "gemini": self._gemini_request,
+            "huggingface": self._huggingface_request,
+        }
+        builder = builders.get(self._canonical(provider))
+        if builder is None:
+            raise APIIntegrationError(f"Unknown provider: {provider}")
+        return builder(prompt, max_tokens, temperature)
+
+    def _deepseek_request(self, prompt: str, max_tokens: int, temperature: Optional[float] = None):
         url = self.deepseek_url
         headers = {
             "Content-Type": "application/json",
@@ -182,13 +559,11 @@ class AIClient:
             "messages": [{"role": "user", "content": prompt}],
             "max_tokens": max_tokens,
         }
-        resp = requests.post(url, headers=headers, json=payload, timeout=DEFAULT_TIMEOUT)
-        resp.raise_for_status()
-        data = resp.text
-        # return textual body; normalization happens in generate_content
-        return data
+        if temperature is not None:
+            payload["temperature"] = temperature
+        return url, headers, payload
 
-    def _call_azure_openai(self, prompt: str, max_tokens: int) -> str:
+    def _azure_request(self, prompt: str, max_tokens: int, temperature: Optional[float] = None):
         if not self.azure_endpoint or not self.azure_key:
             raise APIIntegrationError("Azure OpenAI not configured")
 
@@ -212,33 +587,526 @@ class AIClient:
         payload = {
             "messages": [{"role": "user", "content": prompt}],
             "max_tokens": max_tokens,
-            "temperature": 0.7
+            "temperature": 0.7 if temperature is None else temperature
         }
+        return url, headers, payload
 
-        resp = requests.post(url, headers=headers, json=payload, timeout=DEFAULT_TIMEOUT)
-        resp.raise_for_status()
-        # return the raw text body (JSON string or plain text)
-        return resp.text
-
-    def _call_gemini(self, prompt: str, max_tokens: int) -> str:
+    def _gemini_request(self, prompt: str, max_tokens: int, temperature: Optional[float] = None):
         url = f"{self.gemini_url}?key={self.gemini_key}"
         headers = {"Content-Type": "application/json"}
         payload = {
             "contents": [{"parts": [{"text": prompt}]}],
             "generationConfig": {"maxOutputTokens": max_tokens},
         }
-        resp = requests.post(url, headers=headers, json=payload, timeout=DEFAULT_TIMEOUT)
-        resp.raise_for_status()
-        return resp.text
+        if temperature is not None:
+            payload["generationConfig"]["temperature"] = temperature
+        return url, headers, payload
 
-    def _call_huggingface(self, prompt: str, max_tokens: int) -> str:
+    def _huggingface_request(self, prompt: str, max_tokens: int, temperature: Optional[float] = None):
         url = self.hf_url_template.format(model="gpt2")
         headers = {"Authorization": f"Bearer {self.hf_token}"}
         payload = {"inputs": prompt, "parameters": {"max_new_tokens": max_tokens}}
-        resp = requests.post(url, headers=headers, json=payload, timeout=DEFAULT_TIMEOUT)
+        if temperature is not None:
+            payload["parameters"]["temperature"] = temperature
+        return url, headers, payload
+
+    # -----------------------------
+    # Streaming
+    # -----------------------------
+    def _streaming_providers(self, provider_list: List[str], errors) -> List[str]:
+        """Providers of provider_list that can stream; the others are recorded in errors."""
+        streaming = []
+        for provider in provider_list:
+            provider = provider.lower()
+            if self._canonical(provider) in STREAMING_PROVIDERS:
+                streaming.append(provider)
+            else:
+                errors.append((provider, "Streaming not supported"))
+        return streaming
+
+    def _build_stream_request(self, provider: str, prompt: str, max_tokens: int, temperature: Optional[float] = None):
+        """Return (url, headers, payload) for a call answered as server-sent events."""
+        url, headers, payload = self._build_request(provider, prompt, max_tokens, temperature)
+        if self._canonical(provider) == "gemini":
+            base, _, query = url.partition("?")
+            url = f"{base.replace(':generateContent', ':streamGenerateContent')}?alt=sse&{query}"
+        else:
+            # OpenAI-compatible chat completions (Azure, DeepSeek)
+            payload["stream"] = True
+        return url, headers, payload
+
+    def _parse_stream_line(self, provider: str, line: str) -> Optional[str]:
+        """
+        Text carried by one line of a provider event stream: '' for lines without text
+        (comments, keep-alives, role or filter events), None once the stream is done.
+        """
+        if not line or not line.startswith("data:"):
+            return ""
+        data = line[len("data:"):].strip()
+        if data == "[DONE]":
+            return None
+        try:
+            event = json.loads(data)
+        except ValueError:
+            logger.debug(f"{provider}: skipping malformed stream event")
+            return ""
+        if event.get("error"):
+            raise APIIntegrationError(f"{provider} stream error: {event['error']}")
+
+        if self._canonical(provider) == "gemini":
+            candidates = event.get("candidates") or [{}]
+            parts = (candidates[0].get("content") or {}).get("parts") or []
+            return "".join(part.get("text", "") for part in parts)
+        choices = event.get("choices") or [{}]
+        return (choices[0].get("delta") or {}).get("content") or ""
+
+
+class AIClient(BaseAIClient):
+    """Synchronous client: tries providers in order over pooled keep-alive sessions."""
+
+    def __init__(self, provider_priority: Optional[List[str]] = None):
+        super().__init__(provider_priority)
+        # one pooled keep-alive session per provider, created lazily
+        self._sessions = {}
+        self._sessions_pid = os.getpid()
+        self._sessions_lock = threading.Lock()
+        self._hedge_executor = None
+        self._hedge_executor_pid = None
+
+    def _build_session(self) -> requests.Session:
+        """Create a requests.Session with a sized connection pool and retry adapter."""
+        retries = Retry(
+            total=_get_setting('AI_HTTP_MAX_RETRIES', DEFAULT_MAX_RETRIES),
+            connect=_get_setting('AI_HTTP_MAX_RETRIES', DEFAULT_MAX_RETRIES),
+            read=0,  # never replay a request the provider may already be generating
+            status=_get_setting('AI_HTTP_MAX_RETRIES', DEFAULT_MAX_RETRIES),
+            backoff_factor=_get_setting('AI_HTTP_RETRY_BACKOFF', DEFAULT_RETRY_BACKOFF),
+            status_forcelist=RETRY_STATUS_CODES,
+            allowed_methods=frozenset(["GET", "POST"]),
+            raise_on_status=False,
+            respect_retry_after_header=True,
+        )
+        adapter = HTTPAdapter(
+            pool_connections=_get_setting('AI_HTTP_POOL_CONNECTIONS', DEFAULT_POOL_CONNECTIONS),
+            pool_maxsize=_get_setting('AI_HTTP_POOL_MAXSIZE', DEFAULT_POOL_MAXSIZE),
+            max_retries=retries,
+        )
+        session = requests.Session()
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+        return session
+
+    def _get_session(self, provider: str) -> requests.Session:
+        """
+        Return the pooled session for a provider.
+
+        Sessions are shared by all threads of a worker (urllib3 pools are thread-safe);
+        creation is guarded by a lock, and sessions are rebuilt after a fork so that
+        gunicorn workers never share sockets inherited from the master process.
+        """
+        pid = os.getpid()
+        session = self._sessions.get(provider)
+        if session is not None and self._sessions_pid == pid:
+            return session
+
+        with self._sessions_lock:
+            if self._sessions_pid != pid:
+                self._sessions = {}
+                self._sessions_pid = pid
+            session = self._sessions.get(provider)
+            if session is None:
+                session = self._build_session()
+                self._sessions[provider] = session
+                logger.debug(f"AIClient: created pooled HTTP session for {provider}")
+            return session
+
+    def close(self):
+        """Close all pooled provider sessions."""
+        with self._sessions_lock:
+            for session in self._sessions.values():
+                session.close()
+            self._sessions = {}
+
+    def _get_hedge_executor(self) -> ThreadPoolExecutor:
+        """Thread pool for hedged calls, created lazily per worker process."""
+        pid = os.getpid()
+        if self._hedge_executor is None or self._hedge_executor_pid != pid:
+            with self._sessions_lock:
+                if self._hedge_executor is None or self._hedge_executor_pid != pid:
+                    self._hedge_executor = ThreadPoolExecutor(
+                        max_workers=_get_setting('AI_HEDGE_MAX_WORKERS', DEFAULT_HEDGE_MAX_WORKERS),
+                        thread_name_prefix="ai-hedge",
+                    )
+                    self._hedge_executor_pid = pid
+        return self._hedge_executor
+
+    def generate_content(self, prompt: str, max_tokens: int = 1024, providers: Optional[List[str]] = None, raise_on_error: bool = True, call_site: Optional[str] = None, temperature: Optional[float] = None, use_cache: bool = True) -> Union[dict, str]:
+        """
+        Try providers in order. Return either:
+          - dict (if JSON content detected and parsed)
+          - str (raw text) otherwise
+
+        Caller must handle both. We will try to parse JSON from provider output before returning.
+
+        call_site names the caller (e.g. "chatbot"); call sites listed in AI_HEDGE_CALL_SITES
+        race a backup provider when the primary is slower than its hedge delay.
+        Successful responses are served from response_cache unless use_cache is False.
+        """
+        provider_list = providers or self.providers
+        cache_key = None
+        if use_cache and response_cache.enabled():
+            cache_key = response_cache.make_key(provider_list, prompt, max_tokens, temperature)
+            cached = response_cache.get(cache_key)
+            if cached is not None:
+                return cached
+
+        result = self._generate(prompt, max_tokens, provider_list, raise_on_error, call_site, temperature)
+        if cache_key and result:
+            response_cache.set(cache_key, result)
+        return result
+
+    def _generate(self, prompt: str, max_tokens: int, provider_list: List[str], raise_on_error: bool, call_site: Optional[str], temperature: Optional[float]) -> Union[dict, str]:
+        self._refresh_keys()
+        errors = []
+        candidates = self._candidates(provider_list, errors)
+
+        if self._should_hedge(call_site):
+            result = self._generate_hedged(candidates, prompt, max_tokens, temperature, errors)
+            if result is not None:
+                return result
+            return self._all_failed(errors, raise_on_error)
+
+        for provider in candidates:
+            try:
+                logger.debug(f"AIClient: attempting provider {provider}")
+                return self._attempt(provider, prompt, max_tokens, temperature)
+            except Exception as e:
+                logger.warning(f"Provider {provider} failed: {e}", exc_info=False)
+                errors.append((provider, str(e)))
+                continue
+
+        return self._all_failed(errors, raise_on_error)
+
+    def _generate_hedged(self, candidates, prompt: str, max_tokens: int, temperature: Optional[float], errors):
+        """
+        Race providers: the primary runs alone until its hedge delay passes, then the next
+        candidate is started and the first good answer wins. A failed call is replaced by
+        the next candidate, so fallback semantics are kept. Losing calls are cancelled if
+        not yet started; calls already on the wire finish in the background and only
+        update provider health. Returns None when every provider failed.
+        """
+        executor = self._get_hedge_executor()
+        pending = {}
+        hedged = False
+
+        def launch():
+            provider = next(candidates, None)
+            if provider is None:
+                return False
+            logger.debug(f"AIClient: attempting provider {provider} (hedged)")
+            pending[executor.submit(self._attempt, provider, prompt, max_tokens, temperature)] = provider
+            return True
+
+        launch()
+        try:
+            while pending:
+                timeout = None
+                if not hedged and len(pending) == 1:
+                    timeout = self._hedge_delay(next(iter(pending.values())))
+                done, _ = wait(list(pending), timeout=timeout, return_when=FIRST_COMPLETED)
+
+                if not done:
+                    # primary is slow: send the same prompt to the next provider
+                    hedged = True
+                    if launch():
+                        logger.info(f"AIClient: hedging {list(pending.values())[0]} with {list(pending.values())[-1]}")
+                    continue
+
+                for future in done:
+                    provider = pending.pop(future)
+                    try:
+                        return future.result()
+                    except Exception as e:
+                        logger.warning(f"Provider {provider} failed: {e}", exc_info=False)
+                        errors.append((provider, str(e)))
+                if not pending:
+                    launch()
+            return None
+        finally:
+            for future in pending:
+                future.cancel()
+
+    def _attempt(self, provider: str, prompt: str, max_tokens: int, temperature: Optional[float] = None) -> Union[dict, str]:
+        """Call one provider, recording latency and outcome in its health record."""
+        health = get_provider_health(self._canonical(provider))
+        started = time.monotonic()
+        try:
+            raw = self._call_provider(provider, prompt, max_tokens, temperature)
+            result = self._normalize_output(provider, raw)
+        except Exception:
+            health.record_failure(time.monotonic() - started)
+            raise
+        health.record_success(time.monotonic() - started)
+        return result
+
+    def _call_provider(self, provider: str, prompt: str, max_tokens: int, temperature: Optional[float] = None) -> str:
+        url, headers, payload = self._build_request(provider, prompt, max_tokens, temperature)
+        resp = self._get_session(self._canonical(provider)).post(url, headers=headers, json=payload, timeout=DEFAULT_TIMEOUT)
+        resp.raise_for_status()
+        # return textual body; normalization happens in generate_content
+        return resp.text
+
+    def stream_content(self, prompt: str, max_tokens: int = 1024, providers: Optional[List[str]] = None, temperature: Optional[float] = None) -> Iterator[str]:
+        """
+        Generator yielding the answer text as the provider produces it (server-sent events).
+
+        Streaming providers are tried in health order like generate_content, but one can
+        only be replaced before it has produced text: a failure after the first token is
+        raised as APIIntegrationError. Raises APIIntegrationError when no provider could
+        stream. Streamed answers are neither hedged nor cached.
+        """
+        self._refresh_keys()
+        errors = []
+        for provider in self._candidates(self._streaming_providers(providers or self.providers, errors), errors):
+            logger.debug(f"AIClient: streaming from provider {provider}")
+            health = get_provider_health(self._canonical(provider))
+            started = time.monotonic()
+            streamed = False
+            try:
+                for text in self._stream_provider(provider, prompt, max_tokens, temperature):
+                    streamed = True
+                    yield text
+                if not streamed:
+                    raise APIIntegrationError(f"{provider} returned empty response")
+            except GeneratorExit:
+                # the consumer went away; not a provider failure
+                health.release_probe()
+                raise
+            except Exception as e:
+                health.record_failure(time.monotonic() - started)
+                if streamed:
+                    raise APIIntegrationError(f"{provider} stream interrupted: {e}") from e
+                logger.warning(f"Provider {provider} failed: {e}", exc_info=False)
+                errors.append((provider, str(e)))
+                continue
+            health.record_success(time.monotonic() - started)
+            return
+
+        self._all_failed(errors, raise_on_error=True)
+
+    def _stream_provider(self, provider: str, prompt: str, max_tokens: int, temperature: Optional[float] = None) -> Iterator[str]:
+        url, headers, payload = self._build_stream_request(provider, prompt, max_tokens, temperature)
+        session = self._get_session(self._canonical(provider))
+        with session.post(url, headers=headers, json=payload, stream=True, timeout=DEFAULT_TIMEOUT) as resp:
+            resp.raise_for_status()
+            # event streams are UTF-8 whatever the content type says
+            resp.encoding = "utf-8"
+            # chunk_size=None hands over each chunk as it arrives instead of filling a buffer
+            for line in resp.iter_lines(chunk_size=None, decode_unicode=True):
+                text = self._parse_stream_line(provider, line)
+                if text is None:
+                    return
+                if text:
+                    yield text
+
+
+class AsyncAIClient(BaseAIClient):
+    """
+    asyncio counterpart of AIClient for ASGI views.
+
+    Same provider order, request payloads and fallback semantics as AIClient, but every
+    provider call is awaited over a pooled httpx.AsyncClient, so an event loop can keep
+    many LLM requests in flight without tying up a worker thread per request.
+    """
+
+    def __init__(self, provider_priority: Optional[List[str]] = None):
+        super().__init__(provider_priority)
+        # httpx clients are bound to the event loop they were first used on
+        self._clients = weakref.WeakKeyDictionary()
+
+    def _new_client(self) -> httpx.AsyncClient:
+        limits = httpx.Limits(
+            max_connections=_get_setting('AI_HTTP_POOL_MAXSIZE', DEFAULT_POOL_MAXSIZE) * len(DEFAULT_PROVIDER_ORDER),
+            max_keepalive_connections=_get_setting('AI_HTTP_POOL_MAXSIZE', DEFAULT_POOL_MAXSIZE),
+        )
+        # httpx transports only retry connection failures, never a sent request
+        transport = httpx.AsyncHTTPTransport(
+            limits=limits,
+            retries=_get_setting('AI_HTTP_MAX_RETRIES', DEFAULT_MAX_RETRIES),
+        )
+        return httpx.AsyncClient(transport=transport, timeout=DEFAULT_TIMEOUT)
+
+    def _get_client(self) -> httpx.AsyncClient:
+        loop = asyncio.get_running_loop()
+        client = self._clients.get(loop)
+        if client is None:
+            client = self._new_client()
+            self._clients[loop] = client
+        return client
+
+    @contextlib.asynccontextmanager
+    async def _client(self) -> AsyncIterator[httpx.AsyncClient]:
+        """
+        The httpx client for one provider call. An ASGI worker runs its event loop on the
+        main thread for its whole life, so that loop keeps one pooled client. Any other loop
+        (async views under WSGI, asyncio.run() in a background thread) is discarded after a
+        single call, so it gets its own client, closed on exit.
+        """
+        if threading.current_thread() is threading.main_thread():
+            yield self._get_client()
+            return
+        async with self._new_client() as client:
+            yield client
+
+    async def aclose(self):
+        """Close the httpx client bound to the running event loop."""
+        client = self._clients.pop(asyncio.get_running_loop(), None)
+        if client is not None:
+            await client.aclose()
+
+    async def generate_content(self, prompt: str, max_tokens: int = 1024, providers: Optional[List[str]] = None, raise_on_error: bool = True, call_site: Optional[str] = None, temperature: Optional[float] = None, use_cache: bool = True) -> Union[dict, str]:
+        """Async version of AIClient.generate_content; returns the same dict-or-str shapes."""
+        provider_list = providers or self.providers
+        cache_key = None
+        if use_cache and response_cache.enabled():
+            cache_key = response_cache.make_key(provider_list, prompt, max_tokens, temperature)
+            cached = await response_cache.aget(cache_key)
+            if cached is not None:
+                return cached
+
+        result = await self._generate(prompt, max_tokens, provider_list, raise_on_error, call_site, temperature)
+        if cache_key and result:
+            await response_cache.aset(cache_key, result)
+        return result
+
+    async def _generate(self, prompt: str, max_tokens: int, provider_list: List[str], raise_on_error: bool, call_site: Optional[str], temperature: Optional[float]) -> Union[dict, str]:
+        self._refresh_keys()
+        errors = []
+        candidates = self._candidates(provider_list, errors)
+
+        if self._should_hedge(call_site):
+            result = await self._generate_hedged(candidates, prompt, max_tokens, temperature, errors)
+            if result is not None:
+                return result
+            return self._all_failed(errors, raise_on_error)
+
+        for provider in candidates:
+            try:
+                logger.debug(f"AsyncAIClient: attempting provider {provider}")
+                return await self._attempt(provider, prompt, max_tokens, temperature)
+            except Exception as e:
+                logger.warning(f"Provider {provider} failed: {e}", exc_info=False)
+                errors.append((provider, str(e)))
+                continue
+
+        return self._all_failed(errors, raise_on_error)
+
+    async def _generate_hedged(self, candidates, prompt: str, max_tokens: int, temperature: Optional[float], errors):
+        """Async hedging with the same rules as AIClient; losing requests are cancelled on the wire."""
+        pending = {}
+        hedged = False
+
+        def launch():
+            provider = next(candidates, None)
+            if provider is None:
+                return False
+            logger.debug(f"AsyncAIClient: attempting provider {provider} (hedged)")
+            pending[asyncio.ensure_future(self._attempt(provider, prompt, max_tokens, temperature))] = provider
+            return True
+
+        launch()
+        try:
+            while pending:
+                timeout = None
+                if not hedged and len(pending) == 1:
+                    timeout = self._hedge_delay(next(iter(pending.values())))
+                done, _ = await asyncio.wait(list(pending), timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+
+                if not done:
+                    hedged = True
+                    if launch():
+                        logger.info(f"AsyncAIClient: hedging {list(pending.values())[0]} with {list(pending.values())[-1]}")
+                    continue
+
+                for task in done:
+                    provider = pending.pop(task)
+                    try:
+                        return task.result()
+                    except Exception as e:
+                        logger.warning(f"Provider {provider} failed: {e}", exc_info=False)
+                        errors.append((provider, str(e)))
+                if not pending:
+                    launch()
+            return None
+        finally:
+            for task in pending:
+                task.cancel()
+
+    async def _attempt(self, provider: str, prompt: str, max_tokens: int, temperature: Optional[float] = None) -> Union[dict, str]:
+        health = get_provider_health(self._canonical(provider))
+        started = time.monotonic()
+        try:
+            raw = await self._call_provider(provider, prompt, max_tokens, temperature)
+            result = self._normalize_output(provider, raw)
+        except asyncio.CancelledError:
+            # lost a hedge race: not a provider failure
+            health.release_probe()
+            raise
+        except Exception:
+            health.record_failure(time.monotonic() - started)
+            raise
+        health.record_success(time.monotonic() - started)
+        return result
+
+    async def _call_provider(self, provider: str, prompt: str, max_tokens: int, temperature: Optional[float] = None) -> str:
+        url, headers, payload = self._build_request(provider, prompt, max_tokens, temperature)
+        async with self._client() as client:
+            resp = await client.post(url, headers=headers, json=payload)
         resp.raise_for_status()
         return resp.text
 
+    async def stream_content(self, prompt: str, max_tokens: int = 1024, providers: Optional[List[str]] = None, temperature: Optional[float] = None) -> AsyncIterator[str]:
+        """Async version of AIClient.stream_content, with the same fallback rules."""
+        self._refresh_keys()
+        errors = []
+        for provider in self._candidates(self._streaming_providers(providers or self.providers, errors), errors):
+            logger.debug(f"AsyncAIClient: streaming from provider {provider}")
+            health = get_provider_health(self._canonical(provider))
+            started = time.monotonic()
+            streamed = False
+            try:
+                async for text in self._stream_provider(provider, prompt, max_tokens, temperature):
+                    streamed = True
+                    yield text
+                if not streamed:
+                    raise APIIntegrationError(f"{provider} returned empty response")
+            except (GeneratorExit, asyncio.CancelledError):
+                health.release_probe()
+                raise
+            except Exception as e:
+                health.record_failure(time.monotonic() - started)
+                if streamed:
+                    raise APIIntegrationError(f"{provider} stream interrupted: {e}") from e
+                logger.warning(f"Provider {provider} failed: {e}", exc_info=False)
+                errors.append((provider, str(e)))
+                continue
+            health.record_success(time.monotonic() - started)
+            return
+
+        self._all_failed(errors, raise_on_error=True)
+
+    async def _stream_provider(self, provider: str, prompt: str, max_tokens: int, temperature: Optional[float] = None) -> AsyncIterator[str]:
+        url, headers, payload = self._build_stream_request(provider, prompt, max_tokens, temperature)
+        async with self._client() as client, client.stream("POST", url, headers=headers, json=payload) as resp:
+            resp.raise_for_status()
+            async for line in resp.aiter_lines():
+                text = self._parse_stream_line(provider, line)
+                if text is None:
+                    return
+                if text:
+                    yield text
+
 
-# module-level instance for convenience
+# module-level instances for convenience
 ai_client = AIClient()
+async_ai_client = AsyncAIClient()
@@ -0,0 +1,56 @@
+# core/background.py
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from django.conf import settings
+from django.db import close_old_connections
+
+logger = logging.getLogger(__name__)
+
+# In-process background work queue. Slow work (AI calls, document analysis) is
+# handed to a small thread pool so the web worker can answer immediately; the
+# task records its progress in the database, where the client polls for it.
+# Tasks do not survive a process restart, so callers keep their state in a model
+# that can be recognised as stale.
+
+_executor = None
+_executor_pid = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor():
+    """Thread pool for background tasks, created lazily per worker process."""
+    global _executor, _executor_pid
+    pid = os.getpid()
+    if _executor is None or _executor_pid != pid:
+        with _executor_lock:
+            if _executor is None or _executor_pid != pid:
+                _executor = ThreadPoolExecutor(
+                    max_workers=getattr(settings, 'BACKGROUND_WORKERS', 4),
+                    thread_name_prefix="background",
+                )
+                _executor_pid = pid
+    return _executor
+
+
+def _run(func, args, kwargs):
+    # each pool thread keeps its own DB connection; drop it if it has gone stale
+    close_old_connections()
+    try:
+        return func(*args, **kwargs)
+    except Exception:
+        logger.exception(f"Background task {getattr(func, '__qualname__', func)} failed")
+        raise
+    finally:
+        close_old_connections()
+
+
+def submit(func, *args, **kwargs):
+    """
+    Run func(*args, **kwargs) on the background pool.
+
+    Returns:
+        concurrent.futures.Future: The pending result. Exceptions are logged.
+    """
+    return _get_executor().submit(_run, func, args, kwargs)
@@ -0,0 +1,87 @@
+# core/chunking.py
+import re
+
+# Splitting long documents into prompt-sized pieces is needed by more than one app
+# (quiz generation, document retrieval for the chatbot), so it lives in core.
+
+_PARAGRAPH_BREAK = re.compile(r'\n\s*\n')
+_SENTENCE_END = re.compile(r'(?<=[.!?])\s+')
+
+
+def _split_long_block(block, max_chars):
+    """Split a block that is longer than max_chars at sentence, then word, boundaries."""
+    pieces = []
+    current = []
+    size = 0
+    for sentence in _SENTENCE_END.split(block):
+        # a single sentence longer than the budget is cut at word boundaries
+        while len(sentence) > max_chars:
+            cut = sentence.rfind(' ', 0, max_chars)
+            if cut <= 0:
+                cut = max_chars
+            pieces.append(sentence[:cut].strip())
+            sentence = sentence[cut:].strip()
+        if size + len(sentence) + 1 > max_chars and current:
+            pieces.append(' '.join(current))
+            current, size = [], 0
+        if sentence:
+            current.append(sentence)
+            size += len(sentence) + 1
+    if current:
+        pieces.append(' '.join(current))
+    return [p for p in pieces if p]
+
+
+def split_text_into_chunks(text, max_chars, overlap=0):
+    """
+    Splits text into chunks of at most max_chars, keeping paragraphs together where
+    possible and falling back to sentence boundaries for long paragraphs.
+
+    Args:
+        text (str): The text to split.
+        max_chars (int): Upper bound on the length of each chunk.
+        overlap (int): Characters from the end of each chunk repeated at the start of
+            the next one, so context that straddles a boundary is not lost.
+
+    Returns:
+        list[str]: The chunks, in document order.
+    """
+    if not text or not text.strip():
+        return []
+    max_chars = max(1, int(max_chars))
+    if len(text) <= max_chars:
+        return [text.strip()]
+
+    blocks = []
+    for paragraph in _PARAGRAPH_BREAK.split(text):
+        paragraph = paragraph.strip()
+        if not paragraph:
+            continue
+        if len(paragraph) > max_chars:
+            blocks.extend(_split_long_block(paragraph, max_chars))
+        else:
+            blocks.append(paragraph)
+
+    chunks = []
+    current = []
+    size = 0
+    for block in blocks:
+        if size + len(block) + 2 > max_chars and current:
+            chunks.append('\n\n'.join(current))
+            current, size = [], 0
+        current.append(block)
+        size += len(block) + 2
+    if current:
+        chunks.append('\n\n'.join(current))
+
+    if overlap > 0 and len(chunks) > 1:
+        overlapped = [chunks[0]]
+        for previous, chunk in zip(chunks, chunks[1:]):
+            tail = previous[-overlap:]
+            space = tail.find(' ')
+            if 0 <= space < len(tail) - 1:
+                tail = tail[space + 1:]
+            overlapped.append(f"{tail}\n\n{chunk}")
+        chunks = overlapped
+
+    return chunks
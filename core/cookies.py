@@ -120,10 +120,3 @@ def get_or_create_chat_session(request, response: HttpResponse) -> tuple[str, Ht
      # duration of the browser tab/session (not persisted across restarts)  
         
     return session_id, response
- 
-def set_quiz_preference_cookie(response, key, value):
-    response.set_cookie(key, value, max_age=3600*24*30, samesite='Lax') # 30 days
-    return response
-
-def get_quiz_preference_cookie(request, key, default):
-    return request.COOKIES.get(key, default) 
\ No newline at end of file
@@ -0,0 +1,130 @@
+# core/retrieval.py
+import math
+import re
+import threading
+from collections import Counter
+
+# Small in-memory BM25 index for picking the few stored texts relevant to a query
+# (chatbot knowledge entries, chunks of an uploaded document) instead of sending
+# everything to the AI. Documents can be added and removed one at a time, so an
+# index follows its source without being rebuilt. The tokenizer is also used by the
+# local short-answer grader (quiz.answer_grading), so both match words the same way.
+
+_WORD = re.compile(r"[a-z0-9]+")
+
+# Negations ("not", "no") are deliberately kept: answer grading looks for them.
+STOPWORDS = frozenset("""
+a an the and or of to in on at by for with from as is are was were be been being it its
+this that these those which who whom what when where why how do does did has have had
+i you he she we they them their his her our your my me us so than then there here into
+about over under also can could would should will shall may might must
+""".split())
+
+_SUFFIXES = ("ational", "ization", "fulness", "ousness", "iveness", "ations", "ement",
+             "ments", "ment", "ness", "ings", "ing", "ies", "ied", "ers", "edly",
+             "ly", "ed", "es", "er", "s")
+
+
+def normalize_text(text):
+    """Lowercase, drop apostrophes and collapse everything but letters/digits to single spaces."""
+    text = str(text or "").lower().replace("'", "").replace("’", "")
+    return " ".join(_WORD.findall(text))
+
+
+def stem(word):
+    """Very small suffix-stripping stemmer; good enough to match plural/tense variants."""
+    for suffix in _SUFFIXES:
+        if word.endswith(suffix) and len(word) - len(suffix) >= 3:
+            word = word[:-len(suffix)]
+            if suffix in ("ies", "ied"):
+                word += "y"
+            break
+    return word
+
+
+def tokenize(text):
+    """Stemmed content words of text, in order."""
+    return [stem(word) for word in normalize_text(text).split() if word not in STOPWORDS]
+
+
+class BM25Index:
+    """
+    Okapi BM25 over a mutable set of documents.
+
+    Documents are identified by any hashable id; add() replaces an existing document
+    with the same id. All methods are thread-safe.
+    """
+
+    def __init__(self, k1=1.5, b=0.75):
+        self.k1 = k1
+        self.b = b
+        self._postings = {}   # term -> {doc_id: term frequency}
+        self._lengths = {}    # doc_id -> number of tokens
+        self._terms = {}      # doc_id -> distinct terms, to undo postings on removal
+        self._total_length = 0
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._lengths)
+
+    def __contains__(self, doc_id):
+        return doc_id in self._lengths
+
+    def add(self, doc_id, text):
+        """Index text under doc_id, replacing any previous version of it."""
+        counts = Counter(tokenize(text))
+        with self._lock:
+            self._remove(doc_id)
+            for term, tf in counts.items():
+                self._postings.setdefault(term, {})[doc_id] = tf
+            self._terms[doc_id] = tuple(counts)
+            length = sum(counts.values())
+            self._lengths[doc_id] = length
+            self._total_length += length
+
+    def remove(self, doc_id):
+        """Drop doc_id from the index; unknown ids are ignored."""
+        with self._lock:
+            self._remove(doc_id)
+
+    def _remove(self, doc_id):
+        if doc_id not in self._lengths:
+            return
+        for term in self._terms.pop(doc_id):
+            postings = self._postings[term]
+            del postings[doc_id]
+            if not postings:
+                del self._postings[term]
+        self._total_length -= self._lengths.pop(doc_id)
+
+    def clear(self):
+        with self._lock:
+            self._postings.clear()
+            self._lengths.clear()
+            self._terms.clear()
+            self._total_length = 0
+
+    def search(self, query, k=5):
+        """
+        Best-matching documents for query.
+
+        Returns:
+            list[tuple]: Up to k (doc_id, score) pairs, best first. Documents sharing no
+                term with the query are never returned.
+        """
+        terms = set(tokenize(query))
+        with self._lock:
+            count = len(self._lengths)
+            if not count or not terms:
+                return []
+            average_length = self._total_length / count or 1.0
+            scores = Counter()
+            for term in terms:
+                postings = self._postings.get(term)
+                if not postings:
+                    continue
+                idf = math.log(1 + (count - len(postings) + 0.5) / (len(postings) + 0.5))
+                for doc_id, tf in postings.items():
+                    norm = self.k1 * (1 - self.b + self.b * self._lengths[doc_id] / average_length)
+                    scores[doc_id] += idf * tf * (self.k1 + 1) / (tf + norm)
+        return scores.most_common(k)
@@ -1,3 +1,445 @@
-from django.test import TestCase
+import asyncio
+import threading
+import time
 
-# Create your tests here.
+from unittest import mock
+
+import httpx
+from django.test import SimpleTestCase, override_settings
+
+from . import ai_client
+from .exceptions import APIIntegrationError
+from .retrieval import BM25Index, normalize_text, stem, tokenize
+from .ai_client import AIClient, AsyncAIClient, ProviderHealth, ResponseCache
+
+REPLY = {'choices': [{'message': {'content': 'Hello'}}]}
+
+
+def _run_in_thread(coroutine):
+    """Run a coroutine the way async views run under WSGI: on a fresh loop off the main thread."""
+    outcome = {}
+    thread = threading.Thread(target=lambda: outcome.update(result=asyncio.run(coroutine)))
+    thread.start()
+    thread.join()
+    return outcome['result']
+
+
+@override_settings(DEEPSEEK_API_KEY='test', DEEPSEEK_API_URL='https://deepseek.test/v1/chat/completions', AI_CACHE_ENABLED=False)
+class AsyncClientLifetimeTests(SimpleTestCase):
+
+    def setUp(self):
+        self.ai = AsyncAIClient(['deepseek'])
+        self.created = []
+        self.ai._new_client = self._new_client
+
+    def _new_client(self):
+        def reply(request):
+            return httpx.Response(200, json=REPLY)
+        client = httpx.AsyncClient(transport=httpx.MockTransport(reply))
+        self.created.append(client)
+        return client
+
+    async def _ask_twice(self):
+        return [await self.ai.generate_content('Hi'), await self.ai.generate_content('Hi again')]
+
+    def test_loop_of_a_single_call_closes_its_clients(self):
+        self.assertEqual(_run_in_thread(self._ask_twice()), [REPLY, REPLY])
+        self.assertEqual(len(self.created), 2)
+        self.assertTrue(all(client.is_closed for client in self.created))
+
+    def test_server_loop_keeps_one_pooled_client(self):
+        async def ask_and_close():
+            answers = await self._ask_twice()
+            self.assertFalse(self.created[0].is_closed)
+            await self.ai.aclose()
+            return answers
+
+        self.assertEqual(asyncio.run(ask_and_close()), [REPLY, REPLY])
+        self.assertEqual(len(self.created), 1)
+        self.assertTrue(self.created[0].is_closed)
+
+
+class SessionPoolTests(SimpleTestCase):
+
+    def setUp(self):
+        self.ai = AIClient(['deepseek'])
+        self.addCleanup(self.ai.close)
+
+    def test_threads_share_one_session_per_provider(self):
+        sessions = []
+        threads = [threading.Thread(target=lambda: sessions.append(self.ai._get_session('deepseek'))) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len({id(session) for session in sessions}), 1)
+        self.assertIsNot(self.ai._get_session('gemini'), sessions[0])
+
+    def test_forked_worker_builds_its_own_sessions(self):
+        inherited = self.ai._get_session('deepseek')
+        self.ai._sessions_pid = -1  # as seen from a process forked after the session was made
+        self.assertIsNot(self.ai._get_session('deepseek'), inherited)
+
+    @override_settings(AI_HTTP_POOL_MAXSIZE=3, AI_HTTP_MAX_RETRIES=4)
+    def test_pool_size_and_retries_follow_settings(self):
+        adapter = self.ai._get_session('deepseek').get_adapter('https://api.deepseek.com/')
+        self.assertEqual(adapter._pool_maxsize, 3)
+        self.assertEqual(adapter.max_retries.connect, 4)
+        self.assertIn(429, adapter.max_retries.status_forcelist)
+        # a provider may already be generating the answer to a request that was sent
+        self.assertEqual(adapter.max_retries.read, 0)
+
+    def test_close_drops_the_sessions(self):
+        session = self.ai._get_session('deepseek')
+        self.ai.close()
+        self.assertIsNot(self.ai._get_session('deepseek'), session)
+
+
+class _Clock:
+    """Stands in for time.monotonic() in core.ai_client."""
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@override_settings(AI_BREAKER_FAILURES=3, AI_BREAKER_ERROR_RATE=0.5, AI_BREAKER_MIN_CALLS=4, AI_BREAKER_COOLDOWN=30)
+class CircuitBreakerTests(SimpleTestCase):
+
+    def setUp(self):
+        self.clock = _Clock()
+        patcher = mock.patch.object(ai_client.time, 'monotonic', self.clock)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.health = ProviderHealth('deepseek')
+
+    def _fail(self, times):
+        for _ in range(times):
+            self.health.record_failure(1.0)
+
+    def test_consecutive_failures_open_the_circuit(self):
+        self._fail(2)
+        self.assertTrue(self.health.allow_request())
+        self._fail(1)
+        self.assertEqual(self.health.state, ProviderHealth.OPEN)
+        self.assertFalse(self.health.allow_request())
+
+    def test_rolling_error_rate_opens_the_circuit(self):
+        for _ in range(2):
+            self.health.record_success(1.0)
+            self._fail(1)
+        self.assertEqual(self.health.state, ProviderHealth.OPEN)
+
+    def test_one_probe_after_the_cooldown_closes_the_circuit(self):
+        self._fail(3)
+        self.clock.now += 31
+        self.assertTrue(self.health.allow_request())
+        self.assertEqual(self.health.state, ProviderHealth.HALF_OPEN)
+        self.assertFalse(self.health.allow_request())  # one probe at a time
+        self.health.record_success(1.0)
+        self.assertEqual(self.health.state, ProviderHealth.CLOSED)
+        self.assertTrue(self.health.allow_request())
+
+    def test_failed_probe_reopens_the_circuit(self):
+        self._fail(3)
+        self.clock.now += 31
+        self.health.allow_request()
+        self._fail(1)
+        self.assertEqual(self.health.state, ProviderHealth.OPEN)
+        self.assertFalse(self.health.allow_request())
+
+
+@override_settings(DEEPSEEK_API_KEY='test', GEMINI_API_KEY='test', AI_CACHE_ENABLED=False,
+                   AI_BREAKER_FAILURES=3, AI_BREAKER_COOLDOWN=30)
+class ProviderFallbackTests(SimpleTestCase):
+
+    def setUp(self):
+        ai_client._health_registry.clear()
+        self.addCleanup(ai_client._health_registry.clear)
+        self.ai = AIClient(['deepseek', 'gemini'])
+        self.calls = []
+        patcher = mock.patch.object(AIClient, '_call_provider', autospec=True, side_effect=self._reply)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _reply(self, client, provider, prompt, max_tokens, temperature=None):
+        self.calls.append(provider)
+        if provider == 'deepseek':
+            raise ConnectionError('deepseek is down')
+        return 'from gemini'
+
+    def test_failing_provider_falls_back_and_is_tried_last(self):
+        for _ in range(5):
+            self.assertEqual(self.ai.generate_content('Hi'), 'from gemini')
+        self.assertEqual(self.calls.count('deepseek'), 1)
+
+    def test_open_circuit_is_skipped(self):
+        for _ in range(4):
+            self.assertEqual(self.ai.generate_content('Hi', providers=['deepseek'], raise_on_error=False), '')
+        self.assertEqual(self.calls, ['deepseek'] * 3)
+        self.assertEqual(ai_client.get_provider_health('deepseek').state, ProviderHealth.OPEN)
+
+    def test_degraded_provider_moves_behind_healthy_ones(self):
+        self.ai.generate_content('Hi')
+        self.assertEqual(self.ai._ordered_providers(['deepseek', 'gemini']), ['gemini', 'deepseek'])
+
+
+@override_settings(DEEPSEEK_API_KEY='test', GEMINI_API_KEY='test', AI_CACHE_ENABLED=False,
+                   AI_HEDGE_CALL_SITES=['chatbot'], AI_HEDGE_DELAY=0.1, AI_HEDGE_MIN_DELAY=0.05)
+class HedgingTests(SimpleTestCase):
+    """A slow primary is raced against the next provider, but only for hedged call sites."""
+
+    delays = {'deepseek': 0.6, 'gemini': 0.0}
+
+    def setUp(self):
+        ai_client._health_registry.clear()
+        self.addCleanup(ai_client._health_registry.clear)
+        self.calls = []
+
+    def _reply(self, client, provider, prompt, max_tokens, temperature=None):
+        self.calls.append(provider)
+        time.sleep(self.delays[provider])
+        return f'from {provider}'
+
+    async def _areply(self, client, provider, prompt, max_tokens, temperature=None):
+        self.calls.append(provider)
+        await asyncio.sleep(self.delays[provider])
+        return f'from {provider}'
+
+    def _generate(self, call_site):
+        started = time.monotonic()
+        with mock.patch.object(AIClient, '_call_provider', autospec=True, side_effect=self._reply):
+            result = AIClient(['deepseek', 'gemini']).generate_content('Hi', call_site=call_site)
+        return result, time.monotonic() - started
+
+    def test_slow_primary_is_hedged(self):
+        result, elapsed = self._generate('chatbot')
+        self.assertEqual(result, 'from gemini')
+        self.assertLess(elapsed, 0.4)
+        self.assertEqual(self.calls, ['deepseek', 'gemini'])
+
+    def test_other_call_sites_wait_for_the_primary(self):
+        result, _ = self._generate('quiz')
+        self.assertEqual(result, 'from deepseek')
+        self.assertEqual(self.calls, ['deepseek'])
+
+    def test_failed_primary_is_replaced_without_waiting(self):
+        def reply(client, provider, prompt, max_tokens, temperature=None):
+            self.calls.append(provider)
+            if provider == 'deepseek':
+                raise ConnectionError('deepseek is down')
+            return 'from gemini'
+
+        with mock.patch.object(AIClient, '_call_provider', autospec=True, side_effect=reply):
+            self.assertEqual(AIClient(['deepseek', 'gemini']).generate_content('Hi', call_site='chatbot'), 'from gemini')
+
+    def test_async_hedge_cancels_the_losing_request(self):
+        async def generate():
+            result = await AsyncAIClient(['deepseek', 'gemini']).generate_content('Hi', call_site='chatbot')
+            return result, ai_client.get_provider_health('deepseek')
+
+        started = time.monotonic()
+        with mock.patch.object(AsyncAIClient, '_call_provider', autospec=True, side_effect=self._areply):
+            result, deepseek = asyncio.run(generate())
+        self.assertEqual(result, 'from gemini')
+        self.assertLess(time.monotonic() - started, 0.4)
+        # losing a race is not a provider failure
+        self.assertEqual(deepseek.error_rate(), 0.0)
+
+
+@override_settings(AI_CACHE_TTL=60, AI_CACHE_MAX_ENTRIES=2, AI_CACHE_MAX_ITEM_BYTES=100)
+class ResponseCacheTests(SimpleTestCase):
+
+    def setUp(self):
+        self.clock = _Clock()
+        patcher = mock.patch.object(ai_client.time, 'monotonic', self.clock)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.cache = ResponseCache()
+
+    def test_key_covers_every_input_of_the_call(self):
+        key = ResponseCache.make_key(['deepseek'], 'Hi', 100, None)
+        self.assertEqual(key, ResponseCache.make_key(['DeepSeek'], 'Hi', 100, None))
+        for other in (ResponseCache.make_key(['gemini'], 'Hi', 100, None), ResponseCache.make_key(['deepseek'], 'Hi!', 100, None),
+                      ResponseCache.make_key(['deepseek'], 'Hi', 200, None), ResponseCache.make_key(['deepseek'], 'Hi', 100, 0.2)):
+            self.assertNotEqual(key, other)
+
+    def test_entries_expire_after_the_ttl(self):
+        self.cache.set('a', 'answer')
+        self.clock.now += 59
+        self.assertEqual(self.cache.get('a'), 'answer')
+        self.clock.now += 2
+        self.assertIsNone(self.cache.get('a'))
+
+    def test_least_recently_used_entry_is_evicted(self):
+        self.cache.set('a', 'first')
+        self.cache.set('b', 'second')
+        self.cache.get('a')
+        self.cache.set('c', 'third')
+        self.assertIsNone(self.cache.get('b'))
+        self.assertEqual(self.cache.get('a'), 'first')
+
+    def test_large_responses_are_not_cached(self):
+        self.cache.set('a', 'x' * 101)
+        self.assertIsNone(self.cache.get('a'))
+
+    def test_callers_get_their_own_copy(self):
+        self.cache.set('a', {'questions': ['Q1']})
+        self.cache.get('a')['questions'].append('Q2')
+        self.assertEqual(self.cache.get('a'), {'questions': ['Q1']})
+
+    @override_settings(AI_CACHE_SHARED=True, CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+    def test_shared_tier_serves_other_workers(self):
+        self.cache.set('a', 'answer')
+        other_worker = ResponseCache()
+        self.assertEqual(other_worker.get('a'), 'answer')
+        self.assertEqual(other_worker.stats()['shared_hits'], 1)
+
+
+@override_settings(DEEPSEEK_API_KEY='test', AI_CACHE_ENABLED=True, AI_CACHE_SHARED=False)
+class CachedGenerationTests(SimpleTestCase):
+
+    def setUp(self):
+        ai_client.response_cache.clear()
+        ai_client._health_registry.clear()
+        self.addCleanup(ai_client.response_cache.clear)
+        self.addCleanup(ai_client._health_registry.clear)
+        self.replies = ['first answer', 'second answer']
+        patcher = mock.patch.object(AIClient, '_call_provider', autospec=True, side_effect=lambda *args, **kwargs: self._next())
+        self.call = patcher.start()
+        self.addCleanup(patcher.stop)
+        self.ai = AIClient(['deepseek'])
+
+    def test_repeated_prompt_is_answered_from_the_cache(self):
+        self.assertEqual(self.ai.generate_content('Hi'), 'first answer')
+        self.assertEqual(self.ai.generate_content('Hi'), 'first answer')
+        self.assertEqual(self.call.call_count, 1)
+
+    def test_cache_can_be_bypassed(self):
+        self.ai.generate_content('Hi')
+        self.assertEqual(self.ai.generate_content('Hi', use_cache=False), 'second answer')
+
+    def test_failures_are_not_cached(self):
+        self.replies = [ConnectionError('down'), 'answer']
+        self.assertEqual(self.ai.generate_content('Hi', raise_on_error=False), '')
+        self.assertEqual(self.ai.generate_content('Hi'), 'answer')
+
+    def _next(self):
+        reply = self.replies.pop(0)
+        if isinstance(reply, Exception):
+            raise reply
+        return reply
+
+
+class StreamParsingTests(SimpleTestCase):
+
+    def setUp(self):
+        self.ai = AIClient()
+
+    def test_openai_compatible_events(self):
+        self.assertEqual(self.ai._parse_stream_line('deepseek', 'data: {"choices": [{"delta": {"content": "Hi"}}]}'), 'Hi')
+        self.assertEqual(self.ai._parse_stream_line('azure', 'data: {"choices": [{"delta": {"role": "assistant"}}]}'), '')
+        self.assertIsNone(self.ai._parse_stream_line('deepseek', 'data: [DONE]'))
+
+    def test_gemini_events(self):
+        line = 'data: {"candidates": [{"content": {"parts": [{"text": "Hel"}, {"text": "lo"}]}}]}'
+        self.assertEqual(self.ai._parse_stream_line('gemini', line), 'Hello')
+
+    def test_comments_keepalives_and_malformed_events_carry_no_text(self):
+        for line in ('', ': keep-alive', 'event: ping', 'data: {not json'):
+            self.assertEqual(self.ai._parse_stream_line('deepseek', line), '')
+
+    def test_error_event_raises(self):
+        with self.assertRaises(APIIntegrationError):
+            self.ai._parse_stream_line('deepseek', 'data: {"error": {"message": "overloaded"}}')
+
+    def test_gemini_streams_from_the_sse_endpoint(self):
+        self.ai.gemini_url = 'https://gemini.test/models/gemini-pro:generateContent'
+        self.ai.gemini_key = 'key'
+        url, _, payload = self.ai._build_stream_request('gemini', 'Hi', 10)
+        self.assertEqual(url, 'https://gemini.test/models/gemini-pro:streamGenerateContent?alt=sse&key=key')
+        self.assertNotIn('stream', payload)
+
+
+@override_settings(DEEPSEEK_API_KEY='test', GEMINI_API_KEY='test')
+class StreamFallbackTests(SimpleTestCase):
+
+    def setUp(self):
+        ai_client._health_registry.clear()
+        self.addCleanup(ai_client._health_registry.clear)
+        self.ai = AIClient(['huggingface', 'deepseek', 'gemini'])
+
+    def _stream(self, streams):
+        def stream_provider(client, provider, prompt, max_tokens, temperature=None):
+            for item in streams[provider]:
+                if isinstance(item, Exception):
+                    raise item
+                yield item
+        return mock.patch.object(AIClient, '_stream_provider', autospec=True, side_effect=stream_provider)
+
+    def test_provider_failing_before_the_first_token_is_replaced(self):
+        with self._stream({'deepseek': [ConnectionError('down')], 'gemini': ['Hel', 'lo']}):
+            self.assertEqual(list(self.ai.stream_content('Hi')), ['Hel', 'lo'])
+        self.assertEqual(ai_client.get_provider_health('deepseek').error_rate(), 1.0)
+
+    def test_failure_after_the_first_token_is_raised(self):
+        with self._stream({'deepseek': ['Hel', ConnectionError('down')], 'gemini': ['Hello']}):
+            stream = self.ai.stream_content('Hi')
+            self.assertEqual(next(stream), 'Hel')
+            with self.assertRaises(APIIntegrationError):
+                next(stream)
+
+    def test_no_streaming_provider_raises(self):
+        with self.assertRaises(APIIntegrationError):
+            list(AIClient(['huggingface']).stream_content('Hi'))
+
+
+class TokenizerTests(SimpleTestCase):
+
+    def test_normalize_text(self):
+        self.assertEqual(normalize_text("Newton's 2nd Law — F=ma!"), 'newtons 2nd law f ma')
+        self.assertEqual(normalize_text(None), '')
+
+    def test_stem_matches_plural_and_tense_variants(self):
+        self.assertEqual(stem('cells'), stem('cell'))
+        self.assertEqual(stem('studies'), 'study')
+        self.assertEqual(stem('dividing'), stem('divided'))
+        self.assertEqual(stem('is'), 'is')  # too short to strip
+
+    def test_stopwords_are_dropped_but_negations_kept(self):
+        self.assertEqual(tokenize('What is the role of the mitochondria?'), ['role', 'mitochondria'])
+        self.assertEqual(tokenize('not mitochondria'), ['not', 'mitochondria'])
+
+
+class BM25IndexTests(SimpleTestCase):
+
+    def setUp(self):
+        self.index = BM25Index()
+        self.index.add('flashcards', 'How do I create flashcards from my notes?')
+        self.index.add('quiz', 'How do I generate a quiz from my notes?')
+        self.index.add('contact', 'How can I contact the Lamla team?')
+
+    def test_best_match_comes_first(self):
+        self.assertEqual(self.index.search('make a flashcard')[0][0], 'flashcards')
+
+    def test_rare_terms_outweigh_common_ones(self):
+        self.assertEqual([doc_id for doc_id, _ in self.index.search('quiz notes')], ['quiz', 'flashcards'])
+
+    def test_documents_without_a_shared_term_are_never_returned(self):
+        self.assertEqual(self.index.search('photosynthesis'), [])
+        self.assertEqual(self.index.search('the and of'), [])
+
+    def test_k_limits_the_results(self):
+        self.assertEqual(len(self.index.search('notes team', k=1)), 1)
+
+    def test_documents_are_replaced_and_removed(self):
+        self.index.add('quiz', 'Practice questions for exams')
+        self.assertEqual(self.index.search('quiz'), [])
+        self.assertEqual(self.index.search('exams')[0][0], 'quiz')
+        self.index.remove('quiz')
+        self.index.remove('unknown')
+        self.assertNotIn('quiz', self.index)
+        self.assertEqual(len(self.index), 2)
+        self.assertEqual(self.index.search('exams'), [])
@@ -82,6 +82,30 @@ else:
         }
     }
 
+# Cache (shared by all worker processes when REDIS_URL or CACHE_TABLE is set)
+# CACHE_TABLE needs `python manage.py createcachetable`.
+# Without either, each worker process keeps its own in-memory cache.
+if os.getenv("REDIS_URL"):
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.redis.RedisCache",
+            "LOCATION": os.getenv("REDIS_URL"),
+        }
+    }
+elif os.getenv("CACHE_TABLE"):
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.db.DatabaseCache",
+            "LOCATION": os.getenv("CACHE_TABLE"),
+        }
+    }
+else:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        }
+    }
+
 # Authentication
 SITE_ID = 1
 LOGIN_REDIRECT_URL = "/"
@@ -162,4 +186,135 @@ GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
 # HuggingFace
 HUGGINGFACE_API_KEY = os.getenv("HUGGINGFACE_API_KEY")
 
-AI_PROVIDER = "azure"
\ No newline at end of file
+AI_PROVIDER = "azure"
+
+# === AI client HTTP pooling ===
+# Each provider gets one keep-alive session per worker process.
+AI_HTTP_POOL_CONNECTIONS = int(os.getenv("AI_HTTP_POOL_CONNECTIONS", "4"))   # distinct hosts cached per provider
+AI_HTTP_POOL_MAXSIZE = int(os.getenv("AI_HTTP_POOL_MAXSIZE", "16"))          # keep-alive connections per host
+AI_HTTP_MAX_RETRIES = int(os.getenv("AI_HTTP_MAX_RETRIES", "2"))             # connect / 429 / 5xx retries
+AI_HTTP_RETRY_BACKOFF = float(os.getenv("AI_HTTP_RETRY_BACKOFF", "0.5"))     # seconds, exponential
+
+# === AI provider circuit breaker ===
+# A provider whose circuit is open is skipped until a probe request succeeds.
+AI_BREAKER_WINDOW = int(os.getenv("AI_BREAKER_WINDOW", "20"))              # calls in the rolling window
+AI_BREAKER_FAILURES = int(os.getenv("AI_BREAKER_FAILURES", "3"))           # consecutive failures to open
+AI_BREAKER_ERROR_RATE = float(os.getenv("AI_BREAKER_ERROR_RATE", "0.5"))   # rolling error rate to open
+AI_BREAKER_MIN_CALLS = int(os.getenv("AI_BREAKER_MIN_CALLS", "5"))         # calls before error rate counts
+AI_BREAKER_COOLDOWN = int(os.getenv("AI_BREAKER_COOLDOWN", "30"))          # seconds before a probe
+
+# === AI hedged requests ===
+# Call sites listed here send the prompt to a backup provider when the primary is
+# slower than its recent p95 latency; the first good answer wins.
+AI_HEDGE_CALL_SITES = [s.strip() for s in os.getenv("AI_HEDGE_CALL_SITES", "chatbot").split(",") if s.strip()]
+AI_HEDGE_PERCENTILE = int(os.getenv("AI_HEDGE_PERCENTILE", "95"))
+AI_HEDGE_DELAY = float(os.getenv("AI_HEDGE_DELAY", "3.0"))          # seconds, before latency data exists
+AI_HEDGE_MIN_DELAY = float(os.getenv("AI_HEDGE_MIN_DELAY", "0.5"))
+AI_HEDGE_MAX_WORKERS = int(os.getenv("AI_HEDGE_MAX_WORKERS", "16"))
+
+# === AI response cache ===
+# Identical prompts are served from an in-process LRU; set AI_CACHE_SHARED to also
+# use the AI_CACHE_ALIAS entry of CACHES. That only shares responses across workers
+# when the cache backend is shared (REDIS_URL or CACHE_TABLE, see CACHES above).
+AI_CACHE_ENABLED = os.getenv("AI_CACHE_ENABLED", "True").lower() in ("1", "true", "yes")
+AI_CACHE_TTL = int(os.getenv("AI_CACHE_TTL", "3600"))                      # seconds
+AI_CACHE_MAX_ENTRIES = int(os.getenv("AI_CACHE_MAX_ENTRIES", "512"))       # per worker
+AI_CACHE_MAX_ITEM_BYTES = int(os.getenv("AI_CACHE_MAX_ITEM_BYTES", "262144"))
+AI_CACHE_SHARED = os.getenv("AI_CACHE_SHARED", "False").lower() in ("1", "true", "yes")
+AI_CACHE_ALIAS = os.getenv("AI_CACHE_ALIAS", "default")
+
+# === Quiz question cache ===
+# Generated questions are stored per (study text, subject, difficulty) and served
+# again when the same material is submitted; least recently used rows are evicted.
+QUIZ_QUESTION_CACHE_ENABLED = os.getenv("QUIZ_QUESTION_CACHE_ENABLED", "True").lower() in ("1", "true", "yes")
+QUIZ_QUESTION_CACHE_MAX_ROWS = int(os.getenv("QUIZ_QUESTION_CACHE_MAX_ROWS", "5000"))
+
+# === Chunked quiz generation ===
+# Study text longer than QUIZ_CHUNK_CHARS is split into at most QUIZ_MAX_CHUNKS
+# chunks that are turned into questions in parallel and merged.
+QUIZ_CHUNK_CHARS = int(os.getenv("QUIZ_CHUNK_CHARS", "8000"))
+QUIZ_MAX_CHUNKS = int(os.getenv("QUIZ_MAX_CHUNKS", "6"))
+QUIZ_CHUNK_WORKERS = int(os.getenv("QUIZ_CHUNK_WORKERS", "4"))
+
+# === Short-answer grading ===
+# Grading of one quiz submission never takes much longer than QUIZ_GRADING_DEADLINE
+# seconds; answers not graded by then fall back to the local word-overlap check.
+QUIZ_GRADING_DEADLINE = float(os.getenv("QUIZ_GRADING_DEADLINE", "20"))
+QUIZ_GRADING_WORKERS = int(os.getenv("QUIZ_GRADING_WORKERS", "4"))
+
+# === Local short-answer pre-grading ===
+# Answers scoring at or above ACCEPT are marked correct and at or below REJECT are
+# marked wrong without an AI call; anything in between is escalated to the AI.
+QUIZ_PREGRADE_ENABLED = os.getenv("QUIZ_PREGRADE_ENABLED", "True").lower() in ("1", "true", "yes")
+QUIZ_PREGRADE_ACCEPT = float(os.getenv("QUIZ_PREGRADE_ACCEPT", "0.85"))
+QUIZ_PREGRADE_REJECT = float(os.getenv("QUIZ_PREGRADE_REJECT", "0.15"))
+
+# === Document extraction ===
+# PDF pages / PPTX slides past this budget are never parsed (0 = no page limit).
+MATERIALS_MAX_PAGES = int(os.getenv("MATERIALS_MAX_PAGES", "100"))
+# PDFs with at least MATERIALS_PDF_PARALLEL_MIN_PAGES pages are split into page
+# ranges extracted by a pool of MATERIALS_PDF_WORKERS processes (1 = always serial).
+MATERIALS_PDF_WORKERS = int(os.getenv("MATERIALS_PDF_WORKERS", str(min(4, os.cpu_count() or 1))))
+MATERIALS_PDF_PARALLEL_MIN_PAGES = int(os.getenv("MATERIALS_PDF_PARALLEL_MIN_PAGES", "40"))
+# Extracted text is cached by the SHA-256 of the uploaded file; entries longer than
+# MAX_CHARS are not stored and the table is trimmed to MAX_ROWS least recently used.
+MATERIALS_EXTRACTION_CACHE_ENABLED = os.getenv("MATERIALS_EXTRACTION_CACHE_ENABLED", "True").lower() in ("1", "true", "yes")
+MATERIALS_EXTRACTION_CACHE_MAX_ROWS = int(os.getenv("MATERIALS_EXTRACTION_CACHE_MAX_ROWS", "1000"))
+MATERIALS_EXTRACTION_CACHE_MAX_CHARS = int(os.getenv("MATERIALS_EXTRACTION_CACHE_MAX_CHARS", "200000"))
+# Study-material uploads stream to a temp file and are rejected once they exceed this.
+MATERIALS_MAX_UPLOAD_SIZE = int(os.getenv("MATERIALS_MAX_UPLOAD_SIZE", str(10 * 1024 * 1024)))
+# OCR of scanned PDF pages (no text layer) and image uploads; needs the tesseract binary.
+MATERIALS_OCR_ENABLED = os.getenv("MATERIALS_OCR_ENABLED", "True").lower() in ("1", "true", "yes")
+MATERIALS_OCR_WORKERS = int(os.getenv("MATERIALS_OCR_WORKERS", "2"))
+MATERIALS_OCR_MAX_PAGES = int(os.getenv("MATERIALS_OCR_MAX_PAGES", "20"))    # per document
+MATERIALS_OCR_TIMEOUT = int(os.getenv("MATERIALS_OCR_TIMEOUT", "20"))        # seconds per page, shared by its images
+MATERIALS_OCR_CACHE_TTL = int(os.getenv("MATERIALS_OCR_CACHE_TTL", str(7 * 24 * 3600)))
+
+# === Background jobs ===
+# In-process pool running queued work such as quiz generation (core.background).
+BACKGROUND_WORKERS = int(os.getenv("BACKGROUND_WORKERS", "4"))
+# Quiz generation jobs: SSE poll interval, how long one event stream stays open (ASGI
+# only; WSGI clients poll the status endpoint), and after how many idle seconds an
+# unfinished job (e.g. lost in a restart) is failed.
+QUIZ_JOB_POLL_INTERVAL = float(os.getenv("QUIZ_JOB_POLL_INTERVAL", "1.0"))
+QUIZ_JOB_EVENTS_TIMEOUT = int(os.getenv("QUIZ_JOB_EVENTS_TIMEOUT", "60"))
+QUIZ_JOB_STALE_AFTER = int(os.getenv("QUIZ_JOB_STALE_AFTER", "300"))
+
+# === Exam analyzer ===
+# Exam analysis runs as a background job; its uploads are extracted concurrently by
+# up to EXAM_ANALYZER_EXTRACT_WORKERS threads. Idle jobs are failed after STALE_AFTER seconds.
+EXAM_ANALYZER_EXTRACT_WORKERS = int(os.getenv("EXAM_ANALYZER_EXTRACT_WORKERS", "5"))
+EXAM_ANALYZER_JOB_STALE_AFTER = int(os.getenv("EXAM_ANALYZER_JOB_STALE_AFTER", "600"))
+
+# === Chatbot knowledge retrieval ===
+# Only the CHATBOT_KNOWLEDGE_TOP_K knowledge-base entries most relevant to a message
+# (BM25 over question, answer and keywords) are put in the chatbot prompt.
+CHATBOT_KNOWLEDGE_TOP_K = int(os.getenv("CHATBOT_KNOWLEDGE_TOP_K", "5"))
+# Each worker checks the stored knowledge base for edits (made through any worker) at
+# most every CHATBOT_KNOWLEDGE_CHECK_INTERVAL seconds and reloads its index on a change.
+CHATBOT_KNOWLEDGE_CHECK_INTERVAL = int(os.getenv("CHATBOT_KNOWLEDGE_CHECK_INTERVAL", "30"))
+
+# === Chatbot document retrieval ===
+# Documents uploaded to the chatbot are split into passages of CHUNK_CHARS and indexed
+# (BM25); each question sends its TOP_K best passages, CONTEXT_CHARS at most. Indexes
+# of the last INDEX_MAX documents are kept per worker for follow-up questions.
+CHATBOT_DOCUMENT_CHUNK_CHARS = int(os.getenv("CHATBOT_DOCUMENT_CHUNK_CHARS", "1500"))
+CHATBOT_DOCUMENT_CHUNK_OVERLAP = int(os.getenv("CHATBOT_DOCUMENT_CHUNK_OVERLAP", "150"))
+CHATBOT_DOCUMENT_TOP_K = int(os.getenv("CHATBOT_DOCUMENT_TOP_K", "4"))
+CHATBOT_DOCUMENT_CONTEXT_CHARS = int(os.getenv("CHATBOT_DOCUMENT_CONTEXT_CHARS", "6000"))
+CHATBOT_DOCUMENT_INDEX_MAX = int(os.getenv("CHATBOT_DOCUMENT_INDEX_MAX", "32"))
+# Uploaded chat documents are stored for follow-up turns: at most MAX_CHARS of text,
+# MAX_PER_CHAT documents per user or session, deleted after TTL seconds unused.
+CHATBOT_DOCUMENT_MAX_CHARS = int(os.getenv("CHATBOT_DOCUMENT_MAX_CHARS", "50000"))
+CHATBOT_DOCUMENT_MAX_PER_CHAT = int(os.getenv("CHATBOT_DOCUMENT_MAX_PER_CHAT", "5"))
+CHATBOT_DOCUMENT_TTL = int(os.getenv("CHATBOT_DOCUMENT_TTL", str(24 * 3600)))
+
+# === Chatbot conversation memory ===
+# Chat prompts carry a rolling summary of older messages plus the latest ones, within
+# CHATBOT_HISTORY_TOKEN_BUDGET tokens (about 4 characters each). The summary, at most
+# CHATBOT_SUMMARY_TOKEN_BUDGET tokens, is updated in the background once
+# CHATBOT_SUMMARY_BATCH messages beyond the CHATBOT_RECENT_MESSAGES latest have piled up.
+CHATBOT_HISTORY_TOKEN_BUDGET = int(os.getenv("CHATBOT_HISTORY_TOKEN_BUDGET", "1000"))
+CHATBOT_SUMMARY_TOKEN_BUDGET = int(os.getenv("CHATBOT_SUMMARY_TOKEN_BUDGET", "250"))
+CHATBOT_RECENT_MESSAGES = int(os.getenv("CHATBOT_RECENT_MESSAGES", "4"))
+CHATBOT_SUMMARY_BATCH = int(os.getenv("CHATBOT_SUMMARY_BATCH", "4"))
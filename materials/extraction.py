@@ -0,0 +1,442 @@
+# materials/extraction.py
+import codecs
+import hashlib
+import logging
+import mmap
+import multiprocessing
+import os
+import shutil
+import tempfile
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from django.conf import settings
+from django.db.models import F
+from django.utils import timezone
+from core.exceptions import FileProcessingError
+from . import ocr
+
+try:
+    import PyPDF2
+except ImportError:  # pragma: no cover - optional dependency
+    PyPDF2 = None
+
+try:
+    import docx
+except ImportError:  # pragma: no cover - optional dependency
+    docx = None
+
+try:
+    from pptx import Presentation
+except ImportError:  # pragma: no cover - optional dependency
+    Presentation = None
+
+logger = logging.getLogger(__name__)
+
+# Single text-extraction engine shared by the quiz, chatbot, materials and exam
+# analyzer upload paths. Each format has a backend that yields text unit by unit
+# (PDF page, PPTX slide, DOCX paragraph, TXT block); the engine collects the units
+# in a list and stops pulling from the backend once the character or page budget
+# is spent, so large documents are not parsed past the point where they would be
+# truncated.
+
+SUPPORTED_EXTENSIONS_MESSAGE = 'Unsupported file type. Please upload PDF, DOCX, PPTX, TXT, or an image.'
+TRUNCATION_NOTE = '\n... [text truncated due to length]'
+
+# Bump when backends change what they extract, so cached results are not reused.
+EXTRACTION_VERSION = 2
+
+_TXT_BLOCK_SIZE = 64 * 1024
+_HASH_BLOCK_SIZE = 64 * 1024
+_PDF_MIN_PAGES_PER_TASK = 8
+
+_backends = {}
+_paged = set()
+
+
+class ExtractionResult:
+    """
+    Outcome of an extraction.
+
+    Attributes:
+        text (str): The extracted text, stripped and cut to the character budget.
+        truncated (bool): True when the document had more text than the budget allowed.
+        units_read (int): Number of backend units (pages, paragraphs, ...) consumed.
+        pages_read (int): Pages/slides consumed for paged formats, None otherwise.
+        cached (bool): True when served from the extraction cache.
+    """
+
+    def __init__(self, text, truncated=False, units_read=0, paged=False):
+        self.text = text
+        self.truncated = truncated
+        self.units_read = units_read
+        self.pages_read = units_read if paged else None
+        self.cached = False
+
+    def __str__(self):
+        return self.text
+
+    def __repr__(self):
+        return (f"<ExtractionResult chars={len(self.text)} truncated={self.truncated} "
+                f"units={self.units_read} pages={self.pages_read}>")
+
+
+def register_backend(extension, backend, paged=False):
+    """
+    Register a backend for a file extension (e.g. '.pdf'). A backend is a callable
+    taking the uploaded file and yielding text units in document order; paged
+    backends yield one unit per page/slide, so the page budget applies to them,
+    and are also passed it as a max_pages keyword (None for no limit).
+    A unit may be a zero-argument callable returning the text, so the engine can
+    stop before parsing a page it is not going to use.
+    """
+    extension = extension.lower()
+    _backends[extension] = backend
+    if paged:
+        _paged.add(extension)
+    else:
+        _paged.discard(extension)
+
+
+def get_backend(extension):
+    return _backends.get(extension.lower())
+
+
+def supported_extensions():
+    return sorted(_backends)
+
+
+def _extract_pdf_pages(path, start, stop):
+    """Worker task: text of pages [start, stop) of the PDF at path."""
+    with open(path, 'rb') as stream:
+        reader = PyPDF2.PdfReader(stream)
+        return [reader.pages[i].extract_text() or '' for i in range(start, stop)]
+
+
+_pdf_pool = None
+_pdf_pool_pid = None
+_pdf_pool_lock = threading.Lock()
+
+
+def _pdf_workers():
+    return getattr(settings, 'MATERIALS_PDF_WORKERS', min(4, os.cpu_count() or 1))
+
+
+def _get_pdf_pool():
+    """Process pool for PDF page ranges, created lazily per worker process."""
+    global _pdf_pool, _pdf_pool_pid
+    pid = os.getpid()
+    if _pdf_pool is None or _pdf_pool_pid != pid:
+        with _pdf_pool_lock:
+            if _pdf_pool is None or _pdf_pool_pid != pid:
+                # spawn rather than fork: forking a threaded web worker is not safe
+                _pdf_pool = ProcessPoolExecutor(
+                    max_workers=_pdf_workers(),
+                    mp_context=multiprocessing.get_context('spawn'),
+                )
+                _pdf_pool_pid = pid
+    return _pdf_pool
+
+
+def _pdf_source(file):
+    """
+    A path worker processes can open: the upload's temp file when Django spooled it
+    to disk, else a temp copy of the in-memory upload. Returns (path, is_copy).
+    """
+    if hasattr(file, 'temporary_file_path'):
+        return file.temporary_file_path(), False
+    file.seek(0)
+    with tempfile.NamedTemporaryFile(suffix='.pdf', delete=False) as tmp:
+        shutil.copyfileobj(file, tmp)
+    return tmp.name, True
+
+
+def _parallel_pdf_pages(file, reader, stop):
+    """
+    Yield the text of pages [0, stop) in order, extracted by the process pool in
+    page ranges. Only a few ranges are in flight at a time, so when the caller
+    stops consuming (budget reached) little work is wasted; pending ranges are
+    cancelled. If the pool fails, the remaining pages are read serially.
+    """
+    workers = _pdf_workers()
+    per_task = max(_PDF_MIN_PAGES_PER_TASK, -(-stop // (workers * 4)))
+    ranges = [(start, min(start + per_task, stop)) for start in range(0, stop, per_task)]
+    source, is_copy = _pdf_source(file)
+    in_flight = []
+    next_range = 0
+    page_index = 0
+    try:
+        while page_index < stop:
+            try:
+                pool = _get_pdf_pool()
+                while next_range < len(ranges) and len(in_flight) < workers * 2:
+                    start, end = ranges[next_range]
+                    in_flight.append(pool.submit(_extract_pdf_pages, source, start, end))
+                    next_range += 1
+                texts = in_flight.pop(0).result()
+            except Exception as e:
+                logger.warning(f"Parallel PDF extraction failed, continuing serially: {e}")
+                break
+            for text in texts:
+                page_index += 1
+                yield text
+    finally:
+        for future in in_flight:
+            future.cancel()
+        if is_copy:
+            # a worker may still be reading it; the OS keeps the data until it closes
+            os.unlink(source)
+
+    for i in range(page_index, stop):
+        yield lambda page=reader.pages[i]: page.extract_text() or ''
+
+
+def _map_upload(file):
+    """
+    Memory-map an upload that Django spooled to disk, so the parser reads pages
+    straight from the page cache instead of a buffered copy. Returns None otherwise.
+    """
+    if not hasattr(file, 'temporary_file_path') or not file.size:
+        return None
+    with open(file.temporary_file_path(), 'rb') as f:
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+def _pdf_backend(file, max_pages=None):
+    if PyPDF2 is None:
+        raise FileProcessingError('PDF support missing. Install PyPDF2.')
+    mapped = _map_upload(file)
+    try:
+        yield from _pdf_pages(file, PyPDF2.PdfReader(mapped if mapped is not None else file), max_pages)
+    finally:
+        if mapped is not None:
+            mapped.close()
+
+
+def _pdf_pages(file, pdf_reader, max_pages):
+    total = len(pdf_reader.pages)
+    stop = min(total, max_pages) if max_pages else total
+    min_pages = getattr(settings, 'MATERIALS_PDF_PARALLEL_MIN_PAGES', 40)
+
+    if _pdf_workers() > 1 and stop >= min_pages:
+        units = _parallel_pdf_pages(file, pdf_reader, stop)
+    else:
+        # small documents: the pool's start-up and transfer costs outweigh the gain
+        units = (lambda page=pdf_reader.pages[i]: page.extract_text() or '' for i in range(stop))
+    if ocr.ocr_available():
+        # scanned pages have no text layer; recognise their images instead
+        units = ocr.fill_blank_pages(pdf_reader, units)
+    yield from units
+    if stop < total:
+        # tell the engine there is more document past the page budget
+        yield ''
+
+
+def _docx_backend(file):
+    if docx is None:
+        raise FileProcessingError('DOCX support missing. Install python-docx.')
+    document = docx.Document(file)
+    for para in document.paragraphs:
+        yield para.text
+
+
+def _pptx_backend(file, max_pages=None):
+    if Presentation is None:
+        raise FileProcessingError('PPTX support missing. Install python-pptx.')
+    prs = Presentation(file)
+    for slide in prs.slides:
+        yield lambda slide=slide: '\n'.join(
+            shape.text for shape in slide.shapes if hasattr(shape, "text") and shape.text
+        )
+
+
+def _txt_backend(file):
+    decoder = codecs.getincrementaldecoder('utf-8')(errors='ignore')
+    while True:
+        block = file.read(_TXT_BLOCK_SIZE)
+        if not block:
+            break
+        yield decoder.decode(block)
+    yield decoder.decode(b'', final=True)
+
+
+def _image_backend(file):
+    if not ocr.ocr_available():
+        raise FileProcessingError('Text recognition for images is not available on this server.')
+    file.seek(0)
+    data = file.read()
+    yield lambda: ocr.ocr_image_bytes(data)
+
+
+register_backend('.pdf', _pdf_backend, paged=True)
+register_backend('.docx', _docx_backend)
+register_backend('.pptx', _pptx_backend, paged=True)
+register_backend('.txt', _txt_backend)
+for _ext in ('.png', '.jpg', '.jpeg', '.tif', '.tiff', '.bmp'):
+    register_backend(_ext, _image_backend)
+
+# Units that are joined without a separator because they split running text arbitrarily.
+_CONTIGUOUS = {'.txt'}
+
+
+def content_hash(file):
+    """
+    SHA-256 of an uploaded file's bytes, read in blocks. Uses a hash already computed
+    while the upload was received when one is attached to the file.
+    """
+    precomputed = getattr(file, 'content_hash', None)
+    if precomputed:
+        return precomputed
+    digest = hashlib.sha256()
+    if hasattr(file, 'chunks'):
+        for block in file.chunks(_HASH_BLOCK_SIZE):
+            digest.update(block)
+    else:
+        file.seek(0)
+        for block in iter(lambda: file.read(_HASH_BLOCK_SIZE), b''):
+            digest.update(block)
+    file.seek(0)
+    return digest.hexdigest()
+
+
+def _cache_key(file_hash, file_ext, max_chars, max_pages, truncation_note):
+    # scanned pages come back blank without OCR, so those results must not outlive it
+    raw = f"{EXTRACTION_VERSION}|{file_hash}|{file_ext}|{max_chars}|{max_pages}|{truncation_note}|{ocr.ocr_available()}"
+    return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+
+def _cache_enabled():
+    return getattr(settings, 'MATERIALS_EXTRACTION_CACHE_ENABLED', True)
+
+
+def _get_cached_extraction(key):
+    from .models import ExtractedTextCache
+
+    entry = ExtractedTextCache.objects.filter(cache_key=key).first()
+    if entry is None:
+        return None
+    # update() bypasses auto_now so set last_used explicitly
+    ExtractedTextCache.objects.filter(pk=entry.pk).update(times_used=F('times_used') + 1, last_used=timezone.now())
+    result = ExtractionResult(entry.text, truncated=entry.truncated, units_read=entry.units_read,
+                              paged=entry.pages_read is not None)
+    result.cached = True
+    return result
+
+
+def _store_extraction(key, file_hash, file_ext, result):
+    from .models import ExtractedTextCache
+
+    if not result.text or len(result.text) > getattr(settings, 'MATERIALS_EXTRACTION_CACHE_MAX_CHARS', 200000):
+        return
+    ExtractedTextCache.objects.update_or_create(
+        cache_key=key,
+        defaults={
+            'content_hash': file_hash,
+            'file_extension': file_ext,
+            'text': result.text,
+            'truncated': result.truncated,
+            'units_read': result.units_read,
+            'pages_read': result.pages_read,
+            'times_used': 1,
+        },
+    )
+    max_rows = getattr(settings, 'MATERIALS_EXTRACTION_CACHE_MAX_ROWS', 1000)
+    cutoff = (ExtractedTextCache.objects.order_by('-last_used')
+              .values_list('last_used', flat=True)[max_rows:max_rows + 1].first())
+    if cutoff is not None:
+        deleted, _ = ExtractedTextCache.objects.filter(last_used__lte=cutoff).delete()
+        logger.info(f"Extraction cache evicted {deleted} rows last used before {cutoff}")
+
+
+def extract_text(file, max_chars=None, max_pages=None, truncation_note=TRUNCATION_NOTE, use_cache=True):
+    """
+    Extracts text from an uploaded file with the backend registered for its extension.
+
+    Args:
+        file: Django UploadedFile (or any named file-like object).
+        max_chars (int): Character budget; extraction stops once it is exceeded and
+            the text is cut to this length with truncation_note appended.
+        max_pages (int): Page/slide budget for paged formats; defaults to
+            MATERIALS_MAX_PAGES. Pages past it are never parsed.
+        truncation_note (str): Suffix marking truncated text.
+        use_cache (bool): Serve and store results in the extraction cache, keyed by
+            the SHA-256 of the file's bytes, so a re-uploaded file is not parsed again.
+
+    Returns:
+        ExtractionResult: The text and how much of the document was consumed.
+
+    Raises:
+        FileProcessingError: If the file type is unsupported or parsing fails.
+    """
+    file_ext = os.path.splitext(file.name.lower())[1]
+    backend = get_backend(file_ext)
+    if backend is None:
+        raise FileProcessingError(SUPPORTED_EXTENSIONS_MESSAGE)
+
+    separator = '' if file_ext in _CONTIGUOUS else '\n'
+    paged = file_ext in _paged
+    if max_pages is None:
+        max_pages = getattr(settings, 'MATERIALS_MAX_PAGES', 100)
+    if not paged or not max_pages:
+        max_pages = None
+
+    key = file_hash = None
+    if use_cache and _cache_enabled():
+        try:
+            file_hash = content_hash(file)
+            key = _cache_key(file_hash, file_ext, max_chars, max_pages, truncation_note)
+            cached = _get_cached_extraction(key)
+            if cached is not None:
+                logger.info(f"Extraction cache hit for {file.name} ({file_hash[:8]})")
+                return cached
+        except Exception as e:
+            logger.warning(f"Extraction cache lookup failed: {e}")
+            key = None
+
+    result = _extract(file, backend, file_ext, separator, paged, max_chars, max_pages, truncation_note)
+
+    if key is not None:
+        try:
+            _store_extraction(key, file_hash, file_ext, result)
+        except Exception as e:
+            logger.warning(f"Extraction cache store failed: {e}")
+    return result
+
+
+def _extract(file, backend, file_ext, separator, paged, max_chars, max_pages, truncation_note):
+    parts = []
+    size = 0
+    units = 0
+    truncated = False
+    try:
+        if hasattr(file, 'seek'):
+            file.seek(0)
+        units_iter = backend(file, max_pages=max_pages) if paged else backend(file)
+        for unit in units_iter:
+            if max_pages is not None and units >= max_pages:
+                # there is at least one more page we are not going to parse
+                truncated = True
+                break
+            units += 1
+            if callable(unit):
+                unit = unit()
+            if not unit:
+                continue
+            size += len(unit) + (len(separator) if parts else 0)
+            parts.append(unit)
+            if max_chars is not None and size > max_chars:
+                truncated = True
+                break
+    except FileProcessingError:
+        raise
+    except Exception as e:
+        logger.error(f"Text extraction failed for {file.name}: {e}", exc_info=True)
+        raise FileProcessingError(f'Failed to extract text: {e}')
+
+    text = separator.join(parts).strip()
+    if max_chars is not None and (truncated or len(text) > max_chars):
+        # stopping early means there was more to read, even if stripping shrank the text
+        text = text[:max_chars] + truncation_note
+        truncated = True
+    if truncated:
+        logger.info(f"Extraction of {file.name} stopped early after {units} unit(s)")
+    return ExtractionResult(text, truncated=truncated, units_read=units, paged=paged)
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.1 on 2026-10-17 02:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('materials', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ExtractedTextCache',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('cache_key', models.CharField(help_text='Hash of the content hash, file type and extraction limits', max_length=64, unique=True)),
+                ('content_hash', models.CharField(db_index=True, help_text='SHA-256 of the uploaded bytes', max_length=64)),
+                ('file_extension', models.CharField(max_length=10)),
+                ('text', models.TextField(blank=True)),
+                ('truncated', models.BooleanField(default=False)),
+                ('units_read', models.IntegerField(default=0)),
+                ('pages_read', models.IntegerField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('last_used', models.DateTimeField(auto_now=True, db_index=True)),
+                ('times_used', models.IntegerField(default=0)),
+            ],
+        ),
+    ]
@@ -12,4 +12,20 @@ class ExamDocument(BaseModel):
     extracted_text = models.TextField(blank=True, help_text="Extracted text content from the file.")
     
     def __str__(self):
-        return f"{self.title} ({self.user.username})"
\ No newline at end of file
+        return f"{self.title} ({self.user.username})"
+
+class ExtractedTextCache(models.Model):
+    """Text extracted from an uploaded file, keyed by the file's content hash and extraction budget"""
+    cache_key = models.CharField(max_length=64, unique=True, help_text="Hash of the content hash, file type and extraction limits")
+    content_hash = models.CharField(max_length=64, db_index=True, help_text="SHA-256 of the uploaded bytes")
+    file_extension = models.CharField(max_length=10)
+    text = models.TextField(blank=True)
+    truncated = models.BooleanField(default=False)
+    units_read = models.IntegerField(default=0)
+    pages_read = models.IntegerField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    last_used = models.DateTimeField(auto_now=True, db_index=True)
+    times_used = models.IntegerField(default=0)
+
+    def __str__(self):
+        return f"Extraction cache for {self.content_hash[:8]}..."
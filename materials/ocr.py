@@ -0,0 +1,210 @@
+# materials/ocr.py
+import hashlib
+import io
+import logging
+import multiprocessing
+import os
+import threading
+import time
+from collections import Counter, deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from django.conf import settings
+from django.core.cache import cache
+
+try:
+    import pytesseract
+    from PIL import Image
+except ImportError:  # pragma: no cover - optional dependency
+    pytesseract = None
+    Image = None
+
+logger = logging.getLogger(__name__)
+
+# OCR for pages without a text layer (scanned lecture notes) and for image
+# uploads. Recognition runs in a small process pool so tesseract never blocks the
+# request thread for long, results are cached per page image, and both the number
+# of pages OCR'd per document and the time spent on each page are capped.
+
+_CACHE_PREFIX = 'materials:ocr:'
+
+_pool = None
+_pool_pid = None
+_pool_lock = threading.Lock()
+_available = None
+
+# Blank PDF pages seen by fill_blank_pages, by outcome: "ocr" (sent to OCR),
+# "no_images" (no embedded image to OCR, e.g. vector-drawn scans) and "over_budget"
+# (past MATERIALS_OCR_MAX_PAGES). The last two come out of extraction empty.
+_stats = Counter()
+_stats_lock = threading.Lock()
+
+
+def ocr_available():
+    """True when pytesseract, Pillow and the tesseract binary are all present."""
+    global _available
+    if not getattr(settings, 'MATERIALS_OCR_ENABLED', True):
+        return False
+    if _available is None:
+        if pytesseract is None or Image is None:
+            _available = False
+        else:
+            try:
+                pytesseract.get_tesseract_version()
+                _available = True
+            except Exception as e:
+                logger.warning(f"OCR disabled, tesseract not usable: {e}")
+                _available = False
+    return _available
+
+
+def _ocr_images(images, timeout):
+    """
+    Worker task: recognise text in each encoded image, in order, within one time
+    budget for the whole page. Returns (text, complete); complete is False when the
+    budget ran out before every image was recognised.
+    """
+    deadline = time.monotonic() + timeout
+    texts = []
+    for data in images:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return '\n'.join(t for t in texts if t), False
+        with Image.open(io.BytesIO(data)) as img:
+            try:
+                texts.append(pytesseract.image_to_string(img, timeout=remaining).strip())
+            except RuntimeError:
+                # pytesseract kills tesseract and raises RuntimeError on timeout
+                return '\n'.join(t for t in texts if t), False
+    return '\n'.join(t for t in texts if t), True
+
+
+def _workers():
+    return getattr(settings, 'MATERIALS_OCR_WORKERS', 2)
+
+
+def _timeout():
+    return getattr(settings, 'MATERIALS_OCR_TIMEOUT', 20)
+
+
+def _get_pool():
+    """Process pool for OCR, created lazily per worker process."""
+    global _pool, _pool_pid
+    pid = os.getpid()
+    if _pool is None or _pool_pid != pid:
+        with _pool_lock:
+            if _pool is None or _pool_pid != pid:
+                _pool = ProcessPoolExecutor(
+                    max_workers=_workers(),
+                    mp_context=multiprocessing.get_context('spawn'),
+                )
+                _pool_pid = pid
+    return _pool
+
+
+def submit_ocr(images):
+    """
+    Start OCR of a page given as a list of encoded images. Returns the cached text
+    (a str) when this page was recognised before, otherwise a Future for it.
+    """
+    digest = hashlib.sha256()
+    for data in images:
+        digest.update(data)
+    key = _CACHE_PREFIX + digest.hexdigest()
+    cached = cache.get(key)
+    if cached is not None:
+        return cached
+    future = _get_pool().submit(_ocr_images, images, _timeout())
+    future.cache_key = key
+    return future
+
+
+def resolve_ocr(pending):
+    """Wait for a submit_ocr() result; failures and timeouts yield empty text."""
+    if not isinstance(pending, Future):
+        return pending
+    try:
+        # the worker stops once the page's timeout is spent; allow a margin for start-up
+        text, complete = pending.result(timeout=_timeout() * 2)
+    except Exception as e:
+        pending.cancel()
+        logger.warning(f"OCR of a page failed or timed out: {e}")
+        return ''
+    if complete:
+        cache.set(pending.cache_key, text, getattr(settings, 'MATERIALS_OCR_CACHE_TTL', 7 * 24 * 3600))
+    else:
+        logger.warning("OCR of a page ran out of time; keeping the text recognised so far")
+    return text
+
+
+def ocr_image_bytes(data):
+    """OCR a single uploaded image, waiting at most the configured timeout."""
+    return resolve_ocr(submit_ocr([data]))
+
+
+def _page_images(page):
+    try:
+        return [image.data for image in page.images]
+    except Exception as e:
+        logger.debug(f"Could not read page images: {e}")
+        return []
+
+
+def get_ocr_stats():
+    """Counts of blank PDF pages by outcome since the process started, see _stats."""
+    with _stats_lock:
+        return {key: _stats[key] for key in ("ocr", "no_images", "over_budget")}
+
+
+def _record_blank_pages(blank):
+    with _stats_lock:
+        for outcome, pages in blank.items():
+            _stats[outcome] += len(pages)
+    if blank["no_images"]:
+        logger.info(
+            f"{len(blank['no_images'])} page(s) have no text layer and no embedded image to OCR "
+            f"(pages {', '.join(map(str, blank['no_images']))})"
+        )
+    if blank["over_budget"]:
+        logger.info(
+            f"{len(blank['over_budget'])} page(s) without a text layer were not OCR'd, "
+            f"MATERIALS_OCR_MAX_PAGES reached (pages {', '.join(map(str, blank['over_budget']))})"
+        )
+
+
+def fill_blank_pages(reader, units):
+    """
+    Wrap a PDF page-text iterator so pages without a text layer are OCR'd from their
+    embedded images (all of them, in order, when a scan is split into strips). Up to
+    MATERIALS_OCR_WORKERS pages are recognised concurrently while later pages are
+    read; results are yielded in page order. At most MATERIALS_OCR_MAX_PAGES pages of
+    a document are OCR'd. Pages are not rasterised, so blank pages with no embedded
+    image stay empty; they are counted and logged.
+    """
+    budget = getattr(settings, 'MATERIALS_OCR_MAX_PAGES', 20)
+    lookahead = _workers()
+    pending = deque()
+    blank = {"ocr": [], "no_images": [], "over_budget": []}
+    try:
+        for index, unit in enumerate(units):
+            text = unit() if callable(unit) else unit
+            if not text.strip():
+                if len(blank["ocr"]) >= budget:
+                    blank["over_budget"].append(index + 1)
+                else:
+                    images = _page_images(reader.pages[index])
+                    if images:
+                        blank["ocr"].append(index + 1)
+                        text = submit_ocr(images)
+                    else:
+                        blank["no_images"].append(index + 1)
+            pending.append(text)
+            # hand back finished pages straight away; only wait on OCR once enough is in flight
+            while pending and (not isinstance(pending[0], Future) or len(pending) > lookahead):
+                yield resolve_ocr(pending.popleft())
+        while pending:
+            yield resolve_ocr(pending.popleft())
+    finally:
+        for item in pending:
+            if isinstance(item, Future):
+                item.cancel()
+        _record_blank_pages(blank)
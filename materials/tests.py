@@ -1,3 +1,379 @@
-from django.test import TestCase
+import hashlib
+import io
+import json
+import os
+import time
+import zlib
+from unittest import mock
 
-# Create your tests here.
+import docx
+import PyPDF2
+from pptx import Presentation
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.http import JsonResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+
+from core.exceptions import FileProcessingError
+from . import extraction, ocr
+from .extraction import extract_text
+from .models import ExtractedTextCache
+from .upload_handlers import hashing_uploads, upload_rejected
+
+
+def _build_pdf(pages):
+    """
+    A minimal PDF from (content stream, {name: (width, height, rgb bytes)}) pairs;
+    images are embedded as Flate-compressed RGB XObjects.
+    """
+    objects = {1: b"<< /Type /Catalog /Pages 2 0 R >>",
+               3: b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"}
+    kids = []
+    number = 4
+    for content, images in pages:
+        xobjects = []
+        for name, (width, height, pixels) in images.items():
+            data = zlib.compress(pixels)
+            objects[number] = (
+                f"<< /Type /XObject /Subtype /Image /Width {width} /Height {height} "
+                f"/ColorSpace /DeviceRGB /BitsPerComponent 8 /Filter /FlateDecode "
+                f"/Length {len(data)} >>\nstream\n"
+            ).encode() + data + b"\nendstream"
+            xobjects.append(f"/{name} {number} 0 R")
+            number += 1
+        objects[number] = b"<< /Length %d >>\nstream\n" % len(content) + content + b"\nendstream"
+        objects[number + 1] = (
+            f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] /Contents {number} 0 R "
+            f"/Resources << /Font << /F1 3 0 R >> /XObject << {' '.join(xobjects)} >> >> >>"
+        ).encode()
+        kids.append(number + 1)
+        number += 2
+    objects[2] = f"<< /Type /Pages /Kids [{' '.join(f'{k} 0 R' for k in kids)}] /Count {len(kids)} >>".encode()
+
+    data = b"%PDF-1.4\n"
+    offsets = {}
+    for key in sorted(objects):
+        offsets[key] = len(data)
+        data += f"{key} 0 obj\n".encode() + objects[key] + b"\nendobj\n"
+    xref = len(data)
+    data += f"xref\n0 {number}\n0000000000 65535 f \n".encode()
+    data += b"".join(f"{offsets[key]:010d} 00000 n \n".encode() for key in range(1, number))
+    data += f"trailer\n<< /Size {number} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF".encode()
+    return data
+
+
+def _strip(shade):
+    return (40, 10, bytes([shade]) * (40 * 10 * 3))
+
+
+def _text_pdf(count):
+    return _build_pdf([(b"BT /F1 12 Tf 72 720 Td (Page %d) Tj ET" % (i + 1), {}) for i in range(count)])
+
+
+def _office_file(document):
+    buffer = io.BytesIO()
+    document.save(buffer)
+    return buffer.getvalue()
+
+
+class ExtractionEngineTests(SimpleTestCase):
+    """One engine serves every format through its registered backend."""
+
+    def _extract(self, name, data, **kwargs):
+        return extract_text(SimpleUploadedFile(name, data), use_cache=False, **kwargs)
+
+    def test_pdf_pages_are_joined_in_order(self):
+        result = self._extract('notes.pdf', _text_pdf(3))
+        self.assertEqual(result.text.split('\n'), ['Page 1', 'Page 2', 'Page 3'])
+        self.assertEqual(result.pages_read, 3)
+        self.assertFalse(result.truncated)
+
+    def test_docx_paragraphs(self):
+        document = docx.Document()
+        for text in ('Osmosis', '', 'Diffusion'):
+            document.add_paragraph(text)
+        result = self._extract('notes.docx', _office_file(document))
+        self.assertEqual(result.text, 'Osmosis\nDiffusion')
+        self.assertIsNone(result.pages_read)
+
+    def test_pptx_slides(self):
+        deck = Presentation()
+        for title in ('Cells', 'Tissues'):
+            deck.slides.add_slide(deck.slide_layouts[5]).shapes.title.text = title
+        self.assertEqual(self._extract('deck.pptx', _office_file(deck)).text, 'Cells\nTissues')
+
+    def test_txt_characters_split_across_blocks_survive(self):
+        data = ('a' * (extraction._TXT_BLOCK_SIZE - 1) + 'é and more').encode()
+        self.assertTrue(self._extract('notes.txt', data).text.endswith('aé and more'))
+
+    def test_unsupported_type_is_rejected(self):
+        with self.assertRaisesMessage(FileProcessingError, extraction.SUPPORTED_EXTENSIONS_MESSAGE):
+            self._extract('notes.exe', b'MZ')
+
+    def test_parse_errors_become_file_processing_errors(self):
+        with self.assertRaises(FileProcessingError), self.assertLogs('materials.extraction', 'ERROR'):
+            self._extract('broken.pdf', b'not a pdf')
+
+    def test_backends_can_be_registered(self):
+        extraction.register_backend('.md', lambda file: iter(['# Title', 'Body']))
+        self.addCleanup(extraction._backends.pop, '.md')
+        self.assertIn('.md', extraction.supported_extensions())
+        self.assertEqual(self._extract('notes.md', b'').text, '# Title\nBody')
+
+
+@override_settings(MATERIALS_MAX_PAGES=100)
+class ExtractionBudgetTests(SimpleTestCase):
+    """Pages past the page or character budget are never parsed."""
+
+    def setUp(self):
+        patcher = mock.patch.object(PyPDF2.PageObject, 'extract_text', autospec=True,
+                                    side_effect=PyPDF2.PageObject.extract_text)
+        self.parsed = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _extract(self, data, name='notes.pdf', **kwargs):
+        return extract_text(SimpleUploadedFile(name, data), use_cache=False, **kwargs)
+
+    def test_page_budget_stops_parsing(self):
+        result = self._extract(_text_pdf(5), max_pages=2)
+        self.assertEqual(result.text, 'Page 1\nPage 2')
+        self.assertEqual(result.pages_read, 2)
+        self.assertTrue(result.truncated)
+        self.assertEqual(self.parsed.call_count, 2)
+
+    @override_settings(MATERIALS_MAX_PAGES=3)
+    def test_page_budget_defaults_to_the_setting(self):
+        self.assertEqual(self._extract(_text_pdf(5)).pages_read, 3)
+
+    def test_document_that_fits_the_budget_is_not_truncated(self):
+        result = self._extract(_text_pdf(2), max_pages=2)
+        self.assertFalse(result.truncated)
+        self.assertEqual(result.pages_read, 2)
+
+    def test_character_budget_stops_parsing(self):
+        result = self._extract(_text_pdf(5), max_chars=10, truncation_note=' [cut]')
+        self.assertEqual(result.text, 'Page 1\nPag [cut]')
+        self.assertTrue(result.truncated)
+        self.assertEqual(self.parsed.call_count, 2)
+
+    def test_slide_budget(self):
+        deck = Presentation()
+        for title in ('Cells', 'Tissues', 'Organs'):
+            deck.slides.add_slide(deck.slide_layouts[5]).shapes.title.text = title
+        result = self._extract(_office_file(deck), name='deck.pptx', max_pages=2)
+        self.assertEqual(result.text, 'Cells\nTissues')
+        self.assertTrue(result.truncated)
+
+
+@override_settings(MATERIALS_PDF_WORKERS=2, MATERIALS_PDF_PARALLEL_MIN_PAGES=10, MATERIALS_MAX_PAGES=100)
+class ParallelPdfTests(SimpleTestCase):
+    """Large PDFs are read in page ranges by the process pool, in page order."""
+
+    pages = 24
+
+    def _extract(self, **kwargs):
+        return extract_text(SimpleUploadedFile('notes.pdf', _text_pdf(self.pages)), use_cache=False, **kwargs)
+
+    def _expected(self, count):
+        return '\n'.join(f'Page {i + 1}' for i in range(count))
+
+    def test_pool_extracts_every_page_in_order(self):
+        with mock.patch.object(extraction, '_get_pdf_pool', wraps=extraction._get_pdf_pool) as pool:
+            result = self._extract()
+        pool.assert_called()
+        self.assertEqual(result.text, self._expected(self.pages))
+
+    def test_pages_past_the_budget_are_not_sent_to_the_pool(self):
+        submitted = []
+        real_pool = extraction._get_pdf_pool()
+
+        class Pool:
+            def submit(self, fn, path, start, stop):
+                submitted.append((start, stop))
+                return real_pool.submit(fn, path, start, stop)
+
+        with mock.patch.object(extraction, '_get_pdf_pool', return_value=Pool()):
+            result = self._extract(max_pages=12)
+        self.assertEqual(result.text, self._expected(12))
+        self.assertLessEqual(max(stop for _, stop in submitted), 12)
+
+    def test_small_pdfs_are_read_in_process(self):
+        with mock.patch.object(extraction, '_get_pdf_pool') as pool:
+            self.assertEqual(self._extract(max_pages=5).text, self._expected(5))
+        pool.assert_not_called()
+
+    def test_pool_failure_falls_back_to_reading_serially(self):
+        with mock.patch.object(extraction, '_get_pdf_pool', side_effect=OSError('no processes')), \
+                self.assertLogs('materials.extraction', 'WARNING'):
+            self.assertEqual(self._extract().text, self._expected(self.pages))
+
+
+class FillBlankPagesTests(SimpleTestCase):
+    """A text page, a scan split into three image strips, and a vector-drawn scan."""
+
+    def setUp(self):
+        strips = {f"Im{i}": _strip(60 * i) for i in range(3)}
+        strip_content = b" ".join(
+            b"q 612 0 0 264 0 %d cm /Im%d Do Q" % (264 * i, i) for i in range(3)
+        )
+        pdf = _build_pdf([
+            (b"BT /F1 12 Tf 72 720 Td (Lecture one) Tj ET", {}),
+            (strip_content, strips),
+            (b"0 0 m 300 400 l 200 100 l h f", {}),
+        ])
+        self.reader = PyPDF2.PdfReader(io.BytesIO(pdf))
+
+    def _units(self):
+        return [page.extract_text() or '' for page in self.reader.pages]
+
+    def test_every_strip_of_a_scanned_page_is_ocred(self):
+        with mock.patch.object(ocr, 'submit_ocr', return_value='recognised') as submit:
+            texts = list(ocr.fill_blank_pages(self.reader, self._units()))
+
+        self.assertIn('Lecture one', texts[0])
+        self.assertEqual(texts[1:], ['recognised', ''])
+        submit.assert_called_once()
+        self.assertEqual(len(submit.call_args.args[0]), 3)
+
+    def test_page_without_text_or_images_is_counted_and_logged(self):
+        before = ocr.get_ocr_stats()
+        with mock.patch.object(ocr, 'submit_ocr', return_value='recognised'), \
+                self.assertLogs('materials.ocr', 'INFO') as logs:
+            list(ocr.fill_blank_pages(self.reader, self._units()))
+
+        after = ocr.get_ocr_stats()
+        self.assertEqual(after['ocr'] - before['ocr'], 1)
+        self.assertEqual(after['no_images'] - before['no_images'], 1)
+        self.assertIn('(pages 3)', logs.output[0])
+
+    @override_settings(MATERIALS_OCR_MAX_PAGES=0)
+    def test_pages_past_the_ocr_budget_are_counted_and_logged(self):
+        before = ocr.get_ocr_stats()
+        with mock.patch.object(ocr, 'submit_ocr') as submit, \
+                self.assertLogs('materials.ocr', 'INFO') as logs:
+            texts = list(ocr.fill_blank_pages(self.reader, self._units()))
+
+        submit.assert_not_called()
+        self.assertEqual(texts[1:], ['', ''])
+        self.assertEqual(ocr.get_ocr_stats()['over_budget'] - before['over_budget'], 2)
+        self.assertIn('MATERIALS_OCR_MAX_PAGES', logs.output[0])
+
+
+class PageOcrBudgetTests(SimpleTestCase):
+    """Each image of a page gets what is left of one MATERIALS_OCR_TIMEOUT budget."""
+
+    def setUp(self):
+        self.images = []
+        for shade in (0, 120, 240):
+            buffer = io.BytesIO()
+            ocr.Image.new('RGB', (40, 10), (shade, shade, shade)).save(buffer, 'PNG')
+            self.images.append(buffer.getvalue())
+        self.timeouts = []
+
+    def _recognise(self, img, timeout):
+        # like tesseract taking 0.2s per image and being killed at its timeout
+        self.timeouts.append(timeout)
+        time.sleep(min(timeout, 0.2))
+        if timeout < 0.2:
+            raise RuntimeError('Tesseract process timeout')
+        return f'strip {len(self.timeouts)}'
+
+    def test_page_stops_when_its_budget_is_spent(self):
+        started = time.monotonic()
+        with mock.patch.object(ocr.pytesseract, 'image_to_string', side_effect=self._recognise):
+            text, complete = ocr._ocr_images(self.images, 0.5)
+
+        self.assertLess(time.monotonic() - started, 0.6)
+        self.assertEqual(text, 'strip 1\nstrip 2')
+        self.assertFalse(complete)
+        self.assertEqual(len(self.timeouts), 3)
+        self.assertTrue(self.timeouts[0] > self.timeouts[1] > self.timeouts[2])
+
+    def test_page_within_budget_is_complete(self):
+        with mock.patch.object(ocr.pytesseract, 'image_to_string', side_effect=self._recognise):
+            self.assertEqual(ocr._ocr_images(self.images, 5), ('strip 1\nstrip 2\nstrip 3', True))
+
+    def test_cut_short_page_is_not_cached(self):
+        pending = ocr.Future()
+        pending.cache_key = ocr._CACHE_PREFIX + 'page'
+        pending.set_result(('strip 1', False))
+        with mock.patch.object(ocr.cache, 'set') as cache_set, self.assertLogs('materials.ocr', 'WARNING'):
+            self.assertEqual(ocr.resolve_ocr(pending), 'strip 1')
+        cache_set.assert_not_called()
+
+
+class ExtractionCacheTests(TestCase):
+
+    def setUp(self):
+        self.scan = _build_pdf([(b"q 612 0 0 792 0 0 cm /Im0 Do Q", {"Im0": _strip(90)})])
+
+    def _extract(self, name, data):
+        return extract_text(SimpleUploadedFile(name, data))
+
+    def test_reupload_is_served_from_the_cache(self):
+        self.assertFalse(self._extract('notes.txt', b'Cells divide by mitosis.').cached)
+        result = self._extract('copy.txt', b'Cells divide by mitosis.')
+        self.assertTrue(result.cached)
+        self.assertEqual(result.text, 'Cells divide by mitosis.')
+
+    def test_budget_is_part_of_the_key(self):
+        self._extract('notes.txt', b'Cells divide by mitosis.')
+        result = extract_text(SimpleUploadedFile('notes.txt', b'Cells divide by mitosis.'), max_chars=5)
+        self.assertFalse(result.cached)
+        self.assertTrue(result.truncated)
+
+    @override_settings(MATERIALS_EXTRACTION_CACHE_MAX_CHARS=10)
+    def test_long_text_is_not_cached(self):
+        self._extract('notes.txt', b'Cells divide by mitosis.')
+        self.assertFalse(ExtractedTextCache.objects.exists())
+
+    @override_settings(MATERIALS_EXTRACTION_CACHE_MAX_ROWS=1)
+    def test_least_recently_used_rows_are_evicted(self):
+        self._extract('old.txt', b'Old notes')
+        self._extract('new.txt', b'New notes')
+        self.assertEqual(list(ExtractedTextCache.objects.values_list('text', flat=True)), ['New notes'])
+
+    def test_empty_result_is_not_cached(self):
+        with mock.patch.object(ocr, 'ocr_available', return_value=False):
+            self.assertEqual(self._extract('scan.pdf', self.scan).text, '')
+        self.assertFalse(ExtractedTextCache.objects.exists())
+
+    def test_scan_extracted_without_ocr_is_read_again_once_ocr_is_available(self):
+        pdf = _build_pdf([(b"BT /F1 12 Tf 72 720 Td (Title page) Tj ET", {}),
+                          (b"q 612 0 0 792 0 0 cm /Im0 Do Q", {"Im0": _strip(90)})])
+        with mock.patch.object(ocr, 'ocr_available', return_value=False):
+            self.assertEqual(self._extract('lecture.pdf', pdf).text, 'Title page')
+        with mock.patch.object(ocr, 'ocr_available', return_value=True), \
+                mock.patch.object(ocr, 'submit_ocr', return_value='Scanned page'):
+            result = self._extract('lecture.pdf', pdf)
+        self.assertFalse(result.cached)
+        self.assertEqual(result.text, 'Title page\nScanned page')
+
+
+@hashing_uploads
+def _upload_view(request):
+    upload = request.FILES.get('file')
+    return JsonResponse({
+        'rejected': upload_rejected(request, 'file'),
+        'hash': getattr(upload, 'content_hash', None),
+        'on_disk': upload is not None and os.path.exists(upload.temporary_file_path()),
+    })
+
+
+@override_settings(MATERIALS_MAX_UPLOAD_SIZE=1024, FILE_UPLOAD_MAX_MEMORY_SIZE=10 * 1024 * 1024)
+class HashingUploadHandlerTests(SimpleTestCase):
+
+    def _post(self, data, csrf_checks=False):
+        request = RequestFactory().post('/upload/', {'file': SimpleUploadedFile('notes.txt', data)})
+        request._dont_enforce_csrf_checks = not csrf_checks
+        return _upload_view(request)
+
+    def test_upload_is_hashed_while_streamed_to_disk(self):
+        data = b'Cells divide by mitosis. ' * 40
+        self.assertEqual(json.loads(self._post(data).content),
+                         {'rejected': False, 'hash': hashlib.sha256(data).hexdigest(), 'on_disk': True})
+
+    def test_oversized_upload_is_rejected(self):
+        self.assertEqual(json.loads(self._post(b'x' * 1025).content), {'rejected': True, 'hash': None, 'on_disk': False})
+
+    def test_csrf_is_still_checked(self):
+        self.assertEqual(self._post(b'notes', csrf_checks=True).status_code, 403)
@@ -0,0 +1,85 @@
+# materials/upload_handlers.py
+import hashlib
+import logging
+from functools import wraps
+from django.conf import settings
+from django.core.files.uploadhandler import SkipFile, TemporaryFileUploadHandler
+from django.views.decorators.csrf import csrf_exempt, csrf_protect
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_UPLOAD_SIZE = 10 * 1024 * 1024  # 10MB
+
+
+class HashingUploadHandler(TemporaryFileUploadHandler):
+    """
+    Streams every study-material upload straight to a temporary file, so memory use
+    per upload stays constant whatever the file size. While the chunks go by it
+    computes the SHA-256 of the content (attached to the file as content_hash, used
+    by the extraction cache) and enforces the size limit, skipping the file as soon
+    as it is exceeded instead of after the whole body has been read.
+
+    Files skipped for size are listed in request.rejected_uploads as field names.
+    """
+
+    def __init__(self, request=None, max_size=None):
+        super().__init__(request)
+        self.max_size = max_size or getattr(settings, 'MATERIALS_MAX_UPLOAD_SIZE', DEFAULT_MAX_UPLOAD_SIZE)
+        self.digest = None
+        self.received = 0
+        if request is not None and not hasattr(request, 'rejected_uploads'):
+            request.rejected_uploads = []
+
+    def new_file(self, field_name, file_name, content_type, content_length, charset=None, content_type_extra=None):
+        self.digest = hashlib.sha256()
+        self.received = 0
+        if content_length is not None and content_length > self.max_size:
+            self._reject(field_name, file_name)
+        super().new_file(field_name, file_name, content_type, content_length, charset, content_type_extra)
+
+    def receive_data_chunk(self, raw_data, start):
+        self.received += len(raw_data)
+        if self.received > self.max_size:
+            self.file.close()
+            self._reject(self.field_name, self.file_name)
+        self.digest.update(raw_data)
+        return super().receive_data_chunk(raw_data, start)
+
+    def file_complete(self, file_size):
+        file = super().file_complete(file_size)
+        file.content_hash = self.digest.hexdigest()
+        return file
+
+    def _reject(self, field_name, file_name):
+        logger.info(f"Upload {file_name} rejected: larger than {self.max_size} bytes")
+        if self.request is not None:
+            self.request.rejected_uploads.append(field_name)
+        raise SkipFile()
+
+
+def upload_rejected(request, field_name):
+    """True when the upload for field_name was dropped by HashingUploadHandler for size."""
+    request.FILES  # the body is parsed lazily; make sure the handler has run
+    return field_name in getattr(request, 'rejected_uploads', ())
+
+
+def hashing_uploads(view=None, protect=True):
+    """
+    Decorator installing HashingUploadHandler for a view. Upload handlers must be set
+    before the request body is parsed, and CsrfViewMiddleware parses it for POSTs, so
+    the view is exempted from the middleware and CSRF is checked here instead
+    (unless protect=False, for views that are already csrf_exempt).
+    """
+    def decorator(view_func):
+        checked = csrf_protect(view_func) if protect else view_func
+
+        @csrf_exempt
+        @wraps(view_func)
+        def wrapper(request, *args, **kwargs):
+            request.upload_handlers = [HashingUploadHandler(request)]
+            return checked(request, *args, **kwargs)
+        return wrapper
+
+    if view is not None:
+        return decorator(view)
+    return decorator
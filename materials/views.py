@@ -4,6 +4,7 @@ from django.http import JsonResponse
 from django.views.decorators.http import require_POST
 import logging
 from .services import MaterialService
+from .upload_handlers import hashing_uploads, upload_rejected
 
 logger = logging.getLogger(__name__)
 
@@ -13,12 +14,15 @@ def upload_slides(request):
     """
     return render(request, 'materials/upload.html')
 
+@hashing_uploads
 @require_POST
 def ajax_extract_text(request):
     """
     An AJAX endpoint to extract text from an uploaded file.
     This logic has been moved to a dedicated service.
     """
+    if upload_rejected(request, 'slide_file'):
+        return JsonResponse({'error': 'File too large (max 10MB)'}, status=400)
     if 'slide_file' not in request.FILES:
         return JsonResponse({'error': 'No file uploaded'}, status=400)
     
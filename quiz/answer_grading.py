@@ -0,0 +1,113 @@
+# quiz/answer_grading.py
+import math
+import threading
+from collections import Counter
+
+from django.conf import settings
+
+from core.retrieval import STOPWORDS, normalize_text, stem
+
+# Local, deterministic pre-grading of short answers. Blank, exact and clearly
+# wrong answers are settled here; only ambiguous ones are sent to the AI.
+
+_NEGATIONS = frozenset({"not", "no", "never", "none", "neither", "nor", "cannot", "isnt",
+                        "arent", "wasnt", "werent", "dont", "doesnt", "didnt", "wont"})
+
+_stats = Counter()
+_stats_lock = threading.Lock()
+
+
+def normalize_answer(text):
+    """Lowercase, drop apostrophes and collapse everything but letters/digits to single spaces."""
+    return normalize_text(text)
+
+
+def content_stems(normalized):
+    return {stem(w) for w in normalized.split() if w not in STOPWORDS}
+
+
+def char_ngram_similarity(a, b, n=3):
+    """Cosine similarity of character n-gram counts of two normalized strings."""
+    a, b = f" {a} ", f" {b} "
+    grams_a = Counter(a[i:i + n] for i in range(max(1, len(a) - n + 1)))
+    grams_b = Counter(b[i:i + n] for i in range(max(1, len(b) - n + 1)))
+    dot = sum(count * grams_b[g] for g, count in grams_a.items())
+    norm = math.sqrt(sum(c * c for c in grams_a.values())) * math.sqrt(sum(c * c for c in grams_b.values()))
+    return dot / norm if norm else 0.0
+
+
+def similarity(expected_answer, user_answer):
+    """
+    Score in [0, 1] of how well user_answer covers expected_answer: a blend of the
+    share of expected content words (stemmed) present in the answer and character
+    trigram similarity, which catches small spelling differences.
+    """
+    exp = normalize_answer(expected_answer)
+    user = normalize_answer(user_answer)
+    if not exp or not user:
+        return 0.0
+    exp_stems = content_stems(exp) or set(exp.split())
+    user_stems = content_stems(user) or set(user.split())
+    recall = len(exp_stems & user_stems) / len(exp_stems)
+    return 0.6 * recall + 0.4 * char_ngram_similarity(exp, user)
+
+
+def pre_grade(expected_answer, user_answer):
+    """
+    Grade a short answer locally when the verdict is obvious.
+
+    Returns:
+        True or False for confident verdicts, or None when the answer is ambiguous
+        and should be escalated to the AI grader. Thresholds are tunable via
+        QUIZ_PREGRADE_ACCEPT (score at or above which an answer is accepted) and
+        QUIZ_PREGRADE_REJECT (score at or below which it is rejected).
+    """
+    if not getattr(settings, 'QUIZ_PREGRADE_ENABLED', True):
+        return None
+
+    user = normalize_answer(user_answer)
+    exp = normalize_answer(expected_answer)
+    if not user:
+        verdict = False
+    elif user == exp:
+        verdict = True
+    elif not exp:
+        verdict = None
+    elif exp.replace(" ", "").isdigit() and user.replace(" ", "").isdigit():
+        # numeric answers (years, counts) are right or wrong, nothing in between
+        verdict = False
+    else:
+        score = similarity(exp, user)
+        negated = (set(user.split()) & _NEGATIONS) - set(exp.split())
+        # a longer answer sharing nothing with the expected one may be a paraphrase,
+        # so only short unrelated answers are rejected outright
+        short = len(user.split()) <= max(3, len(exp.split()))
+        if score <= getattr(settings, 'QUIZ_PREGRADE_REJECT', 0.15) and short:
+            verdict = False
+        elif score >= getattr(settings, 'QUIZ_PREGRADE_ACCEPT', 0.85) and not negated:
+            # a negation the expected answer lacks can flip the meaning: let the AI decide
+            verdict = True
+        else:
+            verdict = None
+
+    _record(verdict)
+    return verdict
+
+
+def _record(verdict):
+    key = {True: "accepted", False: "rejected", None: "escalated"}[verdict]
+    with _stats_lock:
+        _stats[key] += 1
+
+
+def get_pregrade_stats():
+    """Counts of answers accepted/rejected locally (AI calls avoided) and escalated."""
+    with _stats_lock:
+        stats = {key: _stats[key] for key in ("accepted", "rejected", "escalated")}
+    stats["ai_calls_avoided"] = stats["accepted"] + stats["rejected"]
+    return stats
+
+
+def reset_pregrade_stats():
+    with _stats_lock:
+        _stats.clear()
@@ -1,10 +1,19 @@
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
 import logging
+from concurrent.futures import ThreadPoolExecutor
+from django.conf import settings
 from django.contrib import messages
+from django.core.files.storage import default_storage
+from django.http import JsonResponse
+from django.urls import reverse
+from django.utils import timezone
+from django.views.decorators.http import require_http_methods
+from core import background
 from materials.services import MaterialService
-from django.db import transaction
-from .models import ExamDocument, ExamAnalysis
+from materials.upload_handlers import hashing_uploads
+from django.db import close_old_connections, transaction
+from .models import ExamDocument, ExamAnalysis, ExamAnalysisJob
 
 logger = logging.getLogger(__name__)
 
@@ -21,9 +30,12 @@ def perform_exam_analysis(text_content, subject, context=''):
         'predictions': predictions
     }
 
+@hashing_uploads
 def exam_analyzer(request):
     """
-    Renders the exam analyzer page and handles file uploads.
+    Renders the exam analyzer page and handles file uploads. The uploads are saved
+    to storage and analyzed by a background job; the user is sent to the job page,
+    which polls exam_analysis_job_status until the results are ready.
     """
     if request.method == 'POST':
         subject = request.POST.get('subject', '').strip()
@@ -35,56 +47,194 @@ def exam_analyzer(request):
         if not any(f'exam_file_{i}' in request.FILES for i in range(1, 6)):
             return render(request, 'quiz/exam_analyzer.html', {'error_message': 'Please upload at least one file.'})
         
-        all_text_content = []
-        uploaded_documents = []
-        
         try:
-            with transaction.atomic():
-                for i in range(1, 6):
-                    file_key = f'exam_file_{i}'
-                    if file_key in request.FILES:
-                        file = request.FILES[file_key]
-                        try:
-                            extracted_text = MaterialService.extract_text_from_file(file)
-                            all_text_content.append(extracted_text)
-                            
-                            if request.user.is_authenticated:
-                                doc = ExamDocument.objects.create(
-                                    user=request.user,
-                                    title=file.name,
-                                    subject=subject,
-                                    document_file=file,
-                                    extracted_text=extracted_text[:10000]
-                                )
-                                uploaded_documents.append(doc)
-                        except Exception as e:
-                            logger.error(f"Error processing file {file.name}: {e}")
-                            continue
-                            
-            if not all_text_content:
-                return render(request, 'quiz/exam_analyzer.html', {'error_message': 'No valid content could be extracted.'})
-                
-            combined_text = '\n\n'.join(all_text_content)
-            analysis_results = perform_exam_analysis(combined_text, subject, context)
-            
-            if request.user.is_authenticated and uploaded_documents:
-                analysis = ExamAnalysis.objects.create(
-                    user=request.user,
-                    subject=subject,
-                    analysis_data=analysis_results
-                )
-                analysis.documents_analyzed.set(uploaded_documents)
-                return redirect('exam_analysis_results', analysis_id=analysis.id)
-            else:
-                request.session['anon_exam_analysis'] = analysis_results
-                return redirect('exam_analysis_results_anon')
-                
+            saved_files = []
+            for i in range(1, 6):
+                file_key = f'exam_file_{i}'
+                if file_key in request.FILES:
+                    file = request.FILES[file_key]
+                    # uploads are already spooled to disk, so this is a move, not a copy
+                    path = default_storage.save(f'exam_documents/{file.name}', file)
+                    saved_files.append({
+                        'name': file.name,
+                        'path': path,
+                        'content_hash': getattr(file, 'content_hash', ''),
+                    })
+
+            if not request.session.session_key:
+                request.session.save()
+            job = ExamAnalysisJob.objects.create(
+                user=request.user if request.user.is_authenticated else None,
+                session_key=request.session.session_key,
+                subject=subject,
+                context=context,
+                files=saved_files,
+            )
+            background.submit(run_exam_analysis_job, job.pk)
+            return redirect('quiz:exam_analysis_job', job_id=job.pk)
+
         except Exception as e:
             logger.error(f"Exam analyzer error: {e}")
             return render(request, 'quiz/exam_analyzer.html', {'error_message': f'Analysis failed: {str(e)}'})
             
     return render(request, 'quiz/exam_analyzer.html')
 
+
+def _extract_stored_file(entry):
+    """Extracts text from one uploaded file saved to storage; None if it cannot be read."""
+    close_old_connections()
+    try:
+        with default_storage.open(entry['path']) as file:
+            file.name = entry['name']
+            if entry.get('content_hash'):
+                file.content_hash = entry['content_hash']
+            return MaterialService.extract_text_from_file(file)
+    except Exception as e:
+        logger.error(f"Error processing file {entry['name']}: {e}")
+        return None
+    finally:
+        close_old_connections()
+
+
+def _delete_job_files(job):
+    for entry in job.files:
+        try:
+            default_storage.delete(entry['path'])
+        except Exception as e:
+            logger.warning(f"Could not delete {entry['path']}: {e}")
+
+
+def _advance_job(job, from_status, to_status):
+    """Moves job from from_status to to_status; False if it has been failed as stale meanwhile."""
+    moved = ExamAnalysisJob.objects.filter(pk=job.pk, status=from_status).update(
+        status=to_status, updated_at=timezone.now()
+    )
+    job.status = to_status
+    return bool(moved)
+
+
+def run_exam_analysis_job(job_id):
+    """
+    Background task: extract every file of the job concurrently, analyze the combined
+    text, then record documents and results. Only the final bookkeeping runs in a
+    transaction, so no write lock is held while files are parsed or analyzed.
+    """
+    # claim the job, so one that was reported failed as stale (or already picked up) is not run
+    claimed = ExamAnalysisJob.objects.filter(pk=job_id, status=ExamAnalysisJob.STATUS_QUEUED).update(
+        status=ExamAnalysisJob.STATUS_EXTRACTING, updated_at=timezone.now()
+    )
+    if not claimed:
+        logger.info(f"Exam analysis job {job_id} is no longer queued; skipping")
+        return
+    job = ExamAnalysisJob.objects.get(pk=job_id)
+    try:
+        workers = min(len(job.files), getattr(settings, 'EXAM_ANALYZER_EXTRACT_WORKERS', 5)) or 1
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="exam-extract") as executor:
+            texts = list(executor.map(_extract_stored_file, job.files))
+        extracted = [(entry, text) for entry, text in zip(job.files, texts) if text]
+
+        if not extracted:
+            raise ValueError('No valid content could be extracted.')
+
+        if not _advance_job(job, ExamAnalysisJob.STATUS_EXTRACTING, ExamAnalysisJob.STATUS_ANALYZING):
+            return  # failed as stale meanwhile; _get_job has removed its files
+        combined_text = '\n\n'.join(text for _, text in extracted)
+        analysis_results = perform_exam_analysis(combined_text, job.subject, job.context)
+
+        with transaction.atomic():
+            still_running = ExamAnalysisJob.objects.select_for_update().filter(
+                pk=job.pk, status=ExamAnalysisJob.STATUS_ANALYZING
+            ).exists()
+            if not still_running:
+                return
+            if job.user_id:
+                documents = [
+                    ExamDocument.objects.create(
+                        user_id=job.user_id,
+                        title=entry['name'],
+                        subject=job.subject,
+                        document_file=entry['path'],
+                        extracted_text=text[:10000]
+                    )
+                    for entry, text in extracted
+                ]
+                analysis = ExamAnalysis.objects.create(
+                    user_id=job.user_id,
+                    subject=job.subject,
+                    analysis_data=analysis_results
+                )
+                analysis.documents_analyzed.set(documents)
+                job.analysis = analysis
+            job.result = analysis_results
+            job.status = ExamAnalysisJob.STATUS_DONE
+            job.finished_at = timezone.now()
+            job.save(update_fields=['analysis', 'result', 'status', 'finished_at', 'updated_at'])
+
+    except Exception as e:
+        logger.error(f"Exam analysis job {job_id} failed: {e}", exc_info=True)
+        job.status = ExamAnalysisJob.STATUS_FAILED
+        job.error = f'Analysis failed: {e}'
+        job.finished_at = timezone.now()
+        job.save(update_fields=['status', 'error', 'finished_at', 'updated_at'])
+
+    if not job.user_id or job.status == ExamAnalysisJob.STATUS_FAILED:
+        # anonymous uploads (and failed runs) keep no ExamDocument, so drop the files
+        _delete_job_files(job)
+
+
+def _get_job(request, job_id):
+    if request.user.is_authenticated:
+        jobs = ExamAnalysisJob.objects.filter(user=request.user)
+    else:
+        jobs = ExamAnalysisJob.objects.filter(user__isnull=True, session_key=request.session.session_key or '')
+    job = jobs.filter(pk=job_id).first()
+    # a job lost in a restart stops moving; report it as failed rather than poll forever
+    stale_after = getattr(settings, 'EXAM_ANALYZER_JOB_STALE_AFTER', 600)
+    if job and not job.is_finished and (timezone.now() - job.updated_at).total_seconds() > stale_after:
+        failed = ExamAnalysisJob.objects.filter(pk=job.pk, status=job.status).update(
+            status=ExamAnalysisJob.STATUS_FAILED,
+            error='Exam analysis was interrupted. Please try again.',
+            finished_at=timezone.now(),
+            updated_at=timezone.now(),
+        )
+        if failed:
+            # the job will never run (run_exam_analysis_job skips it), so its files go now
+            _delete_job_files(job)
+        job.refresh_from_db()
+    return job
+
+
+def exam_analysis_job(request, job_id):
+    """
+    Results page of an exam analysis job: shows progress while the job runs (the
+    page polls exam_analysis_job_status) and the analysis once it is done.
+    """
+    job = _get_job(request, job_id)
+    if job is None:
+        return render(request, 'quiz/exam_analysis_results.html', {'error_message': 'Analysis not found.'})
+    if job.status == ExamAnalysisJob.STATUS_DONE and job.analysis_id:
+        return redirect('quiz:exam_analysis_results', analysis_id=job.analysis_id)
+    return render(request, 'quiz/exam_analysis_results.html', {
+        'job': job,
+        'analysis_results': job.result if job.status == ExamAnalysisJob.STATUS_DONE else None,
+        'error_message': job.error or None,
+        'status_url': reverse('quiz:exam_analysis_job_status', args=[job.pk]),
+    })
+
+
+@require_http_methods(["GET"])
+def exam_analysis_job_status(request, job_id):
+    """JSON status of an exam analysis job, polled by the results page."""
+    job = _get_job(request, job_id)
+    if job is None:
+        return JsonResponse({'status': 'error', 'message': 'Analysis not found.'}, status=404)
+    data = {'status': job.status}
+    if job.status == ExamAnalysisJob.STATUS_FAILED:
+        data['message'] = job.error
+    if job.is_finished:
+        data['redirect_url'] = reverse('quiz:exam_analysis_job', args=[job.pk])
+    return JsonResponse(data)
+
 def exam_analysis_results(request, analysis_id=None):
     """
     Displays the results of an exam analysis.
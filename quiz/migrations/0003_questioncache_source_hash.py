@@ -0,0 +1,23 @@
+# Generated by Django 5.2.1 on 2026-10-17 02:08
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quiz', '0002_question_questioncache_examanalysis'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='questioncache',
+            name='explanation',
+            field=models.TextField(blank=True, default=''),
+        ),
+        migrations.AddField(
+            model_name='questioncache',
+            name='source_hash',
+            field=models.CharField(blank=True, db_index=True, default='', help_text='Hash of the normalized study text, subject and difficulty the question was generated from', max_length=64),
+        ),
+    ]
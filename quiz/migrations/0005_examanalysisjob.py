@@ -0,0 +1,38 @@
+# Generated by Django 5.2.1 on 2026-10-17 02:22
+
+import django.db.models.deletion
+import uuid
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quiz', '0004_quizgenerationjob'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ExamAnalysisJob',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('session_key', models.CharField(blank=True, db_index=True, help_text='Session of the requester, for anonymous users', max_length=40)),
+                ('status', models.CharField(choices=[('queued', 'Queued'), ('extracting', 'Extracting'), ('analyzing', 'Analyzing'), ('done', 'Done'), ('failed', 'Failed')], db_index=True, default='queued', max_length=10)),
+                ('subject', models.CharField(max_length=100)),
+                ('context', models.TextField(blank=True)),
+                ('files', models.JSONField(default=list, help_text='Uploaded files as saved to storage: name, path and content hash')),
+                ('result', models.JSONField(blank=True, help_text='Analysis results', null=True)),
+                ('error', models.TextField(blank=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+                ('analysis', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='jobs', to='quiz.examanalysis')),
+                ('user', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='exam_analysis_jobs', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['-created_at'],
+            },
+        ),
+    ]
@@ -56,8 +56,10 @@ class Question(models.Model):
 class QuestionCache(models.Model):
     """Cache for storing generated questions based on content hash"""
     question_content_hash = models.CharField(max_length=64, unique=True, db_index=True)
+    source_hash = models.CharField(max_length=64, blank=True, default='', db_index=True, help_text="Hash of the normalized study text, subject and difficulty the question was generated from")
     question_text = models.TextField(null=True, blank=True)
     answer = models.TextField(null=True, blank=True)
+    explanation = models.TextField(blank=True, default='')
     question_type = models.CharField(max_length=20, null=True, blank=True)
     options = models.JSONField(null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
@@ -81,3 +83,73 @@ class ExamAnalysis(BaseModel):
         
     def __str__(self):
         return f"Analysis for {self.subject} by {self.user.username}"    
+
+
+class QuizGenerationJob(BaseModel):
+    """A quiz generation request processed in the background; the client polls it by id"""
+    STATUS_QUEUED = 'queued'
+    STATUS_RUNNING = 'running'
+    STATUS_DONE = 'done'
+    STATUS_FAILED = 'failed'
+    STATUS_CHOICES = [
+        (STATUS_QUEUED, 'Queued'),
+        (STATUS_RUNNING, 'Running'),
+        (STATUS_DONE, 'Done'),
+        (STATUS_FAILED, 'Failed'),
+    ]
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE, null=True, blank=True, related_name='quiz_generation_jobs')
+    session_key = models.CharField(max_length=40, blank=True, db_index=True, help_text="Session of the requester, for anonymous users")
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=STATUS_QUEUED, db_index=True)
+    study_text = models.TextField()
+    params = models.JSONField(default=dict, help_text="Validated form values the quiz is generated with")
+    result = models.JSONField(null=True, blank=True, help_text="Generated quiz questions")
+    error = models.TextField(blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['-created_at']
+
+    def __str__(self):
+        return f"Quiz generation job {self.id} ({self.status})"
+
+    @property
+    def is_finished(self):
+        return self.status in (self.STATUS_DONE, self.STATUS_FAILED)
+
+
+class ExamAnalysisJob(BaseModel):
+    """An exam analysis run in the background: files are extracted, then analyzed"""
+    STATUS_QUEUED = 'queued'
+    STATUS_EXTRACTING = 'extracting'
+    STATUS_ANALYZING = 'analyzing'
+    STATUS_DONE = 'done'
+    STATUS_FAILED = 'failed'
+    STATUS_CHOICES = [
+        (STATUS_QUEUED, 'Queued'),
+        (STATUS_EXTRACTING, 'Extracting'),
+        (STATUS_ANALYZING, 'Analyzing'),
+        (STATUS_DONE, 'Done'),
+        (STATUS_FAILED, 'Failed'),
+    ]
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE, null=True, blank=True, related_name='exam_analysis_jobs')
+    session_key = models.CharField(max_length=40, blank=True, db_index=True, help_text="Session of the requester, for anonymous users")
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=STATUS_QUEUED, db_index=True)
+    subject = models.CharField(max_length=100)
+    context = models.TextField(blank=True)
+    files = models.JSONField(default=list, help_text="Uploaded files as saved to storage: name, path and content hash")
+    result = models.JSONField(null=True, blank=True, help_text="Analysis results")
+    analysis = models.ForeignKey(ExamAnalysis, on_delete=models.SET_NULL, null=True, blank=True, related_name='jobs')
+    error = models.TextField(blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['-created_at']
+
+    def __str__(self):
+        return f"Exam analysis job {self.id} ({self.status})"
+
+    @property
+    def is_finished(self):
+        return self.status in (self.STATUS_DONE, self.STATUS_FAILED)
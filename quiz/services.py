@@ -1,8 +1,21 @@
 # quiz/services.py
+import asyncio
 import logging
+import math
+import threading
+import time
 import json, re
-from core.ai_client import ai_client
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor, wait
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db.models import F
+from django.utils import timezone
+from core.ai_client import ai_client, async_ai_client
+from core.chunking import split_text_into_chunks
 from core.exceptions import APIIntegrationError
+from .answer_grading import pre_grade
+from .models import Question, QuestionCache, QuizGenerationJob
 
 logger = logging.getLogger(__name__)
 
@@ -225,11 +238,8 @@ class QuizService:
         return sanitized
 
     @staticmethod
-    def generate_quiz(study_text, num_mcq, num_short, subject="General", difficulty="any"):
-        if not study_text or len(str(study_text).strip()) < 30:
-            raise ValueError("Please provide at least 30 characters of study material.")
-
-        prompt = f"""
+    def _build_quiz_prompt(study_text, num_mcq, num_short, subject, difficulty):
+        return f"""
         Generate quiz questions from the following text.
 
         Subject: {subject}
@@ -247,21 +257,21 @@ class QuizService:
         Do not include any surrounding commentary.
         """
 
-        try:
-            raw = ai_client.generate_content(prompt, raise_on_error=False)
-        except Exception as e:
-            logger.error("AI client call failed: %s", e)
-            fallback = QuizService._fallback_questions(study_text, num_mcq, num_short, subject)
-            return {"mcq_questions": fallback["mcq_questions"][:num_mcq], "short_questions": fallback["short_questions"][:num_short]}
+    @staticmethod
+    def _fallback_result(study_text, num_mcq, num_short, subject):
+        fallback = QuizService._fallback_questions(study_text, num_mcq, num_short, subject)
+        return {"mcq_questions": fallback["mcq_questions"][:num_mcq], "short_questions": fallback["short_questions"][:num_short]}
 
+    @staticmethod
+    def _parse_quiz_response(raw, num_mcq, num_short):
+        """Turn a provider response into sanitized question lists, or None if it is unusable."""
         # Extract assistant text from provider response (handles dicts and strings)
         assistant_text = QuizService._extract_text_from_provider_response(raw)
         assistant_text = (assistant_text or "").strip()
 
         if not assistant_text:
             logger.error("AI returned no assistant text (raw repr truncated): %s", str(raw)[:1000])
-            fallback = QuizService._fallback_questions(study_text, num_mcq, num_short, subject)
-            return {"mcq_questions": fallback["mcq_questions"][:num_mcq], "short_questions": fallback["short_questions"][:num_short]}
+            return None
 
         parsed = None
         # Try parsing full text as JSON
@@ -272,8 +282,7 @@ class QuizService:
 
         if parsed is None or not isinstance(parsed, dict):
             logger.error("Failed to parse AI response JSON. Assistant text (truncated 2000 chars):\n%s", assistant_text[:2000])
-            fallback = QuizService._fallback_questions(study_text, num_mcq, num_short, subject)
-            return {"mcq_questions": fallback["mcq_questions"][:num_mcq], "short_questions": fallback["short_questions"][:num_short]}
+            return None
 
         # Extract lists (allow flexibility in naming)
         mcq_list = parsed.get("mcq_questions") or parsed.get("mcqs") or parsed.get("multiple_choice") or []
@@ -284,32 +293,526 @@ class QuizService:
 
         if len(mcq_list) == 0 and len(short_list) == 0:
             logger.warning("AI returned empty question lists after parsing — using fallback.")
-            fallback = QuizService._fallback_questions(study_text, num_mcq, num_short, subject)
-            return {"mcq_questions": fallback["mcq_questions"][:num_mcq], "short_questions": fallback["short_questions"][:num_short]}
+            return None
 
         return {"mcq_questions": mcq_list, "short_questions": short_list}
 
+    # -----------------------------
+    # Question cache
+    # -----------------------------
     @staticmethod
-    def grade_short_answer(question, expected_answer, user_answer):
-        prompt = f"""
+    def _source_hash(study_text, subject, difficulty):
+        """Hash of the whitespace/case-normalized study text plus subject and difficulty."""
+        normalized = " ".join(str(study_text).split()).lower()
+        return Question.generate_content_hash(f"{normalized}\x1f{subject}\x1f{difficulty}".lower())
+
+    @staticmethod
+    def _question_cache_enabled():
+        return getattr(settings, 'QUIZ_QUESTION_CACHE_ENABLED', True)
+
+    @staticmethod
+    def _get_cached_questions(source_hash, num_mcq, num_short):
+        """
+        Serve questions previously generated from the same source when there are enough
+        of each type. Returns the quiz dict, or None on a miss.
+        """
+        rows = list(QuestionCache.objects.filter(source_hash=source_hash).order_by('created_at', 'id'))
+        mcq_rows = [r for r in rows if r.question_type == 'mcq'][:max(0, int(num_mcq))]
+        short_rows = [r for r in rows if r.question_type == 'short'][:max(0, int(num_short))]
+        if len(mcq_rows) < num_mcq or len(short_rows) < num_short:
+            return None
+
+        # one UPDATE for every served row; update() bypasses auto_now so set last_used explicitly
+        QuestionCache.objects.filter(pk__in=[r.pk for r in mcq_rows + short_rows]).update(
+            times_used=F('times_used') + 1,
+            last_used=timezone.now(),
+        )
+        logger.info("Question cache hit for %s: %d MCQ, %d short", source_hash[:8], len(mcq_rows), len(short_rows))
+        return {
+            "mcq_questions": [
+                {"question": r.question_text, "options": r.options or [], "answer": r.answer, "explanation": r.explanation}
+                for r in mcq_rows
+            ],
+            "short_questions": [
+                {"question": r.question_text, "answer": r.answer, "explanation": r.explanation}
+                for r in short_rows
+            ],
+        }
+
+    @staticmethod
+    def _store_questions(source_hash, quiz):
+        """Persist freshly generated questions for the source, then evict least recently used rows."""
+        entries = []
+        for question_type, key in (('mcq', 'mcq_questions'), ('short', 'short_questions')):
+            for q in quiz.get(key, []):
+                text = str(q.get('question', ''))
+                entries.append(QuestionCache(
+                    question_content_hash=Question.generate_content_hash(f"{source_hash}:{question_type}:{text}"),
+                    source_hash=source_hash,
+                    question_text=text,
+                    answer=q.get('answer', ''),
+                    explanation=q.get('explanation', '') or '',
+                    question_type=question_type,
+                    options=q.get('options') if question_type == 'mcq' else None,
+                    times_used=1,
+                ))
+        QuestionCache.objects.bulk_create(entries, ignore_conflicts=True)
+        QuizService._evict_question_cache()
+
+    @staticmethod
+    def _evict_question_cache():
+        max_rows = getattr(settings, 'QUIZ_QUESTION_CACHE_MAX_ROWS', 5000)
+        cutoff = (QuestionCache.objects.order_by('-last_used')
+                  .values_list('last_used', flat=True)[max_rows:max_rows + 1].first())
+        if cutoff is not None:
+            deleted, _ = QuestionCache.objects.filter(last_used__lte=cutoff).delete()
+            logger.info("Question cache evicted %d rows last used before %s", deleted, cutoff)
+
+    # -----------------------------
+    # Chunked (map-reduce) generation for long material
+    # -----------------------------
+    @staticmethod
+    def _plan_chunks(study_text, num_mcq, num_short):
+        """
+        Split long study text into coherent chunks and give each a share of the
+        requested questions, proportional to its length. Returns a list of
+        (chunk_text, chunk_mcq, chunk_short), or None when one call is enough.
+        """
+        chunk_chars = getattr(settings, 'QUIZ_CHUNK_CHARS', 8000)
+        max_chunks = getattr(settings, 'QUIZ_MAX_CHUNKS', 6)
+        text = str(study_text)
+        if len(text) <= chunk_chars:
+            return None
+
+        # grow chunks rather than drop text so coverage spans the whole document
+        chunk_chars = max(chunk_chars, math.ceil(len(text) / max_chunks))
+        chunks = split_text_into_chunks(text, chunk_chars)
+        while len(chunks) > max_chunks:
+            # paragraph packing can leave a few extra chunks; widen until we fit
+            chunk_chars = int(chunk_chars * 1.25)
+            chunks = split_text_into_chunks(text, chunk_chars)
+        if len(chunks) <= 1:
+            return None
+
+        total = sum(len(c) for c in chunks)
+        plan = []
+        for chunk in chunks:
+            share = len(chunk) / total
+            # ask each chunk for at least one question of every requested type: the
+            # surplus feeds deduplication and rebalancing in _merge_chunk_results
+            chunk_mcq = max(1, math.ceil(num_mcq * share)) if num_mcq > 0 else 0
+            chunk_short = max(1, math.ceil(num_short * share)) if num_short > 0 else 0
+            plan.append((chunk, chunk_mcq, chunk_short))
+        return plan
+
+    @staticmethod
+    def _merge_chunk_results(results, num_mcq, num_short):
+        """
+        Merge per-chunk quizzes: take questions round-robin across chunks so every part
+        of the document is represented, drop duplicates, and trim to the requested counts.
+        """
+        def normalize(q):
+            return re.sub(r'[^a-z0-9]+', ' ', str(q.get('question', '')).lower()).strip()
+
+        merged = {}
+        for key, limit in (('mcq_questions', num_mcq), ('short_questions', num_short)):
+            queues = [list(r.get(key, [])) for r in results if r]
+            seen = set()
+            picked = []
+            while len(picked) < limit and any(queues):
+                for queue in queues:
+                    if not queue or len(picked) >= limit:
+                        continue
+                    question = queue.pop(0)
+                    fingerprint = normalize(question)
+                    if fingerprint and fingerprint not in seen:
+                        seen.add(fingerprint)
+                        picked.append(question)
+            merged[key] = picked
+
+        if not merged['mcq_questions'] and not merged['short_questions']:
+            return None
+        return merged
+
+    @staticmethod
+    def _generate_chunk(chunk, chunk_mcq, chunk_short, subject, difficulty):
+        prompt = QuizService._build_quiz_prompt(chunk, chunk_mcq, chunk_short, subject, difficulty)
+        try:
+            raw = ai_client.generate_content(prompt, raise_on_error=False, call_site="quiz")
+        except Exception as e:
+            logger.warning("Chunk generation failed: %s", e)
+            return None
+        return QuizService._parse_quiz_response(raw, chunk_mcq, chunk_short)
+
+    @staticmethod
+    async def _agenerate_chunk(chunk, chunk_mcq, chunk_short, subject, difficulty, semaphore):
+        prompt = QuizService._build_quiz_prompt(chunk, chunk_mcq, chunk_short, subject, difficulty)
+        async with semaphore:
+            try:
+                raw = await async_ai_client.generate_content(prompt, raise_on_error=False, call_site="quiz")
+            except Exception as e:
+                logger.warning("Chunk generation failed: %s", e)
+                return None
+        return QuizService._parse_quiz_response(raw, chunk_mcq, chunk_short)
+
+    @staticmethod
+    def _generate_chunked(plan, num_mcq, num_short, subject, difficulty):
+        workers = min(len(plan), getattr(settings, 'QUIZ_CHUNK_WORKERS', 4))
+        logger.info("Generating quiz over %d chunks with %d workers", len(plan), workers)
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="quiz-chunk") as executor:
+            results = list(executor.map(
+                lambda item: QuizService._generate_chunk(item[0], item[1], item[2], subject, difficulty),
+                plan,
+            ))
+        return QuizService._merge_chunk_results(results, num_mcq, num_short)
+
+    @staticmethod
+    async def _agenerate_chunked(plan, num_mcq, num_short, subject, difficulty):
+        semaphore = asyncio.Semaphore(getattr(settings, 'QUIZ_CHUNK_WORKERS', 4))
+        results = await asyncio.gather(*[
+            QuizService._agenerate_chunk(chunk, chunk_mcq, chunk_short, subject, difficulty, semaphore)
+            for chunk, chunk_mcq, chunk_short in plan
+        ])
+        return QuizService._merge_chunk_results(results, num_mcq, num_short)
+
+    @staticmethod
+    def generate_quiz(study_text, num_mcq, num_short, subject="General", difficulty="any"):
+        if not study_text or len(str(study_text).strip()) < 30:
+            raise ValueError("Please provide at least 30 characters of study material.")
+
+        source_hash = None
+        if QuizService._question_cache_enabled():
+            source_hash = QuizService._source_hash(study_text, subject, difficulty)
+            try:
+                cached = QuizService._get_cached_questions(source_hash, num_mcq, num_short)
+                if cached:
+                    return cached
+            except Exception as e:
+                logger.warning("Question cache lookup failed: %s", e)
+
+        plan = QuizService._plan_chunks(study_text, num_mcq, num_short)
+        if plan:
+            quiz = QuizService._generate_chunked(plan, num_mcq, num_short, subject, difficulty)
+        else:
+            prompt = QuizService._build_quiz_prompt(study_text, num_mcq, num_short, subject, difficulty)
+
+            try:
+                raw = ai_client.generate_content(prompt, raise_on_error=False, call_site="quiz")
+            except Exception as e:
+                logger.error("AI client call failed: %s", e)
+                return QuizService._fallback_result(study_text, num_mcq, num_short, subject)
+
+            quiz = QuizService._parse_quiz_response(raw, num_mcq, num_short)
+        if quiz is None:
+            return QuizService._fallback_result(study_text, num_mcq, num_short, subject)
+
+        if source_hash:
+            try:
+                QuizService._store_questions(source_hash, quiz)
+            except Exception as e:
+                logger.warning("Question cache store failed: %s", e)
+        return quiz
+
+    @staticmethod
+    async def agenerate_quiz(study_text, num_mcq, num_short, subject="General", difficulty="any"):
+        """Async variant of generate_quiz for ASGI views."""
+        if not study_text or len(str(study_text).strip()) < 30:
+            raise ValueError("Please provide at least 30 characters of study material.")
+
+        source_hash = None
+        if QuizService._question_cache_enabled():
+            source_hash = QuizService._source_hash(study_text, subject, difficulty)
+            try:
+                cached = await sync_to_async(QuizService._get_cached_questions)(source_hash, num_mcq, num_short)
+                if cached:
+                    return cached
+            except Exception as e:
+                logger.warning("Question cache lookup failed: %s", e)
+
+        plan = QuizService._plan_chunks(study_text, num_mcq, num_short)
+        if plan:
+            quiz = await QuizService._agenerate_chunked(plan, num_mcq, num_short, subject, difficulty)
+        else:
+            prompt = QuizService._build_quiz_prompt(study_text, num_mcq, num_short, subject, difficulty)
+
+            try:
+                raw = await async_ai_client.generate_content(prompt, raise_on_error=False, call_site="quiz")
+            except Exception as e:
+                logger.error("AI client call failed: %s", e)
+                return QuizService._fallback_result(study_text, num_mcq, num_short, subject)
+
+            quiz = QuizService._parse_quiz_response(raw, num_mcq, num_short)
+        if quiz is None:
+            return QuizService._fallback_result(study_text, num_mcq, num_short, subject)
+
+        if source_hash:
+            try:
+                await sync_to_async(QuizService._store_questions)(source_hash, quiz)
+            except Exception as e:
+                logger.warning("Question cache store failed: %s", e)
+        return quiz
+
+    @staticmethod
+    def run_generation_job(job_id):
+        """
+        Background task: generate the quiz for a QuizGenerationJob and record the
+        outcome on the job, where the status endpoint picks it up.
+        """
+        updated = QuizGenerationJob.objects.filter(pk=job_id, status=QuizGenerationJob.STATUS_QUEUED).update(
+            status=QuizGenerationJob.STATUS_RUNNING, updated_at=timezone.now()
+        )
+        if not updated:
+            logger.warning("Quiz generation job %s is not queued; skipping", job_id)
+            return
+        job = QuizGenerationJob.objects.get(pk=job_id)
+        params = job.params
+        try:
+            quiz = QuizService.generate_quiz(
+                job.study_text,
+                params.get('num_mcq', 5),
+                params.get('num_short', 0),
+                params.get('subject', 'General'),
+                params.get('difficulty', 'any'),
+            )
+            job.result = quiz
+            job.status = QuizGenerationJob.STATUS_DONE
+        except Exception as e:
+            logger.error("Quiz generation job %s failed: %s", job_id, e, exc_info=True)
+            job.error = f"Quiz generation failed: {e}"
+            job.status = QuizGenerationJob.STATUS_FAILED
+        # a job reported failed as stale meanwhile stays failed
+        finished = QuizGenerationJob.objects.filter(pk=job_id, status=QuizGenerationJob.STATUS_RUNNING).update(
+            result=job.result, status=job.status, error=job.error, finished_at=timezone.now(), updated_at=timezone.now()
+        )
+        if not finished:
+            logger.warning("Quiz generation job %s was failed as stale before it finished", job_id)
+
+    @staticmethod
+    def _build_grading_prompt(question, expected_answer, user_answer):
+        return f"""
         Evaluate the following short answer for correctness.
         Question: {question}
         Expected answer: {expected_answer}
         User answer: {user_answer}
         Reply only with 'Yes' if the user's answer is correct, or 'No' if it is not.
         """
+
+    @staticmethod
+    def _heuristic_grade(expected_answer, user_answer):
+        """Word-overlap grading used when the AI cannot be reached."""
+        user = (user_answer or "").lower().strip()
+        exp = (expected_answer or "").lower().strip()
+        if user and user == exp:
+            return True
+        ew = set(exp.split())
+        uw = set(user.split())
+        if ew and len(ew.intersection(uw)) / len(ew) > 0.5:
+            return True
+        return False
+
+    @staticmethod
+    def grade_short_answer(question, expected_answer, user_answer):
+        # obvious verdicts (blank, exact match, clearly unrelated) never reach the AI
+        verdict = pre_grade(expected_answer, user_answer)
+        if verdict is not None:
+            return verdict
+        return QuizService._ai_grade_short_answer(question, expected_answer, user_answer)
+
+    @staticmethod
+    def _ai_grade_short_answer(question, expected_answer, user_answer):
+        prompt = QuizService._build_grading_prompt(question, expected_answer, user_answer)
         try:
-            resp = ai_client.generate_content(prompt, raise_on_error=False)
+            resp = ai_client.generate_content(prompt, raise_on_error=False, call_site="grading")
             text = QuizService._extract_text_from_provider_response(resp)
             return str(text).strip().lower().startswith("yes")
         except Exception as e:
             logger.warning("AI grading failed, falling back to heuristic: %s", e)
-            user = (user_answer or "").lower().strip()
-            exp = (expected_answer or "").lower().strip()
-            if user and user == exp:
-                return True
-            ew = set(exp.split())
-            uw = set(user.split())
-            if ew and len(ew.intersection(uw)) / len(ew) > 0.5:
-                return True
-            return False
+            return QuizService._heuristic_grade(expected_answer, user_answer)
+
+    # -----------------------------
+    # Batch grading: one prompt for every short answer of a submission
+    # -----------------------------
+    @staticmethod
+    def _build_batch_grading_prompt(items):
+        lines = []
+        for i, item in enumerate(items):
+            lines.append(
+                f"{i}. Question: {item.get('question', '')}\n"
+                f"   Expected answer: {item.get('expected_answer', '')}\n"
+                f"   User answer: {item.get('user_answer', '')}"
+            )
+        answers = "\n".join(lines)
+        return f"""
+        Evaluate each of the following short answers for correctness.
+
+        {answers}
+
+        Respond ONLY with a JSON array containing one object per answer, in this format:
+        [{{"id": 0, "correct": true}}, {{"id": 1, "correct": false}}]
+        """
+
+    @staticmethod
+    def _parse_batch_grades(raw, count):
+        """
+        Parse per-item verdicts from a batch grading response.
+        Returns a dict {index: bool} holding only the items that parsed cleanly.
+        """
+        # the client already hands back parsed JSON when the reply was JSON
+        if isinstance(raw, list) or (isinstance(raw, dict) and ('results' in raw or 'grades' in raw)):
+            parsed = raw
+        else:
+            text = QuizService._extract_text_from_provider_response(raw)
+            parsed = QuizService._extract_json_substring(text)
+        if isinstance(parsed, dict):
+            parsed = parsed.get('results') or parsed.get('grades') or []
+        if not isinstance(parsed, list):
+            return {}
+
+        verdicts = {}
+        for position, entry in enumerate(parsed):
+            if isinstance(entry, dict):
+                idx = entry.get('id', position)
+                verdict = entry.get('correct')
+            else:
+                idx, verdict = position, entry
+            try:
+                idx = int(idx)
+            except (TypeError, ValueError):
+                continue
+            if isinstance(verdict, str):
+                verdict = {'yes': True, 'true': True, 'no': False, 'false': False}.get(verdict.strip().lower())
+            if 0 <= idx < count and isinstance(verdict, bool):
+                verdicts[idx] = verdict
+        return verdicts
+
+    @staticmethod
+    def _grading_deadline(deadline=None):
+        if deadline is None:
+            deadline = getattr(settings, 'QUIZ_GRADING_DEADLINE', 20.0)
+        return max(0.0, float(deadline))
+
+    @staticmethod
+    def _pre_grade_answers(items):
+        """Settle obvious answers locally; return (results, indexes still needing the AI)."""
+        results = [None] * len(items)
+        pending = []
+        for i, item in enumerate(items):
+            results[i] = pre_grade(item.get('expected_answer'), item.get('user_answer'))
+            if results[i] is None:
+                pending.append(i)
+        return results, pending
+
+    @staticmethod
+    def _heuristic_for(item):
+        return QuizService._heuristic_grade(item.get('expected_answer'), item.get('user_answer'))
+
+    @staticmethod
+    def _grade_pending_concurrently(items, pending, results, deadline):
+        """
+        Grade items[i] for each i in pending with one AI call each, run concurrently.
+        Items not graded within `deadline` seconds get the word-overlap heuristic, so
+        this never takes much longer than the deadline however many items there are.
+        """
+        if not pending:
+            return results
+
+        executor = _grading_executor(len(pending))
+        try:
+            futures = {
+                executor.submit(
+                    QuizService._ai_grade_short_answer,
+                    items[i].get('question', ''), items[i].get('expected_answer', ''), items[i].get('user_answer', ''),
+                ): i
+                for i in pending
+            }
+            done, not_done = wait(futures, timeout=QuizService._grading_deadline(deadline))
+        finally:
+            # queued calls never start; running ones finish in the background
+            executor.shutdown(wait=False, cancel_futures=True)
+        for future in done:
+            i = futures[future]
+            try:
+                results[i] = future.result()
+            except Exception as e:
+                logger.warning("AI grading failed, falling back to heuristic: %s", e)
+                _record_grading_fallback("error")
+                results[i] = QuizService._heuristic_for(items[i])
+        if not_done:
+            logger.warning("Grading deadline hit; %d answer(s) graded heuristically", len(not_done))
+            _record_grading_fallback("deadline", len(not_done))
+        for future in not_done:
+            results[futures[future]] = QuizService._heuristic_for(items[futures[future]])
+        return results
+
+    @staticmethod
+    def grade_short_answers_batch(items, deadline=None):
+        """
+        Grade all short answers of a submission with a single AI call.
+
+        Args:
+            items (list[dict]): Each with 'question', 'expected_answer' and 'user_answer'.
+            deadline (float): Overall time budget in seconds, QUIZ_GRADING_DEADLINE by default.
+
+        Returns:
+            list[bool]: One verdict per item, in order. Answers the local pre-grader
+            settles confidently never reach the AI. Items the AI did not return a
+            verdict for are graded individually and concurrently within what is left of
+            the deadline; if the batch call fails or times out, every item falls back to
+            the word-overlap heuristic.
+        """
+        results, pending = QuizService._pre_grade_answers(items)
+        if not pending:
+            return results
+
+        started = time.monotonic()
+        budget = QuizService._grading_deadline(deadline)
+        batch = [items[i] for i in pending]
+        prompt = QuizService._build_batch_grading_prompt(batch)
+        executor = _grading_executor(1)
+        future = executor.submit(ai_client.generate_content, prompt, raise_on_error=True, call_site="grading")
+        executor.shutdown(wait=False)
+        try:
+            raw = future.result(timeout=budget)
+        except Exception as e:
+            logger.warning("Batch grading failed, falling back to heuristic: %s", str(e) or "deadline exceeded")
+            _record_grading_fallback("deadline" if isinstance(e, TimeoutError) else "error", len(pending))
+            for i in pending:
+                results[i] = QuizService._heuristic_for(items[i])
+            return results
+
+        verdicts = QuizService._parse_batch_grades(raw, len(batch))
+        missing = [i for position, i in enumerate(pending) if position not in verdicts]
+        for position, i in enumerate(pending):
+            if position in verdicts:
+                results[i] = verdicts[position]
+        if missing:
+            remaining = budget - (time.monotonic() - started)
+            QuizService._grade_pending_concurrently(items, missing, results, remaining)
+        return results
+
+
+def _grading_executor(calls):
+    """
+    Thread pool for one submission's grading calls, at most QUIZ_GRADING_WORKERS wide.
+    Each submission gets its own, so calls left running past one submission's deadline
+    never hold up the grading of another.
+    """
+    workers = max(1, min(calls, getattr(settings, 'QUIZ_GRADING_WORKERS', 4)))
+    return ThreadPoolExecutor(max_workers=workers, thread_name_prefix="quiz-grading")
+
+
+# Answers graded by the word-overlap heuristic because the AI failed ("error") or did
+# not answer in time ("deadline"), since the process started.
+_fallback_stats = Counter()
+_fallback_stats_lock = threading.Lock()
+
+
+def _record_grading_fallback(reason, count=1):
+    with _fallback_stats_lock:
+        _fallback_stats[reason] += count
+
+
+def get_grading_fallback_stats():
+    """Counts of answers graded heuristically, by reason ("error", "deadline")."""
+    with _fallback_stats_lock:
+        return {reason: _fallback_stats[reason] for reason in ("error", "deadline")}
@@ -1,3 +1,473 @@
-from django.test import TestCase
+import json
+import time
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from core.ai_client import AIClient
+from . import exam_analyzer, services, views
+from .answer_grading import get_pregrade_stats, pre_grade, similarity
+from .models import ExamAnalysis, ExamAnalysisJob, ExamDocument, QuestionCache, QuizGenerationJob
+from .services import QuizService, get_grading_fallback_stats
+
+
+def _items(*answers):
+    return [
+        {'question': f'Question {i}', 'expected_answer': expected, 'user_answer': given}
+        for i, (expected, given) in enumerate(answers)
+    ]
+
+
+@override_settings(DEEPSEEK_API_KEY='test', AI_CACHE_ENABLED=False, QUIZ_PREGRADE_ENABLED=False)
+class BatchGradingTests(SimpleTestCase):
+
+    def setUp(self):
+        self.prompts = []
+        self.batch_reply = '[]'
+        patcher = mock.patch.object(AIClient, '_call_provider', autospec=True, side_effect=self._reply)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _reply(self, client, provider, prompt, max_tokens, temperature=None):
+        self.prompts.append(prompt)
+        if 'each of the following' in prompt:
+            return self.batch_reply
+        return 'Yes'
+
+    def test_parses_verdicts_by_id(self):
+        raw = '[{"id": 1, "correct": false}, {"id": 0, "correct": "yes"}, {"id": 7, "correct": true}]'
+        self.assertEqual(QuizService._parse_batch_grades(raw, 2), {0: True, 1: False})
+
+    def test_parses_wrapped_and_bare_verdicts(self):
+        self.assertEqual(QuizService._parse_batch_grades({'results': [True, 'no']}, 2), {0: True, 1: False})
+        self.assertEqual(QuizService._parse_batch_grades('Sure! [true, false] hope that helps', 2), {0: True, 1: False})
+
+    def test_unparseable_reply_has_no_verdicts(self):
+        self.assertEqual(QuizService._parse_batch_grades('I cannot grade these.', 2), {})
+        self.assertEqual(QuizService._parse_batch_grades('[{"id": "x", "correct": "maybe"}]', 1), {})
+
+    def test_one_call_grades_every_answer(self):
+        self.batch_reply = json.dumps([{'id': 0, 'correct': True}, {'id': 1, 'correct': False}])
+        verdicts = QuizService.grade_short_answers_batch(_items(('osmosis', 'diffusion of water'), ('mitosis', 'meiosis')))
+        self.assertEqual(verdicts, [True, False])
+        self.assertEqual(len(self.prompts), 1)
+
+    def test_answer_missing_from_the_reply_is_graded_on_its_own(self):
+        self.batch_reply = json.dumps([{'id': 0, 'correct': False}])
+        verdicts = QuizService.grade_short_answers_batch(_items(('osmosis', 'diffusion'), ('mitosis', 'cell division')))
+        self.assertEqual(verdicts, [False, True])
+        self.assertEqual(len(self.prompts), 2)
+        self.assertIn('cell division', self.prompts[1])
+
+
+@override_settings(DEEPSEEK_API_KEY='test', AI_CACHE_ENABLED=False, QUIZ_PREGRADE_ENABLED=False)
+class GradingDeadlineTests(SimpleTestCase):
+    """Answers the AI does not grade within the deadline get the word-overlap heuristic."""
+
+    answers = _items(('the cell membrane', 'cell membrane'), ('chlorophyll', 'sunlight'))
+
+    def _patch_provider(self, batch_delay, single_delay):
+        def reply(client, provider, prompt, max_tokens, temperature=None):
+            if 'each of the following' in prompt:
+                time.sleep(batch_delay)
+                return '[]'
+            time.sleep(single_delay)
+            return 'No'
+        patcher = mock.patch.object(AIClient, '_call_provider', autospec=True, side_effect=reply)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _grade(self, deadline):
+        before = get_grading_fallback_stats()['deadline']
+        started = time.monotonic()
+        verdicts = QuizService.grade_short_answers_batch(self.answers, deadline=deadline)
+        return verdicts, time.monotonic() - started, get_grading_fallback_stats()['deadline'] - before
+
+    def test_slow_batch_call_falls_back_at_the_deadline(self):
+        self._patch_provider(batch_delay=1.0, single_delay=0)
+        verdicts, elapsed, fallbacks = self._grade(deadline=0.2)
+        self.assertEqual(verdicts, [True, False])
+        self.assertLess(elapsed, 0.8)
+        self.assertEqual(fallbacks, 2)
+
+    def test_slow_individual_calls_fall_back_at_the_deadline(self):
+        self._patch_provider(batch_delay=0, single_delay=1.0)
+        verdicts, elapsed, fallbacks = self._grade(deadline=0.3)
+        self.assertEqual(verdicts, [True, False])
+        self.assertLess(elapsed, 0.9)
+        self.assertEqual(fallbacks, 2)
+
+    def test_answers_graded_in_time_keep_the_ai_verdict(self):
+        self._patch_provider(batch_delay=0, single_delay=0)
+        verdicts, _, fallbacks = self._grade(deadline=5)
+        self.assertEqual(verdicts, [False, False])
+        self.assertEqual(fallbacks, 0)
+
+
+class PreGradeTests(SimpleTestCase):
+    """Obvious answers are settled locally; anything doubtful is left to the AI (None)."""
+
+    def test_blank_answer_is_wrong(self):
+        self.assertIs(pre_grade('mitochondria', ''), False)
+        self.assertIs(pre_grade('mitochondria', "  '  "), False)
+
+    def test_exact_answer_ignoring_case_and_punctuation_is_right(self):
+        self.assertIs(pre_grade('The Mitochondria', "the mitochondria!"), True)
+
+    def test_close_variant_is_right(self):
+        self.assertIs(pre_grade('the mitochondria', 'mitochondrias'), True)
+
+    def test_negated_answer_is_left_to_the_ai(self):
+        self.assertGreaterEqual(similarity('mitochondria', 'not mitochondria'), 0.85)
+        self.assertIsNone(pre_grade('mitochondria', 'not mitochondria'))
+
+    def test_different_number_is_wrong(self):
+        self.assertIs(pre_grade('1945', '1944'), False)
+
+    def test_short_unrelated_answer_is_wrong(self):
+        self.assertIs(pre_grade('photosynthesis', 'gravity'), False)
+
+    def test_long_unrelated_answer_may_be_a_paraphrase(self):
+        self.assertIsNone(pre_grade('osmosis', 'water moving through a membrane from low to high concentration'))
+
+    @override_settings(QUIZ_PREGRADE_ACCEPT=0.99)
+    def test_accept_threshold_is_configurable(self):
+        self.assertIsNone(pre_grade('the mitochondria', 'mitochondrias'))
+
+    def test_partly_right_answer_is_left_to_the_ai(self):
+        self.assertIsNone(pre_grade('cell membrane', 'cell wall'))
+
+    @override_settings(QUIZ_PREGRADE_REJECT=0.5)
+    def test_reject_threshold_is_configurable(self):
+        self.assertIs(pre_grade('cell membrane', 'cell wall'), False)
+
+    @override_settings(QUIZ_PREGRADE_ENABLED=False)
+    def test_disabled_pre_grader_settles_nothing(self):
+        self.assertIsNone(pre_grade('mitochondria', 'mitochondria'))
+
+    def test_verdicts_are_counted(self):
+        before = get_pregrade_stats()
+        pre_grade('mitochondria', 'mitochondria')
+        pre_grade('1945', '1944')
+        pre_grade('mitochondria', 'not mitochondria')
+        after = get_pregrade_stats()
+        self.assertEqual(after['ai_calls_avoided'] - before['ai_calls_avoided'], 2)
+        self.assertEqual(after['escalated'] - before['escalated'], 1)
+
+
+QUIZ = {'mcq_questions': [{'question': 'Q?', 'options': ['A', 'B', 'C', 'D'], 'answer': 'A'}], 'short_questions': []}
+
+
+class QuizGenerationJobTests(TestCase):
+
+    text = 'Cells are the basic unit of life. ' * 3
+
+    def _job(self, status=QuizGenerationJob.STATUS_QUEUED, **fields):
+        params = {
+            'subject': 'Biology', 'subject_select': 'Biology', 'num_mcq': 1, 'num_short': 0, 'difficulty': 'any',
+            'study_text': self.text, 'uploaded_file_name': '', 'quiz_time': 10,
+        }
+        return QuizGenerationJob.objects.create(
+            status=status, session_key='session', study_text=self.text, params=params, **fields
+        )
+
+    def _age(self, job, seconds):
+        QuizGenerationJob.objects.filter(pk=job.pk).update(updated_at=timezone.now() - timedelta(seconds=seconds))
+        job.refresh_from_db()
+
+    @mock.patch.object(views.background, 'submit')
+    def test_request_queues_a_job_and_answers_at_once(self, submit):
+        response = self.client.post(reverse('quiz:generate_questions_job'), {
+            'extractedText': self.text, 'num_mcq': '1', 'num_short': '0',
+        })
+        self.assertEqual(response.status_code, 202)
+        data = response.json()
+        job = QuizGenerationJob.objects.get(pk=data['job_id'])
+        submit.assert_called_once_with(QuizService.run_generation_job, job.pk)
+        self.assertEqual(data['status'], QuizGenerationJob.STATUS_QUEUED)
+        self.assertIsNone(data['events_url'])  # no event stream under WSGI
+
+    @mock.patch.object(QuizService, 'generate_quiz', return_value=QUIZ)
+    def test_job_runs_once(self, generate_quiz):
+        job = self._job()
+        QuizService.run_generation_job(job.pk)
+        QuizService.run_generation_job(job.pk)
+        job.refresh_from_db()
+        self.assertEqual(job.status, QuizGenerationJob.STATUS_DONE)
+        self.assertEqual(job.result, QUIZ)
+        generate_quiz.assert_called_once()
+
+    @mock.patch.object(QuizService, 'generate_quiz', return_value=QUIZ)
+    def test_job_failed_as_stale_is_not_run(self, generate_quiz):
+        job = self._job(status=QuizGenerationJob.STATUS_FAILED)
+        QuizService.run_generation_job(job.pk)
+        generate_quiz.assert_not_called()
+
+    def test_job_failed_as_stale_while_running_stays_failed(self):
+        job = self._job()
+
+        def expire_meanwhile(*args):
+            self._age(job, 3600)
+            views._expire_stale_job(job)
+            return QUIZ
+
+        with mock.patch.object(QuizService, 'generate_quiz', side_effect=expire_meanwhile):
+            QuizService.run_generation_job(job.pk)
+        job.refresh_from_db()
+        self.assertEqual(job.status, QuizGenerationJob.STATUS_FAILED)
+
+    @override_settings(QUIZ_JOB_STALE_AFTER=60)
+    def test_stale_job_is_reported_failed(self):
+        job = self._job(status=QuizGenerationJob.STATUS_RUNNING)
+        self._age(job, 120)
+        self.assertEqual(views._expire_stale_job(job).status, QuizGenerationJob.STATUS_FAILED)
+
+    @override_settings(QUIZ_JOB_STALE_AFTER=60)
+    def test_job_that_finished_after_it_was_read_is_not_expired(self):
+        job = self._job(status=QuizGenerationJob.STATUS_RUNNING)
+        self._age(job, 120)
+        QuizGenerationJob.objects.filter(pk=job.pk).update(status=QuizGenerationJob.STATUS_DONE, updated_at=timezone.now())
+        self.assertEqual(views._expire_stale_job(job).status, QuizGenerationJob.STATUS_DONE)
+
+    def test_status_endpoint_delivers_the_quiz_into_the_session_once(self):
+        self.client.get('/')
+        session = self.client.session
+        session.save()
+        job = self._job(status=QuizGenerationJob.STATUS_DONE, result=QUIZ)
+        QuizGenerationJob.objects.filter(pk=job.pk).update(session_key=session.session_key)
+
+        response = self.client.get(reverse('quiz:quiz_job_status', args=[job.pk]))
+        self.assertEqual(response.json()['status'], QuizGenerationJob.STATUS_DONE)
+        self.assertEqual(self.client.session['quiz_job_id'], str(job.pk))
+        self.assertEqual(self.client.get(reverse('quiz:quiz_job_status', args=[job.pk])).status_code, 200)
+
+    def test_other_sessions_cannot_see_a_job(self):
+        job = self._job()
+        self.assertEqual(self.client.get(reverse('quiz:quiz_job_status', args=[job.pk])).status_code, 404)
+
+
+def _quiz_reply(num_mcq, num_short, topic='cells'):
+    return json.dumps({
+        'mcq_questions': [
+            {'question': f'{topic} MCQ {i}?', 'options': ['A', 'B', 'C', 'D'], 'answer': 'A', 'explanation': ''}
+            for i in range(num_mcq)
+        ],
+        'short_questions': [{'question': f'{topic} short {i}?', 'answer': 'x', 'explanation': ''} for i in range(num_short)],
+    })
+
+
+@override_settings(QUIZ_QUESTION_CACHE_ENABLED=True, QUIZ_CHUNK_CHARS=100000)
+class QuestionCacheTests(TestCase):
+
+    text = 'Cells are the basic unit of life. Mitochondria release energy.'
+
+    def setUp(self):
+        patcher = mock.patch.object(services.ai_client, 'generate_content', return_value=_quiz_reply(3, 1))
+        self.generate = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_same_material_is_served_from_the_cache(self):
+        first = QuizService.generate_quiz(self.text, 3, 1, 'Biology')
+        again = QuizService.generate_quiz('  ' + self.text.upper().replace(' ', '\n'), 3, 1, 'Biology')
+        self.assertEqual(again, first)
+        self.assertEqual(self.generate.call_count, 1)
+        self.assertEqual(set(QuestionCache.objects.values_list('times_used', flat=True)), {2})
+
+    def test_fewer_questions_can_be_served_but_not_more(self):
+        QuizService.generate_quiz(self.text, 3, 1, 'Biology')
+        self.assertEqual(len(QuizService.generate_quiz(self.text, 2, 0, 'Biology')['mcq_questions']), 2)
+        self.assertEqual(self.generate.call_count, 1)
+        QuizService.generate_quiz(self.text, 3, 2, 'Biology')
+        self.assertEqual(self.generate.call_count, 2)
+
+    def test_subject_and_difficulty_are_part_of_the_key(self):
+        QuizService.generate_quiz(self.text, 3, 1, 'Biology')
+        QuizService.generate_quiz(self.text, 3, 1, 'Chemistry')
+        QuizService.generate_quiz(self.text, 3, 1, 'Biology', difficulty='hard')
+        self.assertEqual(self.generate.call_count, 3)
+
+    def test_fallback_questions_are_not_cached(self):
+        self.generate.return_value = 'Sorry, I cannot help with that.'
+        QuizService.generate_quiz(self.text, 3, 1, 'Biology')
+        self.assertFalse(QuestionCache.objects.exists())
+
+    @override_settings(QUIZ_QUESTION_CACHE_MAX_ROWS=4)
+    def test_least_recently_used_rows_are_evicted(self):
+        QuizService.generate_quiz(self.text, 3, 1, 'Biology')
+        self.generate.return_value = _quiz_reply(3, 1, topic='atoms')
+        QuizService.generate_quiz(self.text, 3, 1, 'Chemistry')
+        self.assertEqual({text.split()[0] for text in QuestionCache.objects.values_list('question_text', flat=True)}, {'atoms'})
+
+
+@override_settings(QUIZ_QUESTION_CACHE_ENABLED=False, QUIZ_CHUNK_CHARS=400, QUIZ_MAX_CHUNKS=3)
+class ChunkedGenerationTests(SimpleTestCase):
+
+    text = '\n\n'.join(f'Topic {i}: ' + 'Cells divide and grow over time. ' * 6 for i in range(8))
+
+    def test_short_material_is_generated_in_one_call(self):
+        self.assertIsNone(QuizService._plan_chunks(self.text[:300], 5, 2))
+
+    def test_long_material_is_split_into_at_most_max_chunks(self):
+        plan = QuizService._plan_chunks(self.text, 5, 2)
+        self.assertEqual(len(plan), 3)
+        for topic in range(8):
+            self.assertTrue(any(f'Topic {topic}:' in chunk for chunk, _, _ in plan))
+        self.assertGreaterEqual(sum(mcq for _, mcq, _ in plan), 5)
+        self.assertTrue(all(mcq >= 1 and short >= 1 for _, mcq, short in plan))
+
+    def test_question_types_not_asked_for_are_not_planned(self):
+        self.assertTrue(all(short == 0 for _, _, short in QuizService._plan_chunks(self.text, 5, 0)))
+
+    def test_merge_takes_chunks_in_turn_and_drops_duplicates(self):
+        results = [
+            {'mcq_questions': [{'question': 'What is a cell?'}, {'question': 'Q a2'}], 'short_questions': []},
+            None,
+            {'mcq_questions': [{'question': 'what is a CELL'}, {'question': 'Q b2'}, {'question': 'Q b3'}], 'short_questions': []},
+        ]
+        merged = QuizService._merge_chunk_results(results, 3, 1)
+        self.assertEqual([q['question'] for q in merged['mcq_questions']], ['What is a cell?', 'Q a2', 'Q b2'])
+        self.assertEqual(merged['short_questions'], [])
+
+    def test_merge_without_questions_is_none(self):
+        self.assertIsNone(QuizService._merge_chunk_results([None, {'mcq_questions': []}], 3, 0))
+
+    def test_each_chunk_is_generated_once_and_merged(self):
+        prompts = []
+
+        def reply(prompt, **kwargs):
+            prompts.append(prompt)
+            first_topic = prompt[prompt.index('Topic'):].split(':')[0].replace(' ', '')
+            return _quiz_reply(3, 0, topic=first_topic)
+
+        with mock.patch.object(services.ai_client, 'generate_content', side_effect=reply):
+            quiz = QuizService.generate_quiz(self.text, 4, 0, 'Biology')
+        self.assertEqual(len(prompts), 3)
+        self.assertEqual(len(quiz['mcq_questions']), 4)
+        self.assertEqual(len({q['question'].split()[0] for q in quiz['mcq_questions']}), 3)
+
+
+class _InlineExecutor:
+    """Stands in for ThreadPoolExecutor, running map() on the calling thread."""
+
+    def __init__(self, **kwargs):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+    def map(self, fn, *iterables):
+        return map(fn, *iterables)
+
+
+@override_settings(EXAM_ANALYZER_JOB_STALE_AFTER=60)
+class ExamAnalysisJobTests(TestCase):
+
+    files = [{'name': f'paper{i}.pdf', 'path': f'exam_documents/paper{i}.pdf', 'content_hash': ''} for i in range(3)]
+
+    def setUp(self):
+        self.texts = {'paper0.pdf': 'Question one', 'paper1.pdf': None, 'paper2.pdf': 'Question three'}
+        patcher = mock.patch.object(exam_analyzer, '_extract_stored_file', side_effect=lambda entry: self.texts[entry['name']])
+        self.extract = patcher.start()
+        self.addCleanup(patcher.stop)
+        patcher = mock.patch.object(exam_analyzer, 'default_storage')
+        self.storage = patcher.start()
+        self.addCleanup(patcher.stop)
+        self.user = User.objects.create_user('student', 'student@example.com', 'pw')
+
+    def _job(self, status=ExamAnalysisJob.STATUS_QUEUED, **fields):
+        fields.setdefault('user', self.user)
+        return ExamAnalysisJob.objects.create(status=status, subject='Biology', files=self.files, **fields)
+
+    def _deleted(self):
+        return sorted(call.args[0] for call in self.storage.delete.call_args_list)
+
+    def test_every_file_is_extracted_and_the_analysis_recorded(self):
+        job = self._job()
+        exam_analyzer.run_exam_analysis_job(job.pk)
+        job.refresh_from_db()
+        self.assertEqual(job.status, ExamAnalysisJob.STATUS_DONE)
+        self.assertEqual(self.extract.call_count, 3)
+        self.assertEqual(sorted(ExamDocument.objects.values_list('title', flat=True)), ['paper0.pdf', 'paper2.pdf'])
+        self.assertEqual(job.analysis, ExamAnalysis.objects.get())
+        self.assertEqual(self._deleted(), [])
+
+    def test_anonymous_job_keeps_no_files(self):
+        job = self._job(user=None, session_key='session')
+        exam_analyzer.run_exam_analysis_job(job.pk)
+        self.assertEqual(ExamAnalysisJob.objects.get(pk=job.pk).status, ExamAnalysisJob.STATUS_DONE)
+        self.assertFalse(ExamDocument.objects.exists())
+        self.assertEqual(len(self._deleted()), 3)
+
+    def test_job_without_readable_files_fails(self):
+        self.texts = dict.fromkeys(self.texts)
+        job = self._job()
+        with self.assertLogs('quiz.exam_analyzer', 'ERROR'):
+            exam_analyzer.run_exam_analysis_job(job.pk)
+        job.refresh_from_db()
+        self.assertEqual(job.status, ExamAnalysisJob.STATUS_FAILED)
+        self.assertEqual(len(self._deleted()), 3)
+
+    def test_job_that_is_not_queued_is_not_run(self):
+        job = self._job(status=ExamAnalysisJob.STATUS_FAILED)
+        exam_analyzer.run_exam_analysis_job(job.pk)
+        self.extract.assert_not_called()
+
+    def _fail_meanwhile(self, job, result):
+        def fail(*args):
+            ExamAnalysisJob.objects.filter(pk=job.pk).update(status=ExamAnalysisJob.STATUS_FAILED)
+            return result
+        return fail
+
+    def test_job_failed_as_stale_during_extraction_stays_failed(self):
+        job = self._job()
+        self.extract.side_effect = self._fail_meanwhile(job, 'Question one')
+        # extract on this thread, so the update shares the test's database connection
+        with mock.patch.object(exam_analyzer, 'ThreadPoolExecutor', _InlineExecutor):
+            exam_analyzer.run_exam_analysis_job(job.pk)
+        self.assertEqual(ExamAnalysisJob.objects.get(pk=job.pk).status, ExamAnalysisJob.STATUS_FAILED)
+        self.assertFalse(ExamAnalysis.objects.exists())
+
+    def test_job_failed_as_stale_during_analysis_stays_failed(self):
+        job = self._job()
+        with mock.patch.object(exam_analyzer, 'perform_exam_analysis', side_effect=self._fail_meanwhile(job, {})):
+            exam_analyzer.run_exam_analysis_job(job.pk)
+        self.assertEqual(ExamAnalysisJob.objects.get(pk=job.pk).status, ExamAnalysisJob.STATUS_FAILED)
+        self.assertFalse(ExamAnalysis.objects.exists())
+
+    def _status(self, job):
+        self.client.force_login(self.user)
+        return self.client.get(reverse('quiz:exam_analysis_job_status', args=[job.pk])).json()
+
+    def test_stale_job_is_reported_failed_and_its_files_removed(self):
+        job = self._job(status=ExamAnalysisJob.STATUS_EXTRACTING)
+        ExamAnalysisJob.objects.filter(pk=job.pk).update(updated_at=timezone.now() - timedelta(seconds=120))
+        data = self._status(job)
+        self.assertEqual(data['status'], ExamAnalysisJob.STATUS_FAILED)
+        self.assertIn('redirect_url', data)
+        self.assertEqual(len(self._deleted()), 3)
+
+    def test_job_that_moved_on_is_not_failed_as_stale(self):
+        job = self._job(status=ExamAnalysisJob.STATUS_EXTRACTING)
+        ExamAnalysisJob.objects.filter(pk=job.pk).update(updated_at=timezone.now() - timedelta(seconds=120))
+        real_filter = ExamAnalysisJob.objects.filter
+
+        def advanced_after_the_read(*args, **kwargs):
+            if 'status' in kwargs and kwargs.get('pk') == job.pk:
+                real_filter(pk=job.pk).update(status=ExamAnalysisJob.STATUS_ANALYZING)
+            return real_filter(*args, **kwargs)
+
+        with mock.patch.object(ExamAnalysisJob.objects, 'filter', side_effect=advanced_after_the_read):
+            self.assertEqual(self._status(job)['status'], ExamAnalysisJob.STATUS_ANALYZING)
+        self.assertEqual(self._deleted(), [])
+
+    def test_other_users_cannot_see_a_job(self):
+        job = self._job(user=User.objects.create_user('other', 'other@example.com', 'pw'))
+        self.client.force_login(self.user)
+        self.assertEqual(self.client.get(reverse('quiz:exam_analysis_job_status', args=[job.pk])).status_code, 404)
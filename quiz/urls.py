@@ -1,11 +1,15 @@
 # quiz/urls.py
 from django.urls import path
-from . import views
+from . import views, exam_analyzer
 
 urlpatterns = [
     path('custom/', views.custom_quiz, name='custom_quiz'),
     path('ajax/extract-text/', views.ajax_extract_text, name='ajax_extract_text'),
     path('generate-questions/', views.generate_questions, name='generate_questions'),
+    path('generate-questions/async/', views.generate_questions_async, name='generate_questions_async'),
+    path('generate-questions/job/', views.generate_questions_job, name='generate_questions_job'),
+    path('jobs/<uuid:job_id>/', views.quiz_job_status, name='quiz_job_status'),
+    path('jobs/<uuid:job_id>/events/', views.quiz_job_events, name='quiz_job_events'),
     path('quiz/', views.quiz, name='quiz'),
     path('quiz/results/', views.quiz_results, name='quiz_results'),
     path('quiz/results/download_quiz_text', views.download_quiz_text, name="download_quiz_text"),
@@ -14,5 +18,8 @@ urlpatterns = [
     path('generate-flashcards/', views.generate_flashcards, name='generate_flashcards'),
     path('test-flashcard-generator/', views.test_flashcard_generator, name='test_flashcard_generator'),
     
-    path('exam-analyzer/', views.exam_analyzer, name='exam_analyzer'),
+    path('exam-analyzer/', exam_analyzer.exam_analyzer, name='exam_analyzer'),
+    path('exam-analyzer/jobs/<uuid:job_id>/', exam_analyzer.exam_analysis_job, name='exam_analysis_job'),
+    path('exam-analyzer/jobs/<uuid:job_id>/status/', exam_analyzer.exam_analysis_job_status, name='exam_analysis_job_status'),
+    path('exam-analyzer/results/<uuid:analysis_id>/', exam_analyzer.exam_analysis_results, name='exam_analysis_results'),
 ]
\ No newline at end of file
@@ -1,20 +1,21 @@
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
-from django.http import JsonResponse, HttpResponse, FileResponse, HttpResponseRedirect 
+from django.http import JsonResponse, HttpResponse, FileResponse, HttpResponseRedirect, StreamingHttpResponse
 from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.http import require_http_methods
 from django.utils.decorators import method_decorator
 from allauth.account.views import LoginView as AllauthLoginView
 from allauth.account.adapter import DefaultAccountAdapter
-import PyPDF2
-import docx
 from urllib.parse import quote
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
 from django.utils import timezone
-import base64, pytesseract
+from asgiref.sync import sync_to_async
 from .models import (
     Question, QuestionCache, QuizSession
 )
+import asyncio
 import json
 import logging
 import os
@@ -25,10 +26,13 @@ from django.urls import reverse
 import uuid
 
 from .services import QuizService
+from .models import QuizGenerationJob
+from core import background
+from materials.extraction import extract_text, get_backend, SUPPORTED_EXTENSIONS_MESSAGE
+from materials.upload_handlers import hashing_uploads, upload_rejected
 from .question_generator import generate_questions_from_text
 from .flashcard_generator import generate_flashcards_from_text
 from .quiz_download_utils import handle_quiz_download
-from .exam_analyzer import perform_exam_analysis
 from core.cookies import set_quiz_preference_cookie, get_quiz_preference_cookie, set_quiz_preference_cookie, get_quiz_preference_cookie 
 
 
@@ -62,252 +66,417 @@ def custom_quiz(request):
     return render(request, 'quiz/custom_quiz.html', context)
 
 
+@hashing_uploads
 @require_http_methods(["POST"])
 def ajax_extract_text(request):
     """Extracts text from uploaded files."""
+    if upload_rejected(request, 'slide_file'):
+        return JsonResponse({'error': 'File too large (max 10MB)'}, status=400)
     if 'slide_file' not in request.FILES:
         return JsonResponse({'error': 'No file uploaded'}, status=400)
 
     file = request.FILES['slide_file']
-    filename = file.name.lower()
-    file_ext = os.path.splitext(filename)[1]
+    file_ext = os.path.splitext(file.name.lower())[1]
     max_size = 10 * 1024 * 1024  # 10MB
     
     if file.size > max_size:
         return JsonResponse({'error': 'File too large (max 10MB)'}, status=400)
 
-    try:
-        text = ""
-        if file_ext == '.pdf':
-            # PDF extraction
-            pdf_reader = PyPDF2.PdfReader(file)
-            for page in pdf_reader.pages:
-                text += page.extract_text() or ''
-                
-        elif file_ext == '.docx':
-            # DOCX extraction
-            doc = docx.Document(file)
-            text = '\n'.join([para.text for para in doc.paragraphs])
-            
-        elif file_ext == '.pptx':
-            # PPTX extraction
-            try:
-                from pptx import Presentation
-                prs = Presentation(file)
-                for slide in prs.slides:
-                    for shape in slide.shapes:
-                        if hasattr(shape, "text") and shape.text:
-                            text += shape.text + '\n'
-            except ImportError:
-                return JsonResponse({'error': 'PPTX processing not available'}, status=400)
-                
-        elif file_ext == '.txt':
-            # TXT extraction
-            text = file.read().decode('utf-8', errors='ignore')
-            
-        else:
-            return JsonResponse({'error': 'Unsupported file type. Please upload PDF, DOCX, PPTX, or TXT.'}, status=400)
+    if get_backend(file_ext) is None:
+        return JsonResponse({'error': SUPPORTED_EXTENSIONS_MESSAGE}, status=400)
 
-        # Clean and validate extracted text
-        text = text.strip()
+    try:
+        # Limit text length for performance; parsing stops once the limit is reached
+        result = extract_text(file, max_chars=50000)
+        text = result.text
         if not text:
             return JsonResponse({'error': 'No text could be extracted from the file.'}, status=400)
-        
-        # Limit text length for performance
-        if len(text) > 50000:
-            text = text[:50000] + '\n... [text truncated due to length]'
             
-        return JsonResponse({'text': text})
+        return JsonResponse({'text': text, 'truncated': result.truncated, 'pages_read': result.pages_read})
         
     except Exception as e:
         logger.error(f"Text extraction error: {str(e)}", exc_info=True)
         return JsonResponse({'error': f'Failed to extract text: {str(e)}'}, status=500)
 
 
-@require_http_methods(["POST"])
-def generate_questions(request):
+def _read_quiz_form(request):
     """
-    Generates questions from a user-provided text.
+    Parses the custom quiz form. Returns (form, error_message) where form holds the
+    cleaned values needed to generate and re-render the quiz.
     """
+    # Get form data with proper validation
+    study_text = request.POST.get('extractedText', '').strip()
+    num_mcq = int(request.POST.get('num_mcq', 5))
+
+    # Handle num_short with validation
+    num_short_raw = request.POST.get('num_short', '0')
     try:
-        # Get form data with proper validation
-        study_text = request.POST.get('extractedText', '').strip()
-        num_mcq = int(request.POST.get('num_mcq', 5))
-        
-        # Handle num_short with validation
-        num_short_raw = request.POST.get('num_short', '0')
-        try:
-            num_short = int(num_short_raw)
-            if num_short < 0:
-                num_short = 0
-        except (ValueError, TypeError):
+        num_short = int(num_short_raw)
+        if num_short < 0:
             num_short = 0
-        
-        # Handle subject selection properly
-        subject_select = request.POST.get('subject_select', '')
-        custom_subject = request.POST.get('subject', '').strip()
-        
-        # Determine the actual subject to use
-        if subject_select == 'Other' and custom_subject:
-            subject = custom_subject
-        elif subject_select in STANDARD_SUBJECTS: # Assumes STANDARD_SUBJECTS is defined
-            subject = subject_select
+    except (ValueError, TypeError):
+        num_short = 0
+
+    # Handle subject selection properly
+    subject_select = request.POST.get('subject_select', '')
+    custom_subject = request.POST.get('subject', '').strip()
+
+    # Determine the actual subject to use
+    if subject_select == 'Other' and custom_subject:
+        subject = custom_subject
+    elif subject_select in STANDARD_SUBJECTS: # Assumes STANDARD_SUBJECTS is defined
+        subject = subject_select
+    else:
+        subject = 'General'  # Default subject
+
+    difficulty = request.POST.get('difficulty', 'any')
+    quiz_time = int(request.POST.get('quiz_time', 10))
+
+    # Store uploaded file name if available
+    uploaded_file_name = ''
+    if 'slide_file' in request.FILES:
+        uploaded_file_name = request.FILES['slide_file'].name
+    else:
+        # Check if we have a file name from previous upload
+        uploaded_file_name = request.POST.get('uploaded_file_name', '')
+
+    logger.info(f"Quiz generation request - Text length: {len(study_text)}, MCQ: {num_mcq}, Short: {num_short}, Subject: {subject}")
+
+    # Validate inputs
+    error_message = None
+    if not study_text or len(study_text) < 30:
+        error_message = 'Please provide at least 30 characters of study material.'
+        logger.warning(f"Quiz generation failed - insufficient text length: {len(study_text)}")
+    elif num_mcq <= 0 and num_short <= 0:
+        error_message = 'Please select at least one question type (MCQ or Short Answer).'
+    elif num_mcq > 20 or num_short > 10:
+        error_message = 'Maximum questions exceeded: MCQ (20 max), Short Answer (10 max).'
+    elif quiz_time < 1 or quiz_time > 120:
+        error_message = 'Quiz time must be between 1 and 120 minutes.'
+
+    form = {
+        'subject': subject,
+        'subject_select': subject_select,
+        'num_mcq': num_mcq,
+        'num_short': num_short,
+        'difficulty': difficulty,
+        'study_text': study_text,
+        'uploaded_file_name': uploaded_file_name,
+        'quiz_time': quiz_time,
+    }
+    return form, error_message
+
+
+def _render_quiz_form(request, form, error_message):
+    """Re-renders the custom quiz page with the submitted values and an error."""
+    messages.error(request, error_message or 'Unknown error occurred during question generation.')
+    return render(request, 'quiz/custom_quiz.html', form)
+
+
+def _prepare_quiz_results(quiz_results, form):
+    """
+    Validates generated questions against the requested counts.
+    Returns (mcq_questions, short_questions, error_message).
+    """
+    logger.info(f"Quiz generation completed - Results keys: {quiz_results.keys() if quiz_results else 'None'}")
+
+    if not quiz_results:
+        logger.error("Quiz generation returned None")
+        return [], [], 'Quiz generation returned no results. Please try again.'
+
+    # Validate and sanitize the results
+    mcq_questions = quiz_results.get('mcq_questions', [])
+    short_questions = quiz_results.get('short_questions', [])
+
+    # Ensure questions have required fields
+    for i, q in enumerate(mcq_questions):
+        if not isinstance(q, dict):
+            mcq_questions[i] = {'question': str(q), 'options': [], 'answer': ''}
         else:
-            subject = 'General'  # Default subject
-        
-        difficulty = request.POST.get('difficulty', 'any')
-        quiz_time = int(request.POST.get('quiz_time', 10))
-        
-        # Store uploaded file name if available
-        uploaded_file_name = ''
-        if 'slide_file' in request.FILES:
-            uploaded_file_name = request.FILES['slide_file'].name
+            q['question'] = q.get('question', '')
+            q['options'] = q.get('options', [])
+            q['answer'] = q.get('answer', '')
+
+    for i, q in enumerate(short_questions):
+        if not isinstance(q, dict):
+            short_questions[i] = {'question': str(q), 'answer': ''}
         else:
-            # Check if we have a file name from previous upload
-            uploaded_file_name = request.POST.get('uploaded_file_name', '')
-        
-        logger.info(f"Quiz generation request - Text length: {len(study_text)}, MCQ: {num_mcq}, Short: {num_short}, Subject: {subject}")
-        
-        # Validate inputs
-        error_message = None
-        if not study_text or len(study_text) < 30:
-            error_message = 'Please provide at least 30 characters of study material.'
-            logger.warning(f"Quiz generation failed - insufficient text length: {len(study_text)}")
-        elif num_mcq <= 0 and num_short <= 0:
-            error_message = 'Please select at least one question type (MCQ or Short Answer).'
-        elif num_mcq > 20 or num_short > 10:
-            error_message = 'Maximum questions exceeded: MCQ (20 max), Short Answer (10 max).'
-        elif quiz_time < 1 or quiz_time > 120:
-            error_message = 'Quiz time must be between 1 and 120 minutes.'
-        
+            q['question'] = q.get('question', '')
+            q['answer'] = q.get('answer', '')
+
+    # 1. Strictly limit the lists to the requested counts.
+    mcq_questions = mcq_questions[:form['num_mcq']]
+    short_questions = short_questions[:form['num_short']]
+
+    # 2. Update the quiz_results dictionary with the now-truncated lists.
+    quiz_results['mcq_questions'] = mcq_questions
+    quiz_results['short_questions'] = short_questions
+    quiz_results['subject'] = form['subject']
+
+    # Log actual counts (now using the final, strictly sliced lists)
+    actual_mcq = len(mcq_questions)
+    actual_short = len(short_questions)
+    logger.info(f"Generated: {actual_mcq} MCQ, {actual_short} Short Answer questions")
+
+    if actual_mcq == 0 and actual_short == 0:
+        logger.error("No questions generated after processing")
+        return mcq_questions, short_questions, 'No questions could be generated. Please try with different or more detailed content.'
+
+    return mcq_questions, short_questions, None
+
+
+def _store_quiz_in_session(request, form, mcq_questions, short_questions):
+    """Stores a generated quiz in the session, replacing any previous quiz and results."""
+    # Store questions in session (now using the strictly sliced local variables)
+    request.session['quiz_questions'] = {
+        'mcq_questions': mcq_questions,
+        'short_questions': short_questions,
+    }
+    request.session['quiz_time'] = form['quiz_time']
+    request.session['uploaded_file_name'] = form['uploaded_file_name']
+    request.session['quiz_subject'] = form['subject']
+    request.session.modified = True
+
+    # Generate a unique quiz ID and store in session
+    request.session['quiz_id'] = str(uuid.uuid4())
+
+    request.session.modified = True
+
+    # Clear previous results
+    if 'quiz_results' in request.session:
+        del request.session['quiz_results']
+    if 'quiz_user_answers' in request.session:
+        del request.session['quiz_user_answers']
+
+
+def _store_quiz_and_redirect(request, form, mcq_questions, short_questions):
+    """Stores a generated quiz in the session and redirects to the quiz page."""
+    _store_quiz_in_session(request, form, mcq_questions, short_questions)
+
+    logger.info("Quiz generation successful - redirecting to quiz page")
+
+    # prepare the redirect response
+    response = redirect('quiz')
+
+    # SET PREFERENCE COOKIE: Set the user's chosen num_mcq as a default preference
+    # This will be read next time they load the custom_quiz page.
+    response = set_quiz_preference_cookie(request,response, 'pref_num_mcq', str(form['num_mcq']))
+
+    # Return the response with the potentially attached cookie
+    return response
+
+
+def _render_unexpected_error(request, e):
+    logger.error(f"Unexpected error in generate_questions: {str(e)}", exc_info=True)
+    messages.error(request, f"An unexpected error occurred: {str(e)}")
+    return render(request, 'quiz/custom_quiz.html', {
+        'study_text': request.POST.get('extractedText', ''),
+        'num_mcq': int(request.POST.get('num_mcq', 5)),
+        'num_short': int(request.POST.get('num_short', 0)),
+        'difficulty': request.POST.get('difficulty', 'any'),
+    })
+
+
+@require_http_methods(["POST"])
+def generate_questions(request):
+    """
+    Generates questions from a user-provided text.
+    """
+    try:
+        form, error_message = _read_quiz_form(request)
         if error_message:
-            messages.error(request, error_message)
-            return render(request, 'quiz/custom_quiz.html', {
-                'subject': subject,
-                'subject_select': subject_select,
-                'num_mcq': num_mcq,
-                'num_short': num_short,
-                'difficulty': difficulty,
-                'study_text': study_text,
-                'uploaded_file_name': uploaded_file_name,
-                'quiz_time': quiz_time,
-            })
-        
+            return _render_quiz_form(request, form, error_message)
+
         # Generate questions
         quiz_results = None
         try:
             logger.info("Calling generate_questions_from_text...")
             # Assumes QuizService.generate_quiz is a synchronous blocking call
             quiz_results = QuizService.generate_quiz(
-                study_text, 
-                num_mcq, 
-                num_short, 
-                subject, 
-                difficulty
+                form['study_text'],
+                form['num_mcq'],
+                form['num_short'],
+                form['subject'],
+                form['difficulty']
             )
-            logger.info(f"Quiz generation completed - Results keys: {quiz_results.keys() if quiz_results else 'None'}")
-            
-            if not quiz_results:
-                error_message = 'Quiz generation returned no results. Please try again.'
-                logger.error("Quiz generation returned None")
-            else:
-                # Validate and sanitize the results
-                mcq_questions = quiz_results.get('mcq_questions', [])
-                short_questions = quiz_results.get('short_questions', [])
-                
-                # Ensure questions have required fields
-                for i, q in enumerate(mcq_questions):
-                    if not isinstance(q, dict):
-                        mcq_questions[i] = {'question': str(q), 'options': [], 'answer': ''}
-                    else:
-                        q['question'] = q.get('question', '')
-                        q['options'] = q.get('options', [])
-                        q['answer'] = q.get('answer', '')
-                
-                for i, q in enumerate(short_questions):
-                    if not isinstance(q, dict):
-                        short_questions[i] = {'question': str(q), 'answer': ''}
-                    else:
-                        q['question'] = q.get('question', '')
-                        q['answer'] = q.get('answer', '')
-                
-                # 1. Strictly limit the lists to the requested counts.
-                mcq_questions = mcq_questions[:num_mcq]
-                short_questions = short_questions[:num_short]
-                
-                # 2. Update the quiz_results dictionary with the now-truncated lists.
-                quiz_results['mcq_questions'] = mcq_questions
-                quiz_results['short_questions'] = short_questions
-                quiz_results['subject'] = subject
-                
-                # Log actual counts (now using the final, strictly sliced lists)
-                actual_mcq = len(mcq_questions)
-                actual_short = len(short_questions)
-                logger.info(f"Generated: {actual_mcq} MCQ, {actual_short} Short Answer questions")
-                
-                if actual_mcq == 0 and actual_short == 0:
-                    error_message = 'No questions could be generated. Please try with different or more detailed content.'
-                    logger.error("No questions generated after processing")
+            mcq_questions, short_questions, error_message = _prepare_quiz_results(quiz_results, form)
 
         except Exception as e:
             logger.error(f"Quiz generation error: {str(e)}", exc_info=True)
             error_message = f"Quiz generation failed: {str(e)}"
-        
+
         if error_message or not quiz_results:
-            messages.error(request, error_message or 'Unknown error occurred during question generation.')
-            return render(request, 'quiz/custom_quiz.html', {
-                'subject': subject,
-                'subject_select': subject_select,
-                'num_mcq': num_mcq,
-                'num_short': num_short,
-                'difficulty': difficulty,
-                'study_text': study_text,
-                'uploaded_file_name': uploaded_file_name,
-                'quiz_time': quiz_time,
-            })
-        
-        # Store questions in session (now using the strictly sliced local variables)
-        request.session['quiz_questions'] = {
-            'mcq_questions': mcq_questions,
-            'short_questions': short_questions,
-        }
-        request.session['quiz_time'] = quiz_time
-        request.session['uploaded_file_name'] = uploaded_file_name
-        request.session['quiz_subject'] = subject
-        request.session.modified = True
-        
-        # Generate a unique quiz ID and store in session
-        request.session['quiz_id'] = str(uuid.uuid4())
-        
-        request.session.modified = True
-        
-        # Clear previous results
-        if 'quiz_results' in request.session:
-            del request.session['quiz_results']
-        if 'quiz_user_answers' in request.session:
-            del request.session['quiz_user_answers']
-        
-        logger.info("Quiz generation successful - redirecting to quiz page")
-        
-        # prepare the redirect response
-        response = redirect('quiz')
-        
-        # SET PREFERENCE COOKIE: Set the user's chosen num_mcq as a default preference
-        # This will be read next time they load the custom_quiz page.
-        response = set_quiz_preference_cookie(request,response, 'pref_num_mcq', str(num_mcq))
-        
-        # Return the response with the potentially attached cookie
-        return response
-        
+            return _render_quiz_form(request, form, error_message)
+
+        return _store_quiz_and_redirect(request, form, mcq_questions, short_questions)
+
+    except Exception as e:
+        return _render_unexpected_error(request, e)
+
+
+@require_http_methods(["POST"])
+async def generate_questions_async(request):
+    """
+    Async variant of generate_questions for ASGI deployments: the provider call is
+    awaited instead of blocking a worker thread. Session and template work still
+    runs in the sync thread via sync_to_async.
+    """
+    try:
+        form, error_message = _read_quiz_form(request)
+        if error_message:
+            return await sync_to_async(_render_quiz_form)(request, form, error_message)
+
+        quiz_results = None
+        try:
+            quiz_results = await QuizService.agenerate_quiz(
+                form['study_text'],
+                form['num_mcq'],
+                form['num_short'],
+                form['subject'],
+                form['difficulty']
+            )
+            mcq_questions, short_questions, error_message = _prepare_quiz_results(quiz_results, form)
+
+        except Exception as e:
+            logger.error(f"Quiz generation error: {str(e)}", exc_info=True)
+            error_message = f"Quiz generation failed: {str(e)}"
+
+        if error_message or not quiz_results:
+            return await sync_to_async(_render_quiz_form)(request, form, error_message)
+
+        return await sync_to_async(_store_quiz_and_redirect)(request, form, mcq_questions, short_questions)
+
     except Exception as e:
-        logger.error(f"Unexpected error in generate_questions: {str(e)}", exc_info=True)
-        messages.error(request, f"An unexpected error occurred: {str(e)}")
-        return render(request, 'quiz/custom_quiz.html', {
-            'study_text': request.POST.get('extractedText', ''),
-            'num_mcq': int(request.POST.get('num_mcq', 5)),
-            'num_short': int(request.POST.get('num_short', 0)),
-            'difficulty': request.POST.get('difficulty', 'any'),
-        })
+        return await sync_to_async(_render_unexpected_error)(request, e)
+
+
+@require_http_methods(["POST"])
+def generate_questions_job(request):
+    """
+    Queues quiz generation in the background and answers right away with a job id.
+    The client follows the job through quiz_job_status (polling) or, when served
+    under ASGI, quiz_job_events (server-sent events); the quiz lands in the session
+    once the status endpoint sees the job finished.
+    """
+    form, error_message = _read_quiz_form(request)
+    if error_message:
+        return JsonResponse({'status': 'error', 'message': error_message}, status=400)
+
+    if not request.session.session_key:
+        request.session.save()
+
+    study_text = form.pop('study_text')
+    job = QuizGenerationJob.objects.create(
+        user=request.user if request.user.is_authenticated else None,
+        session_key=request.session.session_key,
+        study_text=study_text,
+        params=form,
+    )
+    background.submit(QuizService.run_generation_job, job.pk)
+    logger.info(f"Queued quiz generation job {job.pk}")
+
+    # A WSGI worker would be held for the whole life of an event stream, and the
+    # events would only be sent once it ends; WSGI clients poll the status instead.
+    events_url = reverse('quiz:quiz_job_events', args=[job.pk]) if isinstance(request, ASGIRequest) else None
+    return JsonResponse({
+        'status': job.status,
+        'job_id': str(job.pk),
+        'status_url': reverse('quiz:quiz_job_status', args=[job.pk]),
+        'events_url': events_url,
+    }, status=202)
+
+
+def _job_queryset(user, session_key):
+    """Jobs visible to the requester: their own, or their anonymous session's."""
+    if user.is_authenticated:
+        return QuizGenerationJob.objects.filter(user=user)
+    return QuizGenerationJob.objects.filter(user__isnull=True, session_key=session_key or '')
+
+
+def _expire_stale_job(job):
+    """
+    Background tasks do not survive a restart; a job that has not moved for longer
+    than QUIZ_JOB_STALE_AFTER seconds is reported as failed instead of polled forever.
+    """
+    stale_after = getattr(settings, 'QUIZ_JOB_STALE_AFTER', 300)
+    if not job.is_finished and (timezone.now() - job.updated_at).total_seconds() > stale_after:
+        # only if the job has not moved since it was read, so a job that has just
+        # finished is never overwritten
+        QuizGenerationJob.objects.filter(
+            pk=job.pk,
+            status__in=[QuizGenerationJob.STATUS_QUEUED, QuizGenerationJob.STATUS_RUNNING],
+            updated_at=job.updated_at,
+        ).update(
+            status=QuizGenerationJob.STATUS_FAILED,
+            error='Quiz generation was interrupted. Please try again.',
+            finished_at=timezone.now(),
+            updated_at=timezone.now(),
+        )
+        job.refresh_from_db()
+    return job
+
+
+@require_http_methods(["GET"])
+def quiz_job_status(request, job_id):
+    """Reports a quiz generation job; once done, moves the quiz into the session."""
+    job = _job_queryset(request.user, request.session.session_key).filter(pk=job_id).first()
+    if job is None:
+        return JsonResponse({'status': 'error', 'message': 'Job not found.'}, status=404)
+    job = _expire_stale_job(job)
+
+    if job.status == QuizGenerationJob.STATUS_FAILED:
+        return JsonResponse({'status': job.status, 'message': job.error})
+    if job.status != QuizGenerationJob.STATUS_DONE:
+        return JsonResponse({'status': job.status})
+
+    form = dict(job.params, study_text=job.study_text)
+    response = JsonResponse({'status': job.status, 'redirect_url': reverse('quiz:quiz')})
+    # deliver once, so polling again later does not reset a quiz in progress
+    if request.session.get('quiz_job_id') != str(job.pk):
+        mcq_questions, short_questions, error_message = _prepare_quiz_results(job.result, form)
+        if error_message:
+            return JsonResponse({'status': QuizGenerationJob.STATUS_FAILED, 'message': error_message})
+        _store_quiz_in_session(request, form, mcq_questions, short_questions)
+        request.session['quiz_job_id'] = str(job.pk)
+        response = set_quiz_preference_cookie(request, response, 'pref_num_mcq', str(form['num_mcq']))
+    return response
+
+
+async def quiz_job_events(request, job_id):
+    """
+    Server-sent events for a quiz generation job: emits the job status whenever it
+    changes and closes once the job has finished, or after QUIZ_JOB_EVENTS_TIMEOUT
+    seconds (EventSource reconnects by itself). The client then calls the status
+    endpoint to collect the quiz. Under WSGI the stream only carries the current
+    status, so it never ties up a worker.
+    """
+    user = await request.auser()
+    session_key = request.session.session_key
+    if not await _job_queryset(user, session_key).filter(pk=job_id).aexists():
+        return JsonResponse({'status': 'error', 'message': 'Job not found.'}, status=404)
+
+    interval = getattr(settings, 'QUIZ_JOB_POLL_INTERVAL', 1.0)
+    timeout = getattr(settings, 'QUIZ_JOB_EVENTS_TIMEOUT', 60) if isinstance(request, ASGIRequest) else 0
+
+    async def events():
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        last_status = None
+        while True:
+            job = await QuizGenerationJob.objects.filter(pk=job_id).only('status').afirst()
+            if job is None:
+                break
+            if job.status != last_status:
+                last_status = job.status
+                yield f"data: {json.dumps({'status': job.status})}\n\n"
+            if job.is_finished or loop.time() + interval >= deadline:
+                break
+            await asyncio.sleep(interval)
+
+    response = StreamingHttpResponse(events(), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
 
 def quiz(request):
     """
@@ -444,25 +613,31 @@ def quiz_results(request):
                     results['correct'] += 1
 
             # Grade short answer questions
+            short_items = []
             for idx, q in enumerate(short_questions):
                 # The index for short answers continues after MCQ indices
                 short_idx = len(mcq_questions) + idx
-                user_ans = user_answers.get(str(short_idx), '').strip()
-                expected_ans = q.get('answer', '').strip()
-                
-                # Use QuizService for grading if available, otherwise simple comparison
-                try:
-                    # Assuming QuizService is available and correctly imported
-                    is_correct = QuizService.grade_short_answer(q.get('question', ''), expected_ans, user_ans)
-                except NameError:
-                    # Fallback if QuizService is not imported or available
-                    is_correct = user_ans.lower() == expected_ans.lower()
-                except Exception:
-                    # Fallback to simple comparison for any other grading error
-                    is_correct = user_ans.lower() == expected_ans.lower()
-                
-                results['details'].append({
+                short_items.append({
                     'question': q.get('question', ''),
+                    'expected_answer': q.get('answer', '').strip(),
+                    'user_answer': user_answers.get(str(short_idx), '').strip(),
+                })
+
+            # All short answers are graded in a single AI call, bounded by QUIZ_GRADING_DEADLINE
+            try:
+                verdicts = QuizService.grade_short_answers_batch(short_items)
+            except Exception:
+                # Fallback to simple comparison for any grading error
+                verdicts = [
+                    item['user_answer'].lower() == item['expected_answer'].lower()
+                    for item in short_items
+                ]
+
+            for item, is_correct in zip(short_items, verdicts):
+                user_ans = item['user_answer']
+                expected_ans = item['expected_answer']
+                results['details'].append({
+                    'question': item['question'],
                     'user_answer': user_ans,
                     'correct_answer': expected_ans,
                     'is_correct': is_correct,
@@ -558,7 +733,3 @@ def test_flashcard_generator(request):
     """Renders the test page for flashcards."""
     return render(request, 'quiz/test_flashcard_generator.html')
 
-def exam_analyzer(request):
-    ''' Delegates all work to exam_analyzer.py '''
-    return perform_exam_analysis(request, 'quiz/exam_analyzer.html')
-
@@ -14,6 +14,10 @@ const clearFileBtn = document.getElementById("clear-file-btn");
 // --- State Variables ---
 let attachedFile = null;
 let isProcessingFile = false; // True when file is sent and text extraction is ongoing.
+let activeDocumentId = null; // Server-side id of the last uploaded document, for follow-up questions.
+
+// Last chunk of a stream cut off by a provider error (STREAM_ERROR_MARKER in chatbot/chatbot_service.py).
+const STREAM_ERROR_MARKER = "\n\n[Error: the answer was interrupted. Please ask again.]";
 
 // --- Utility Functions ---
 
@@ -46,6 +50,15 @@ function clearAttachment() {
     toggleSendButton();
 }
 
+/**
+ * Shows the uploaded document follow-up questions refer to; the clear button detaches it.
+ * @param {string} name - The document's file name.
+ */
+function showActiveDocument(name) {
+    fileNameDisplay.textContent = `Asking about: ${name}`;
+    fileStatusBar.classList.remove('hidden');
+}
+
 /**
  * Adds a message bubble to the chat window and scrolls to the bottom.
  * @param {string} text - The content of the message.
@@ -147,16 +160,21 @@ async function sendMessage() {
             }
             
             aiParagraph.textContent = data.response;
+            if (data.document_id) {
+                activeDocumentId = data.document_id;
+                showActiveDocument(data.filename);
+            }
 
         } else {
-            // B. Standard Streamed Chat (Streaming endpoint: /ai/chatbot/stream/)
-            const apiUrl = "/ai/chatbot/stream/";
+            // B. Standard Streamed Chat (streaming endpoint chosen by the server, sync or async)
+            const apiUrl = document.querySelector(".chat-container").dataset.streamUrl || "/ai/chatbot/stream/";
             aiParagraph.textContent = "";
 
             const res = await fetch(apiUrl, {
                 method: "POST",
                 headers: { "Content-Type": "application/json" },
-                body: JSON.stringify({ message: text }),
+                // Follow-ups refer to the uploaded document by id instead of re-uploading it
+                body: JSON.stringify({ message: text, document_id: activeDocumentId }),
             });
 
             if (!res.ok || !res.body) {
@@ -180,6 +198,11 @@ async function sendMessage() {
                 aiParagraph.textContent = fullText;
                 scrollToBottom();
             }
+
+            if (fullText.endsWith(STREAM_ERROR_MARKER)) {
+                // The partial answer stays visible above the error, but was not saved
+                console.error("Stream interrupted by a provider error");
+            }
         }
     } catch (err) {
         console.error("Global Network/Fetch Error:", err);
@@ -231,7 +254,11 @@ fileInput.addEventListener('change', (e) => {
 });
 
 // Handle clearing file
-clearFileBtn.addEventListener('click', clearAttachment);
+clearFileBtn.addEventListener('click', () => {
+    // later questions no longer refer to the uploaded document
+    activeDocumentId = null;
+    clearAttachment();
+});
 
 // Handle send button click
 sendBtn.addEventListener("click", () => sendMessage());
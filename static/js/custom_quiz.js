@@ -267,6 +267,19 @@ document.addEventListener('DOMContentLoaded', function() {
             const originalText = generateButton.innerHTML;
             generateButton.innerHTML = '<i class="fas fa-spinner fa-spin"></i> Generating Questions...';
             generateButton.disabled = true;
+
+            const jobUrlInput = document.getElementById('generateJobURL');
+            if (jobUrlInput && window.fetch) {
+                // Queue the generation as a background job and follow it instead of
+                // holding the request open for the whole AI call
+                e.preventDefault();
+                const restoreButton = () => {
+                    generateButton.innerHTML = originalText;
+                    generateButton.disabled = false;
+                };
+                submitGenerationJob(jobUrlInput.value, restoreButton);
+                return;
+            }
             
             // Re-enable button after 10 seconds if still processing (safety net)
             setTimeout(() => {
@@ -276,6 +289,71 @@ document.addEventListener('DOMContentLoaded', function() {
         }
     });
 
+    function submitGenerationJob(jobUrl, restoreButton) {
+        const formData = new FormData(quizForm);
+        formData.delete('slide_file'); // the text was already extracted
+        fetch(jobUrl, {
+            method: 'POST',
+            headers: { 'X-CSRFToken': getCSRFToken() },
+            body: formData
+        })
+        .then(response => response.json())
+        .then(data => {
+            if (!data.job_id) {
+                throw new Error(data.message || 'Could not start quiz generation');
+            }
+            followGenerationJob(data, restoreButton);
+        })
+        .catch(error => {
+            showToast(error.message, 'error');
+            restoreButton();
+        });
+    }
+
+    function followGenerationJob(job, restoreButton) {
+        let finished = false;
+
+        // Ask the status endpoint; it moves the quiz into the session once done
+        const checkStatus = () => fetch(job.status_url, { headers: { 'Accept': 'application/json' } })
+            .then(response => response.json())
+            .then(data => {
+                if (finished) return;
+                if (data.status === 'done') {
+                    finished = true;
+                    window.location.href = data.redirect_url;
+                } else if (data.status === 'failed' || data.status === 'error') {
+                    finished = true;
+                    showToast(data.message || 'Quiz generation failed', 'error');
+                    restoreButton();
+                }
+            });
+
+        // events_url is only given when the server can stream them (ASGI)
+        if (window.EventSource && job.events_url) {
+            const source = new EventSource(job.events_url);
+            source.onmessage = event => {
+                const data = JSON.parse(event.data);
+                if (data.status === 'done' || data.status === 'failed') {
+                    source.close();
+                    checkStatus();
+                }
+            };
+            source.onerror = () => {
+                // the stream closes after a while; fall back to polling
+                source.close();
+                if (!finished) pollStatus();
+            };
+        } else {
+            pollStatus();
+        }
+
+        function pollStatus() {
+            checkStatus().finally(() => {
+                if (!finished) setTimeout(pollStatus, 2000);
+            });
+        }
+    }
+
     // Clear form
     const clearBtn = document.getElementById('clearBtn');
     clearBtn.addEventListener('click', function() {